@@ -17,4 +17,9 @@ setuptools.setup(
         "unittest2",
         "paramiko==1.7.6",
     ],
+    extras_require={
+        # stacktester.green.GreenAPI
+        "green": ["eventlet"],
+    },
+    tests_require=["eventlet"],
 )
@@ -0,0 +1,335 @@
+"""Drive concurrent server lifecycles against Nova and report latencies."""
+
+import math
+import optparse
+import os
+import sys
+import threading
+
+from stacktester import config
+from stacktester import nova
+from stacktester.common import clock
+from stacktester.common import http
+from stacktester.common import instrument
+from stacktester.common import jsonutils
+from stacktester.common import poll
+from stacktester.common import utils
+
+
+class Stats(object):
+    """Thread-safe collection of latency samples and errors by name."""
+
+    def __init__(self):
+        self._samples = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._samples.setdefault(name, []).append(seconds)
+
+    def error(self, name):
+        with self._lock:
+            self._errors[name] = self._errors.get(name, 0) + 1
+
+    def summary(self, elapsed):
+        """Summarize every name recorded so far.
+
+        :param elapsed: Seconds the run lasted, to compute rates.
+        :returns: dict mapping each name to a dict of 'count', 'errors',
+                  'rate', 'p50', 'p95', 'p99' and 'max'
+
+        """
+        with self._lock:
+            samples = dict((k, sorted(v)) for k, v in self._samples.items())
+            errors = dict(self._errors)
+
+        summary = {}
+        for name in set(samples) | set(errors):
+            values = samples.get(name, [])
+            summary[name] = {
+                'count': len(values),
+                'errors': errors.get(name, 0),
+                'rate': elapsed and len(values) / elapsed or 0.0,
+                'p50': utils.percentile(values, 50),
+                'p95': utils.percentile(values, 95),
+                'p99': utils.percentile(values, 99),
+                'max': values and values[-1] or None,
+            }
+        return summary
+
+
+class BenchAPI(nova.API):
+    """`nova.API` recording the latency of every request it makes."""
+
+    def __init__(self, stats, *args, **kwargs):
+        super(BenchAPI, self).__init__(*args, **kwargs)
+        self.stats = stats
+
+    def request(self, method, url, **kwargs):
+        name = '%s %s' % (method, instrument.url_template(url))
+        start = poll.monotonic()
+        try:
+            resp, body = super(BenchAPI, self).request(method, url, **kwargs)
+        except Exception:
+            self.stats.error(name)
+            raise
+        self.stats.record(name, poll.monotonic() - start)
+        if resp.status >= 400:
+            self.stats.error(name)
+        return resp, body
+
+
+def _constant(rate, elapsed, ramp_up):
+    return rate
+
+
+def _linear(rate, elapsed, ramp_up):
+    if not ramp_up:
+        return rate
+    return rate * min(1.0, float(elapsed) / ramp_up)
+
+
+def _step(rate, elapsed, ramp_up, steps=4):
+    if not ramp_up:
+        return rate
+    step = math.floor(float(elapsed) / ramp_up * steps) + 1
+    return rate * min(1.0, step / steps)
+
+
+# How the start rate grows towards its target during the ramp-up period
+PROFILES = {
+    'constant': _constant,
+    'linear': _linear,
+    'step': _step,
+}
+
+ACTIONS = ('reboot', 'none')
+
+
+class Benchmark(object):
+    """Runs create -> ACTIVE -> action -> delete cycles concurrently.
+
+    New cycles are started at the rate given by the profile for as long as
+    the run lasts, never with more than `concurrency` of them in flight.
+    Besides the per-request latencies recorded by `BenchAPI`, the time
+    every state transition took is recorded under names like
+    'BUILD->ACTIVE', along with the duration of whole cycles.
+
+    """
+
+    def __init__(self, nova, server, concurrency=10, rate=1.0, duration=60,
+                 ramp_up=0, profile='constant', action='reboot',
+                 timeout=300, stats=None):
+        """Initialize a benchmark.
+
+        :param nova: `nova.API` to drive, ideally a `BenchAPI`.
+        :param server: dict of attributes to create servers with.
+        :param concurrency: Maximum number of cycles in flight.
+        :param rate: Target number of cycles started per second.
+        :param duration: Seconds during which new cycles are started.
+        :param ramp_up: Seconds to reach the target rate.
+        :param profile: Name of the ramp-up profile, one of `PROFILES`.
+        :param action: Action performed on ACTIVE servers, one of `ACTIONS`.
+        :param timeout: Seconds to wait for each state transition.
+
+        """
+        self.nova = nova
+        self.server = server
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.ramp_up = ramp_up
+        self.profile = PROFILES[profile]
+        self.action = action
+        self.timeout = timeout
+        self.stats = stats or getattr(nova, 'stats', None) or Stats()
+        self.elapsed = None
+        self._slots = threading.BoundedSemaphore(concurrency)
+
+    def run(self):
+        """Run the benchmark and wait for the last cycle to finish.
+
+        :returns: `Stats.summary` of the run
+
+        """
+        threads = []
+        deadline = poll.Deadline(self.duration)
+        while not deadline.expired():
+            self._slots.acquire()
+            if deadline.expired():
+                self._slots.release()
+                break
+            thread = threading.Thread(target=self._cycle)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+            rate = self.profile(self.rate, deadline.elapsed(), self.ramp_up)
+            clock.sleep(min(1.0 / max(rate, 0.001), deadline.remaining()))
+        for thread in threads:
+            thread.join()
+        self.elapsed = deadline.elapsed()
+        return self.stats.summary(self.elapsed)
+
+    def _cycle(self):
+        start = poll.monotonic()
+        server_id = None
+        try:
+            entity = dict(self.server, name=utils.unique_name())
+            created = poll.monotonic()
+            server_id = self.nova.create_server(entity)['id']
+            self._transition('BUILD->ACTIVE', created, server_id, 'ACTIVE')
+
+            if self.action == 'reboot':
+                acted = poll.monotonic()
+                self.nova.reboot_server(server_id)
+                self._transition('REBOOT->ACTIVE', acted, server_id,
+                                 'REBOOT', 'ACTIVE')
+
+            # Past this point the delete must not be retried below
+            deleting, server_id = server_id, None
+            deleted = poll.monotonic()
+            self.nova.delete_server(deleting)
+            self._transition('ACTIVE->DELETED', deleted, deleting, 'DELETED')
+            self.stats.record('cycle', poll.monotonic() - start)
+        except Exception:
+            self.stats.error('cycle')
+        finally:
+            if server_id is not None:
+                try:
+                    self.nova.delete_server(server_id)
+                except Exception:
+                    pass
+            self._slots.release()
+
+    def _transition(self, name, start, server_id, *statuses):
+        """Wait for a server to go through statuses, recording how long it
+        took from start."""
+        try:
+            for status in statuses:
+                self.nova.wait_for_server_status(server_id, status,
+                                                 timeout=self.timeout)
+        except Exception:
+            self.stats.error(name)
+            raise
+        self.stats.record(name, poll.monotonic() - start)
+
+
+def format_summary(summary, elapsed, stream):
+    """Print a summary as a table, slowest median first."""
+    stream.write('%-32s %7s %6s %8s %8s %8s %8s %8s\n' % (
+                 'name', 'count', 'errors', 'rate/s', 'p50', 'p95', 'p99',
+                 'max'))
+
+    def seconds(value):
+        return value is None and '-' or '%.3f' % value
+
+    for name, row in sorted(summary.items(),
+                            key=lambda item: -(item[1]['p50'] or 0)):
+        stream.write('%-32s %7d %6d %8.2f %8s %8s %8s %8s\n' % (
+                     name, row['count'], row['errors'], row['rate'],
+                     seconds(row['p50']), seconds(row['p95']),
+                     seconds(row['p99']), seconds(row['max'])))
+    cycles = summary.get('cycle', {}).get('count', 0)
+    stream.write('\n%d cycle(s) completed in %.1fs (%.2f/s)\n' % (
+                 cycles, elapsed, elapsed and cycles / elapsed or 0.0))
+
+
+def parse_options(argv):
+    parser = optparse.OptionParser(usage="%prog bench [options]")
+    parser.add_option("-c",
+                      "--config",
+                      dest="config",
+                      metavar="FILE",
+                      help="Load configuration from FILE.",
+                      default="etc/stacktester.cfg")
+    parser.add_option("-o",
+                      "--option",
+                      dest="overrides",
+                      metavar="SECTION.OPTION=VALUE",
+                      action="append",
+                      help="Override a configuration option, e.g. "
+                           "nova.host=10.0.0.1. May be repeated.",
+                      default=[])
+    parser.add_option("-n",
+                      "--concurrency",
+                      dest="concurrency",
+                      metavar="N",
+                      type="int",
+                      help="Keep at most N server lifecycles in flight.",
+                      default=10)
+    parser.add_option("-r",
+                      "--rate",
+                      dest="rate",
+                      metavar="RATE",
+                      type="float",
+                      help="Start RATE lifecycles per second.",
+                      default=1.0)
+    parser.add_option("-d",
+                      "--duration",
+                      dest="duration",
+                      metavar="SECONDS",
+                      type="float",
+                      help="Keep starting lifecycles for SECONDS.",
+                      default=60)
+    parser.add_option("--ramp-up",
+                      dest="ramp_up",
+                      metavar="SECONDS",
+                      type="float",
+                      help="Reach the target rate after SECONDS.",
+                      default=0)
+    parser.add_option("--profile",
+                      dest="profile",
+                      type="choice",
+                      choices=sorted(PROFILES),
+                      help="Ramp-up profile: %s." %
+                           ", ".join(sorted(PROFILES)),
+                      default="linear")
+    parser.add_option("--action",
+                      dest="action",
+                      type="choice",
+                      choices=ACTIONS,
+                      help="Action to perform on ACTIVE servers: %s." %
+                           ", ".join(ACTIONS),
+                      default="reboot")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    options, args = parse_options(argv)
+    try:
+        conf = config.configure(os.path.abspath(options.config),
+                                config.parse_overrides(options.overrides))
+    except config.ConfigError, e:
+        print "Configuration error: %s" % e
+        return 2
+
+    http.configure_pool(conf.nova.http_pool_size,
+                        conf.nova.http_idle_timeout)
+    jsonutils.configure_memo(conf.nova.json_memo_size)
+
+    stats = Stats()
+    api = BenchAPI(stats,
+                   conf.nova.host,
+                   conf.nova.port,
+                   conf.nova.base_url,
+                   conf.nova.username,
+                   conf.nova.api_key,
+                   conf.nova.project_id,
+                   conf.nova.auth_ttl)
+    server = {
+        'imageRef': conf.env.image_ref,
+        'flavorRef': conf.env.flavor_ref,
+    }
+    benchmark = Benchmark(api, server,
+                          concurrency=options.concurrency,
+                          rate=options.rate,
+                          duration=options.duration,
+                          ramp_up=options.ramp_up,
+                          profile=options.profile,
+                          action=options.action,
+                          timeout=conf.nova.build_timeout)
+    summary = benchmark.run()
+    format_summary(summary, benchmark.elapsed, sys.stdout)
+    return int(summary.get('cycle', {}).get('errors', 0) > 0)
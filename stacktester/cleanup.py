@@ -0,0 +1,197 @@
+"""Background deletion of the servers and images tests leave behind."""
+
+import logging
+import Queue
+import threading
+
+from stacktester import exceptions
+from stacktester import openstack
+from stacktester.common import utils
+
+
+LOG = logging.getLogger(__name__)
+
+
+class CleanupManager(object):
+    """Deletes servers and images on a pool of background threads.
+
+    Tests queue deletions and carry on instead of waiting for the DELETE
+    requests. `flush` waits for the requests to be sent and `confirm`
+    checks with one listing per poll that the resources are really gone.
+
+    """
+
+    # Statuses of entities which are going away without being deleted again
+    DELETING_STATES = ('DELETED', 'deleting')
+
+    def __init__(self, nova, workers=4):
+        """Initialize a cleanup manager. Worker threads start on first use.
+
+        :param nova: `nova.API` used to delete and list resources.
+        :param workers: Number of threads issuing DELETE requests.
+
+        """
+        self.nova = nova
+        self.workers = workers
+        self._queue = Queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._deleted = {'server': set(), 'image': set()}
+
+    def delete_server(self, server_id):
+        """Queue the deletion of a server."""
+        self._put('server', server_id)
+
+    def delete_image(self, image_id):
+        """Queue the deletion of an image."""
+        self._put('image', image_id)
+
+    def flush(self):
+        """Block until every queued DELETE request has been sent."""
+        self._queue.join()
+
+    def handoff(self):
+        """Send every queued DELETE and stop tracking the deletions, so that
+        another process can `adopt` and confirm them.
+
+        :returns: dict mapping 'server' and 'image' to the deleted IDs
+
+        """
+        self.flush()
+        with self._lock:
+            deleted = dict((kind, sorted(ids))
+                           for kind, ids in self._deleted.items())
+            for ids in self._deleted.values():
+                ids.clear()
+        return deleted
+
+    def adopt(self, deleted):
+        """Track deletions sent by another process or by someone else, so
+        `confirm` waits for them and `reap` leaves them alone.
+
+        :param deleted: dict mapping 'server' and 'image' to IDs.
+
+        """
+        with self._lock:
+            for kind, ids in deleted.items():
+                self._deleted[kind].update(ids)
+
+    def confirm(self, timeout=300):
+        """Wait until every deleted server and image has disappeared.
+
+        :param timeout: Seconds to wait for the resources to go away.
+        :returns: dict mapping 'server' and 'image' to the IDs still present
+
+        """
+        self.flush()
+        leftovers = {}
+        waiters = {
+            'server': self.nova.iter_servers_status,
+            'image': self.nova.iter_images_status,
+        }
+        for kind, waiter in waiters.items():
+            with self._lock:
+                pending = set(str(i) for i in self._deleted[kind])
+            gone = set()
+            try:
+                for entity_id, _entity in waiter(pending, 'DELETED',
+                                                 timeout=timeout):
+                    gone.add(entity_id)
+            except exceptions.EntityStatusException, e:
+                LOG.warning("Deletion not confirmed: %s", e)
+            with self._lock:
+                self._deleted[kind] -= set(i for i in self._deleted[kind]
+                                           if str(i) in gone)
+            leftovers[kind] = sorted(pending - gone)
+        return leftovers
+
+    def reap(self, prefix=utils.PREFIX):
+        """Queue the deletion of every server and image named with prefix.
+
+        :param prefix: Name prefix of the resources to delete.
+        :returns: Number of resources queued for deletion
+
+        """
+        count = 0
+        for kind, collection in (('server', 'servers'), ('image', 'images')):
+            with self._lock:
+                queued = set(str(i) for i in self._deleted[kind])
+            deleting = set()
+            for entity_id, name, status in self._list(collection):
+                if not name.startswith(prefix) or str(entity_id) in queued:
+                    continue
+                if status in self.DELETING_STATES:
+                    # Someone else's DELETE is already under way
+                    deleting.add(entity_id)
+                else:
+                    self._put(kind, entity_id)
+                    count += 1
+            self.adopt({kind: deleting})
+        return count
+
+    def _list(self, collection):
+        """Return (id, name, status) of every entity of collection, status
+        being the task state instead while the entity is being deleted.
+
+        The whole listing is read before anything is deleted, since
+        deleting the last entity of a page would break the marker of the
+        next one.
+
+        """
+        entities = getattr(self.nova, 'iter_%s' % collection)(detail=True)
+        try:
+            return [(entity['id'], entity.get('name') or '',
+                     entity.get('OS-EXT-STS:task_state') == 'deleting' and
+                     'deleting' or str(entity.get('status')).upper())
+                    for entity in entities]
+        except (AssertionError, KeyError, TypeError):
+            LOG.warning("Could not list %s to reap", collection)
+            return []
+
+    def _put(self, kind, entity_id):
+        with self._lock:
+            self._deleted[kind].add(entity_id)
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                self._threads.append(thread)
+                thread.start()
+        self._queue.put((kind, entity_id))
+
+    def _work(self):
+        while True:
+            kind, entity_id = self._queue.get()
+            try:
+                getattr(self.nova, 'delete_%s' % kind)(entity_id)
+            except Exception:
+                LOG.exception("Failed to delete %s %s", kind, entity_id)
+            finally:
+                self._queue.task_done()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager():
+    """Return the cleanup manager shared by the whole process."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = CleanupManager(openstack.Manager().nova)
+        return _manager
+
+
+def flush():
+    """Send every DELETE queued so far in this process, if there are any.
+    """
+    if _manager is not None:
+        _manager.flush()
+
+
+def handoff():
+    """Send every DELETE queued so far in this process and return the
+    deleted IDs, see `CleanupManager.handoff`."""
+    if _manager is None:
+        return {}
+    return _manager.handoff()
@@ -0,0 +1,156 @@
+"""The clock every wait of stacktester goes through.
+
+Polling, backoff and timeouts read the time and sleep through the current
+clock instead of the `time` module, so the clock can be swapped:
+
+    clock.set_clock(clock.VirtualClock())
+
+`Clock`, the default, is real time. `VirtualClock` only advances when
+everything waiting on it is asleep and then jumps straight to the earliest
+wake-up, so against a simulated backend (see `stacktester.fakes`) a 300
+second timeout expires in milliseconds while waiters still wake up in the
+same order as they would in real time.
+
+"""
+
+import ctypes
+import ctypes.util
+import itertools
+import os
+import threading
+import time as _time
+
+
+def _clock_gettime_monotonic():
+    """Return a CLOCK_MONOTONIC reader built on libc, or None."""
+
+    class timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    CLOCK_MONOTONIC = 1
+    for name in ('rt', 'c'):
+        path = ctypes.util.find_library(name)
+        if path is None:
+            continue
+        try:
+            clock_gettime = ctypes.CDLL(path, use_errno=True).clock_gettime
+        except (OSError, AttributeError):
+            continue
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+
+        def monotonic():
+            ts = timespec()
+            if clock_gettime(CLOCK_MONOTONIC, ctypes.pointer(ts)) != 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+            return ts.tv_sec + ts.tv_nsec / 1e9
+
+        return monotonic
+    return None
+
+
+# time.monotonic only exists on Python 3.3+, fall back to libc and finally
+# to the wall clock
+_monotonic = (getattr(_time, 'monotonic', None) or
+              _clock_gettime_monotonic() or
+              _time.time)
+
+
+class Clock(object):
+    """Real time."""
+
+    def monotonic(self):
+        """Return seconds on a clock which never goes backwards."""
+        return _monotonic()
+
+    def time(self):
+        """Return seconds since the epoch."""
+        return _time.time()
+
+    def sleep(self, seconds):
+        _time.sleep(seconds)
+
+
+class VirtualClock(Clock):
+    """Simulated time, advanced by sleeping rather than by waiting.
+
+    A sleeper first gives other threads `resolution` seconds of real time
+    to fall asleep too; the earliest one then moves the clock to its
+    wake-up time and returns, which lets the next earliest go on. Threads
+    busy with real work (e.g. an HTTP request) are not waited for, so
+    resolution should exceed the latency of the simulated backend when
+    strict ordering matters.
+
+    """
+
+    def __init__(self, start=0.0, epoch=None, resolution=0.001):
+        """Initialize a virtual clock.
+
+        :param start: Initial value of `monotonic`.
+        :param epoch: Value of `time` at start. Defaults to now.
+        :param resolution: Real seconds to wait for other sleepers before
+                           moving the clock.
+
+        """
+        if epoch is None:
+            epoch = _time.time()
+        self._now = float(start)
+        self._offset = epoch - start
+        self.resolution = resolution
+        self._sleepers = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def monotonic(self):
+        return self._now
+
+    def time(self):
+        return self._now + self._offset
+
+    def advance(self, seconds):
+        """Move the clock forward, waking the sleepers it passes."""
+        with self._cond:
+            self._now += max(0.0, seconds)
+            self._cond.notify_all()
+
+    def sleep(self, seconds):
+        with self._cond:
+            # Ties wake up in the order they went to sleep
+            sleeper = (self._now + max(0.0, seconds), next(self._sequence))
+            self._sleepers.append(sleeper)
+            try:
+                while self._now < sleeper[0]:
+                    self._cond.wait(self.resolution)
+                    if min(self._sleepers) == sleeper and \
+                       self._now < sleeper[0]:
+                        self._now = sleeper[0]
+            finally:
+                self._sleepers.remove(sleeper)
+                self._cond.notify_all()
+
+
+_clock = Clock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(clock):
+    """Make clock the one every wait goes through, returning the previous
+    one. None restores real time."""
+    global _clock
+    previous, _clock = _clock, clock or Clock()
+    return previous
+
+
+def monotonic():
+    return _clock.monotonic()
+
+
+def time():
+    return _clock.time()
+
+
+def sleep(seconds):
+    _clock.sleep(seconds)
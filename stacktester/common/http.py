@@ -1,32 +1,344 @@
 from stacktester import exceptions
+from stacktester.common import clock
+from stacktester.common import instrument
+from stacktester.common import poll
+from stacktester.common import utils
 
-import httplib2
+import collections
 import os
+import re
+import select
+import threading
 import time
+import urlparse
+
+
+httplib2 = utils.LazyModule('httplib2')
+
+
+class ConnectionPool(object):
+    """Process-wide pool of keep-alive `httplib2.Http` objects.
+
+    Each `httplib2.Http` holds its own persistent connection, so handing
+    the same object to consecutive requests for a host avoids paying a new
+    TCP (and TLS) handshake every time. Idle objects are kept per
+    (scheme, host, port) key and are health-checked before reuse.
+
+    """
+
+    def __init__(self, size=10, idle_timeout=60, http_factory=None):
+        """Initialize an empty pool.
+
+        :param size: Maximum number of idle connections kept per key.
+        :param idle_timeout: Seconds an idle connection may sit in the pool
+                             before it is closed instead of reused.
+        :param http_factory: Callable returning new `httplib2.Http`-like
+                             objects. Defaults to `httplib2.Http`.
+
+        """
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.http_factory = http_factory
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for_url(url):
+        """Return the (scheme, host, port) pool key of a URL."""
+        parts = urlparse.urlsplit(url)
+        default_port = 443 if parts.scheme == 'https' else 80
+        return (parts.scheme, parts.hostname, parts.port or default_port)
+
+    def get(self, key):
+        """Check out a healthy connection for key, creating one if needed."""
+        now = time.time()
+        stale = []
+        http = None
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                candidate, last_used = idle.pop()
+                if now - last_used < self.idle_timeout and \
+                   self._is_healthy(candidate):
+                    http = candidate
+                    break
+                stale.append(candidate)
+        for candidate in stale:
+            self.discard(candidate)
+        return http or (self.http_factory or httplib2.Http)()
+
+    def put(self, key, http):
+        """Return a connection to the pool once a request has finished."""
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.size:
+                idle.append((http, time.time()))
+                return
+        self.discard(http)
+
+    def discard(self, http):
+        """Close every socket held by a connection and forget it."""
+        for conn in getattr(http, 'connections', {}).values():
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def clear(self):
+        """Close and drop every idle connection in the pool."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for entries in idle.values():
+            for http, _last_used in entries:
+                self.discard(http)
+
+    def _is_healthy(self, http):
+        """A pooled socket should never be readable while it is idle; if it
+        is, the server either closed it or sent something unexpected."""
+        for conn in getattr(http, 'connections', {}).values():
+            sock = getattr(conn, 'sock', None)
+            if sock is None:
+                continue
+            try:
+                readable, _, _ = select.select([sock], [], [], 0)
+            except (select.error, ValueError, TypeError):
+                return False
+            if readable:
+                return False
+        return True
+
+
+_default_pool = ConnectionPool()
+
+
+def get_pool():
+    """Return the connection pool shared by every `Client` by default."""
+    return _default_pool
+
+
+def configure_pool(size=None, idle_timeout=None):
+    """Tune the shared connection pool in place."""
+    if size is not None:
+        _default_pool.size = size
+    if idle_timeout is not None:
+        _default_pool.idle_timeout = idle_timeout
+
+
+class ResponseCache(object):
+    """LRU cache of GET responses, revalidated with their ETag.
+
+    Meant for resources that do not change during a run, such as the
+    flavor and image catalogs. How long a response may be reused without
+    asking the server is set per URL: the first of `rules` whose pattern
+    matches the path of the URL applies, and `ttl` otherwise. A TTL of
+    None keeps the URL out of the cache, and 0 revalidates the cached
+    response on every request. Stale responses with an ETag are
+    revalidated with If-None-Match; a 304 answer makes them fresh again.
+
+    Responses are kept apart by scope, the identity they were requested
+    with, since what a listing holds can depend on who asks.
+
+    """
+
+    def __init__(self, size=256, ttl=None, rules=()):
+        """Initialize an empty cache.
+
+        :param size: Maximum number of responses kept.
+        :param ttl: Seconds responses are reused for when no rule matches.
+        :param rules: Sequence of (regex, ttl) pairs matched against the
+                      path of request URLs.
+
+        """
+        self.size = size
+        self.ttl = ttl
+        self.rules = [(re.compile(pattern), ttl) for pattern, ttl in rules]
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def ttl_for(self, url):
+        """Return the TTL of url, None if it must not be cached."""
+        path = urlparse.urlsplit(url).path
+        for pattern, ttl in self.rules:
+            if pattern.search(path):
+                return ttl
+        return self.ttl
+
+    def get(self, url, scope=None):
+        """Look up the response cached for url.
+
+        :param scope: Identity the request is made with.
+        :returns: (resp, body, fresh) or None if nothing is cached. A
+                  response that is not fresh must be revalidated.
+
+        """
+        with self._lock:
+            entry = self._entries.pop((scope, url), None)
+            if entry is None:
+                self.misses += 1
+                return None
+            resp, body, expires = entry
+            fresh = clock.monotonic() < expires
+            if not fresh and 'etag' not in resp:
+                self.misses += 1
+                return None
+            self._entries[(scope, url)] = entry
+            if fresh:
+                self.hits += 1
+            return resp, body, fresh
+
+    def put(self, url, resp, body, scope=None):
+        """Cache a 200 response to a GET on url, if its TTL allows it."""
+        ttl = self.ttl_for(url)
+        if ttl is None or resp.status != 200:
+            return
+        with self._lock:
+            self._entries.pop((scope, url), None)
+            self._entries[(scope, url)] = (resp, body,
+                                           clock.monotonic() + ttl)
+            self._trim()
+
+    def refresh(self, url, scope=None):
+        """Make the response cached for url fresh again after a 304."""
+        ttl = self.ttl_for(url)
+        with self._lock:
+            entry = self._entries.get((scope, url))
+            if entry is not None:
+                self.revalidated += 1
+                resp, body, _expires = entry
+                self._entries[(scope, url)] = (resp, body,
+                                               clock.monotonic() + (ttl or 0))
+            return entry
+
+    def invalidate(self, prefix):
+        """Drop every response cached for a URL starting with prefix, in
+        every scope."""
+        with self._lock:
+            prefix = prefix.rstrip('/')
+            for key in [(scope, u) for scope, u in self._entries
+                        if u == prefix or u.startswith(prefix + '/') or
+                        u.startswith(prefix + '?')]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def resize(self, size):
+        """Change the maximum number of responses kept, dropping the least
+        recently used ones beyond it."""
+        with self._lock:
+            self.size = size
+            self._trim()
+
+    def _trim(self):
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+_default_cache = None
+
+
+def get_cache():
+    """Return the response cache shared by the clients that opted in, or
+    None before `configure_cache` is first called."""
+    return _default_cache
+
+
+def configure_cache(size, rules=()):
+    """Create or tune the shared response cache in place.
+
+    :param size: Maximum number of responses kept.
+    :param rules: (regex, ttl) pairs, see `ResponseCache`.
+    :returns: the shared `ResponseCache`
+
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache(size, rules=rules)
+    else:
+        _default_cache.resize(size)
+        _default_cache.rules = [(re.compile(pattern), ttl)
+                                for pattern, ttl in rules]
+    return _default_cache
 
 
 class Client(object):
 
     USER_AGENT = 'python-nova_test_client'
 
-    def __init__(self, host='localhost', port=80, base_url=''):
+    # Other collections whose cached responses a mutating request to a
+    # collection makes stale
+    CACHE_INVALIDATES = {}
+
+    # Identity the responses the client caches are kept under, set by
+    # clients whose credentials decide what they are answered
+    cache_scope = None
+
+    def __init__(self, host='localhost', port=80, base_url='', pool=None,
+                 poll_strategy=None, cache=None):
+        """Initialize an HTTP client.
+
+        :param pool: `ConnectionPool` to take connections from. Defaults
+                     to the process-wide one.
+        :param poll_strategy: Default `poll.PollStrategy` of the pollers.
+        :param cache: `ResponseCache` to reuse GET responses from. Nothing
+                      is cached by default.
+
+        """
         #TODO: join these more robustly
         self.base_url = "http://%s:%s/%s" % (host, port, base_url)
+        self.pool = pool or get_pool()
+        self.poll_strategy = poll_strategy or poll.FixedInterval(2)
+        self.cache = cache
+
+    def _get_poll_strategy(self, kwargs):
+        """Pop the polling strategy out of request kwargs.
+
+        An explicit `strategy` wins, a bare `interval` keeps the old fixed
+        interval behavior and otherwise the client's default is used.
+
+        """
+        strategy = kwargs.pop('strategy', None)
+        interval = kwargs.pop('interval', None)
+        if strategy is None and interval is not None:
+            strategy = poll.FixedInterval(interval)
+        return strategy or self.poll_strategy
+
+    def sleep(self, seconds):
+        """Pause between polls. Overridden by clients which must not block
+        the whole process."""
+        clock.sleep(seconds)
 
     def poll_request(self, method, url, check_response, **kwargs):
 
         timeout = kwargs.pop('timeout', 180)
-        interval = kwargs.pop('interval', 2)
-        # Start timestamp
-        start_ts = int(time.time())
-
-        while True:
-            resp, body = self.request(method, url, **kwargs)
-            if (check_response(resp, body)):
-                break
-            if (int(time.time()) - start_ts >= timeout):
-                raise exceptions.TimeoutException
-            time.sleep(interval)
+        strategy = self._get_poll_strategy(kwargs)
+        # Polls wait for a change, so a cached answer is no use to them
+        kwargs.setdefault('cache', False)
+        deadline = poll.Deadline(timeout)
+        delays = strategy.delays()
+        started = instrument.start()
+        polls = 0
+
+        try:
+            while True:
+                polls += 1
+                resp, body = self.request(method, url, **kwargs)
+                if (check_response(resp, body)):
+                    break
+                if deadline.expired():
+                    raise exceptions.TimeoutException
+                self.sleep(poll.next_delay(delays, resp, deadline))
+        finally:
+            instrument.stop(started, 'poll', instrument.url_template(url),
+                            polls=polls)
 
     def poll_request_status(self, method, url, status=200, **kwargs):
 
@@ -40,8 +352,6 @@ class Client(object):
         # (for auth requests)
         base_url = kwargs.get('base_url', self.management_url)
 
-        self.http_obj = httplib2.Http()
-
         params = {}
         params['headers'] = {'User-Agent': self.USER_AGENT}
         params['headers'].update(kwargs.get('headers', {}))
@@ -52,5 +362,47 @@ class Client(object):
             params['body'] = kwargs.get('body')
 
         req_url = os.path.join(base_url, url.strip('/'))
-        resp, body = self.http_obj.request(req_url, method, **params)
+        cached = None
+        if self.cache is not None and method == 'GET' and \
+           kwargs.get('cache', True):
+            cached = self.cache.get(req_url, self.cache_scope)
+            if cached is not None:
+                cached_resp, cached_body, fresh = cached
+                if fresh:
+                    return cached_resp, cached_body
+                params['headers']['If-None-Match'] = cached_resp['etag']
+
+        pool_key = self.pool.key_for_url(req_url)
+        http_obj = self.pool.get(pool_key)
+        started = instrument.start()
+        try:
+            resp, body = http_obj.request(req_url, method, **params)
+        except Exception, e:
+            # Never hand a connection in an unknown state to someone else
+            self.pool.discard(http_obj)
+            instrument.stop(started, 'http', '%s %s' % (
+                            method, instrument.url_template(req_url)),
+                            status=type(e).__name__)
+            raise
+        self.pool.put(pool_key, http_obj)
+        instrument.stop(started, 'http', '%s %s' % (
+                        method, instrument.url_template(req_url)),
+                        status=resp.status, bytes=len(body or ''))
+
+        if self.cache is not None:
+            if method in ('POST', 'PUT', 'PATCH', 'DELETE'):
+                self._invalidate_cache(base_url, url)
+            elif cached is not None and resp.status == 304:
+                self.cache.refresh(req_url, self.cache_scope)
+                return cached_resp, cached_body
+            elif kwargs.get('cache', True):
+                self.cache.put(req_url, resp, body, self.cache_scope)
         return resp, body
+
+    def _invalidate_cache(self, base_url, url):
+        """Forget the cached responses of the collection url belongs to,
+        and of the collections that depend on it."""
+        collection = url.strip('/').split('/', 1)[0].split('?', 1)[0]
+        for name in (collection,) + self.CACHE_INVALIDATES.get(collection,
+                                                               ()):
+            self.cache.invalidate(os.path.join(base_url, name))
@@ -0,0 +1,257 @@
+"""Timing of HTTP requests, status polls and ssh operations.
+
+Instrumentation is off unless `enable` is called. While it is off, `start`
+returns None and `stop` returns straight away, so the instrumented code
+paths only pay for a function call and a global lookup.
+
+Records are aggregated per test (see `set_test`) and per kind:
+
+    http  every HTTP request, by method and URL template
+    auth  every authentication against Nova
+    poll  every status wait, by URL template, with the number of polls
+    ssh   every ssh connect and command
+
+"""
+
+import json
+import re
+import threading
+import urlparse
+
+from stacktester.common import poll
+
+
+# Path segments which identify a single resource, folded so that calls on
+# different servers are reported together
+_ID_RE = re.compile(r'/(?=[0-9a-f-]*[0-9])[0-9a-f-]+(?=/|$)')
+
+# Key for records made outside of any test, e.g. in class fixtures
+NO_TEST = '(no test)'
+
+_enabled = False
+_lock = threading.Lock()
+_records = {}
+
+# The test is set per thread: records made by background threads, such as
+# server pool boots or queued deletions, are not those of the running test
+_local = threading.local()
+
+
+def url_template(url):
+    """Return the path of url with resource IDs replaced by {id}."""
+    path = urlparse.urlsplit(url).path or '/'
+    return _ID_RE.sub('/{id}', path)
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    """Forget everything recorded so far."""
+    global _records
+    with _lock:
+        _records = {}
+
+
+def set_test(name):
+    """Attribute the following records of the calling thread to test name
+    (None for no test)."""
+    _local.test = name or NO_TEST
+
+
+def current_test():
+    """Return the name of the test records of the calling thread are
+    attributed to."""
+    return getattr(_local, 'test', NO_TEST)
+
+
+def start():
+    """Return a start time to pass to `stop`, or None when disabled."""
+    if not _enabled:
+        return None
+    return poll.monotonic()
+
+
+def stop(started, kind, name, status=None, **counters):
+    """Record an operation which began at started.
+
+    :param started: Value returned by `start`; nothing is recorded if None.
+    :param kind: One of 'http', 'auth', 'poll' or 'ssh'.
+    :param name: What was done, e.g. 'GET /servers/{id}'.
+    :param status: Outcome to count, e.g. the HTTP status code.
+    :param counters: Numbers to add up, e.g. bytes=1024.
+
+    """
+    if started is None:
+        return
+    record(kind, name, poll.monotonic() - started, status, **counters)
+
+
+def record(kind, name, seconds, status=None, **counters):
+    """Record an operation that took seconds."""
+    if not _enabled:
+        return
+    test = current_test()
+    with _lock:
+        by_kind = _records.setdefault(test, {}).setdefault(kind, {})
+        stats = by_kind.get(name)
+        if stats is None:
+            stats = by_kind[name] = Stats()
+        stats.add(seconds, status, counters)
+
+
+class Stats(object):
+    """Aggregate of the records of one operation."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.statuses = {}
+        self.counters = {}
+
+    def add(self, seconds, status=None, counters=None):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if status is not None:
+            status = str(status)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+        for key, value in (counters or {}).items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        for key, value in other.counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def to_dict(self):
+        data = {'count': self.count, 'total': self.total, 'max': self.max}
+        if self.statuses:
+            data['statuses'] = dict(self.statuses)
+        data.update(self.counters)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        for key, value in data.items():
+            if key in ('count', 'total', 'max'):
+                setattr(stats, key, value)
+            elif key == 'statuses':
+                stats.statuses = dict(value)
+            else:
+                stats.counters[key] = value
+        return stats
+
+
+def snapshot():
+    """Return a copy of the records as {test: {kind: {name: Stats}}}."""
+    copy = {}
+    with _lock:
+        for test, kinds in _records.items():
+            for kind, names in kinds.items():
+                for name, stats in names.items():
+                    merged = Stats()
+                    merged.merge(stats)
+                    copy.setdefault(test, {}).setdefault(kind, {})[name] = \
+                        merged
+    return copy
+
+
+def totals(records):
+    """Merge the records of every test into {kind: {name: Stats}}."""
+    merged = {}
+    for kinds in records.values():
+        for kind, names in kinds.items():
+            for name, stats in names.items():
+                merged.setdefault(kind, {}).setdefault(name, Stats())
+                merged[kind][name].merge(stats)
+    return merged
+
+
+def to_json(records):
+    tests = {}
+    for test, kinds in records.items():
+        tests[test] = dict((kind, dict((name, stats.to_dict())
+                                       for name, stats in names.items()))
+                           for kind, names in kinds.items())
+    merged = totals(records)
+    return {
+        'tests': tests,
+        'totals': dict((kind, dict((name, stats.to_dict())
+                                   for name, stats in names.items()))
+                       for kind, names in merged.items()),
+    }
+
+
+def write_json(records, path):
+    with open(path, 'w') as report:
+        json.dump(to_json(records), report, indent=2, sort_keys=True)
+
+
+def read_json(paths):
+    """Load and merge the records written by `write_json` to paths."""
+    records = {}
+    for path in paths:
+        try:
+            with open(path) as report:
+                tests = json.load(report)['tests']
+        except (IOError, ValueError, KeyError):
+            continue
+        for test, kinds in tests.items():
+            for kind, names in kinds.items():
+                for name, data in names.items():
+                    by_kind = records.setdefault(test, {}).setdefault(kind,
+                                                                      {})
+                    by_kind.setdefault(name, Stats())
+                    by_kind[name].merge(Stats.from_dict(data))
+    return records
+
+
+def merge_reports(paths, path, stream):
+    """Merge the JSON reports of several workers, print and write them."""
+    records = read_json(paths)
+    stream.write('\n')
+    format_report(records, stream)
+    write_json(records, path)
+
+
+def format_report(records, stream, slowest=10):
+    """Print the time spent per operation and in the slowest tests."""
+    merged = totals(records)
+    stream.write('%-6s %-40s %7s %9s %8s %8s\n' % (
+                 'kind', 'operation', 'count', 'total', 'mean', 'max'))
+    rows = [(kind, name, stats) for kind, names in merged.items()
+            for name, stats in names.items()]
+    for kind, name, stats in sorted(rows, key=lambda row: -row[2].total):
+        stream.write('%-6s %-40s %7d %8.2fs %7.3fs %7.3fs\n' % (
+                     kind, name[:40], stats.count, stats.total,
+                     stats.total / stats.count, stats.max))
+
+    kinds = sorted(merged)
+    per_test = []
+    for test, by_kind in records.items():
+        spent = dict((kind, sum(s.total for s in by_kind.get(kind,
+                                                            {}).values()))
+                     for kind in kinds)
+        per_test.append((sum(spent.values()), test, spent))
+    if not per_test:
+        return
+    stream.write('\n%-50s' % 'slowest tests' +
+                 ''.join('%9s' % kind for kind in kinds) + '\n')
+    for _total, test, spent in sorted(per_test, reverse=True)[:slowest]:
+        stream.write('%-50s' % test[-50:] +
+                     ''.join('%8.2fs' % spent[kind] for kind in kinds) +
+                     '\n')
@@ -0,0 +1,209 @@
+"""Decode API response bodies, or only the few values needed from them.
+
+`loads` uses the fastest JSON backend installed (ujson, then simplejson
+with its C speedups) and falls back to the standard library. `extract`
+picks a few key paths out of a body, such as ('server', 'status') on every
+status poll. The values it extracted from the last bodies seen are
+remembered, so polling an entity whose representation has not changed
+costs little more than hashing the body, instead of decoding all of it
+again.
+
+"""
+
+import collections
+import json
+import optparse
+import sys
+import threading
+import timeit
+
+
+def _load_backend():
+    try:
+        import ujson
+        return 'ujson', ujson.loads
+    except ImportError:
+        pass
+    try:
+        import simplejson
+        import simplejson.scanner
+        if simplejson.scanner.c_make_scanner is not None:
+            return 'simplejson', simplejson.loads
+    except (ImportError, AttributeError):
+        pass
+    return 'json', json.loads
+
+
+BACKEND, _backend_loads = _load_backend()
+
+# Returned by `extract` for a key path absent from the body
+MISSING = None
+
+_SCALARS = (basestring, int, long, float, bool, type(None))
+
+# Larger bodies are not worth keeping around to save decoding them again;
+# with the default memo size at most half a megabyte is held
+_MEMO_MAX_BODY = 16 * 1024
+
+
+def loads(body):
+    """Decode a whole JSON document with the fastest backend installed.
+
+    :raises: ValueError if body is not valid JSON
+
+    """
+    try:
+        return _backend_loads(body)
+    except ValueError:
+        raise
+    except Exception, e:
+        # Some backends raise their own errors on malformed input
+        raise ValueError(str(e))
+
+
+class _Memo(object):
+    """Small LRU of the values extracted from recently seen bodies."""
+
+    def __init__(self, size=32):
+        self.size = size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def resize(self, size):
+        with self._lock:
+            self.size = size
+            self._trim()
+
+    def get(self, key):
+        with self._lock:
+            values = self._entries.pop(key, None)
+            if values is not None:
+                self._entries[key] = values
+            return values
+
+    def put(self, key, values):
+        with self._lock:
+            self._entries[key] = values
+            self._trim()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _trim(self):
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+
+_memo = _Memo()
+
+
+def configure_memo(size):
+    """Set how many bodies `extract` remembers the values of, 0 for none."""
+    _memo.resize(size)
+
+
+def extract(body, *paths):
+    """Extract the values at key paths of a JSON object.
+
+    :param body: JSON text of an object.
+    :param paths: Sequences of keys, e.g. ('server', 'status').
+    :returns: list with the value at each path, MISSING (None) for paths
+              which are not in the body
+    :raises: ValueError if body is not a valid JSON object
+
+    """
+    paths = tuple(tuple(path) for path in paths)
+    key = (body, paths)
+    memoize = _memo.size and len(body) <= _MEMO_MAX_BODY
+    values = memoize and _memo.get(key) or None
+    if values is not None:
+        return list(values)
+
+    document = loads(body)
+    if not isinstance(document, dict):
+        raise ValueError("Expected a JSON object")
+    values = [_pick(document, path) for path in paths]
+
+    # Shared between callers, so only immutable results are remembered
+    if memoize and all(isinstance(value, _SCALARS) for value in values):
+        _memo.put(key, tuple(values))
+    return values
+
+
+def _pick(document, path):
+    for name in path:
+        if not isinstance(document, dict) or name not in document:
+            return MISSING
+        document = document[name]
+    return document
+
+
+def sample_server(metadata=500, addresses=50):
+    """Build the JSON body of a large server entity."""
+    return json.dumps({'server': {
+        'id': 1,
+        'name': 'stacktester-benchmark',
+        'status': 'BUILD',
+        'progress': 50,
+        'metadata': dict(('key%d' % i, 'value%d' % i)
+                         for i in range(metadata)),
+        'addresses': {'public': [{'version': 4,
+                                  'addr': '10.0.%d.%d' % divmod(i, 256)}
+                                 for i in range(addresses)]},
+    }})
+
+
+def benchmark(body, number=1000, stream=sys.stdout):
+    """Time decoding the status and progress of a server entity, the way
+    every status poll does."""
+    paths = (('server', 'status'), ('server', 'progress'))
+    # Every poll gets a new copy of the body, whose hash is not cached yet
+    copies = [str(bytearray(body)) for _ in range(number)]
+
+    def timed(func):
+        bodies = iter(copies)
+        seconds = timeit.timeit(lambda: func(next(bodies)), number=number)
+        return seconds / number
+
+    def full(body):
+        server = json.loads(body)['server']
+        return server['status'], server.get('progress')
+
+    def changed(body):
+        _memo.clear()
+        return extract(body, *paths)
+
+    timings = [
+        ('full decode (stdlib)', full),
+        ('%s.loads' % BACKEND, loads),
+        ('extract (changed body)', changed),
+        ('extract (unchanged body)', lambda body: extract(body, *paths)),
+    ]
+    stream.write('%d byte body, %s backend\n' % (len(body), BACKEND))
+    for name, func in timings:
+        stream.write('%-28s %10.1fus\n' % (name, timed(func) * 1e6))
+
+
+def main(argv=None):
+    parser = optparse.OptionParser()
+    parser.add_option("--metadata", dest="metadata", type="int",
+                      default=500,
+                      help="Metadata items of the sample server.")
+    parser.add_option("--addresses", dest="addresses", type="int",
+                      default=50,
+                      help="Addresses of the sample server.")
+    parser.add_option("-n", "--number", dest="number", type="int",
+                      default=1000,
+                      help="Times to decode the body.")
+    options, args = parser.parse_args(argv)
+    benchmark(sample_server(options.metadata, options.addresses),
+              options.number)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
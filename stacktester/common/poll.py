@@ -0,0 +1,121 @@
+"""Pluggable strategies for deciding how long to wait between polls."""
+
+import email.utils
+import random
+
+from stacktester.common import clock
+
+
+# Kept here since most waiting code already imports poll
+monotonic = clock.monotonic
+
+
+class Deadline(object):
+    """A point in monotonic time after which waiting should stop."""
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.start = monotonic()
+        self.expires = self.start + timeout
+
+    def elapsed(self):
+        return monotonic() - self.start
+
+    def remaining(self):
+        return max(0.0, self.expires - monotonic())
+
+    def expired(self):
+        return monotonic() >= self.expires
+
+
+class PollStrategy(object):
+    """Base class for polling strategies.
+
+    A strategy only describes the sequence of delays; it holds no state
+    between waits, so one instance can be shared by any number of callers.
+
+    """
+
+    def delays(self):
+        """Yield the seconds to sleep before each successive poll."""
+        raise NotImplementedError()
+
+
+class FixedInterval(PollStrategy):
+    """Sleep the same amount of time between every poll."""
+
+    def __init__(self, interval=2):
+        self.interval = interval
+
+    def delays(self):
+        while True:
+            yield self.interval
+
+
+class ExponentialBackoff(PollStrategy):
+    """Poll quickly at first, then back off exponentially up to a cap.
+
+    :param initial: Delay before the first re-poll, in seconds.
+    :param factor: Multiplier applied to the delay after each poll.
+    :param max_interval: Upper bound on any single delay.
+    :param fast_polls: Number of polls made at `initial` before backing
+                       off, for transitions that usually finish quickly.
+    :param jitter: Fraction of each delay that is randomized so that many
+                   waiters started together do not poll in lockstep.
+
+    """
+
+    def __init__(self, initial=0.1, factor=2.0, max_interval=5.0,
+                 fast_polls=3, jitter=0.1):
+        self.initial = initial
+        self.factor = factor
+        self.max_interval = max_interval
+        self.fast_polls = fast_polls
+        self.jitter = jitter
+
+    def delays(self):
+        for _ in xrange(self.fast_polls):
+            yield self._jittered(self.initial)
+        delay = self.initial
+        while True:
+            delay = min(delay * self.factor, self.max_interval)
+            yield self._jittered(delay)
+
+    def _jittered(self, delay):
+        spread = delay * self.jitter
+        return min(self.max_interval,
+                   max(0.0, delay + random.uniform(-spread, spread)))
+
+
+def retry_after(resp):
+    """Return the delay in seconds requested by a Retry-After header.
+
+    Both the delta-seconds and HTTP-date forms are understood. Returns None
+    when the header is absent or cannot be parsed.
+
+    """
+    value = resp.get('retry-after') if resp is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, email.utils.mktime_tz(parsed) - clock.time())
+
+
+def next_delay(delays, resp, deadline):
+    """Return how long to sleep before the next poll.
+
+    The strategy's delay is stretched to honor a Retry-After hint and
+    clamped so a waiter never sleeps past its deadline.
+
+    """
+    delay = next(delays)
+    hint = retry_after(resp)
+    if hint is not None:
+        delay = max(delay, hint)
+    return min(delay, deadline.remaining())
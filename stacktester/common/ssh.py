@@ -1,80 +1,438 @@
 
-import time
+import atexit
+import logging
 import socket
-import warnings
+import sys
+import threading
 
-with warnings.catch_warnings():
-    warnings.simplefilter("ignore")
-    import paramiko
+from stacktester import exceptions
+from stacktester.common import clock
+from stacktester.common import instrument
+from stacktester.common import poll
+from stacktester.common import utils
 
+# paramiko and its crypto stack take a while to import and warn about
+# their dependencies, so only load them once ssh is actually used
+paramiko = utils.LazyModule('paramiko', quiet=True)
 
-class Client(object):
 
-    def __init__(self, host, username, password, timeout=300):
+LOG = logging.getLogger(__name__)
+
+# Authenticated connections shared by every Client, keyed by
+# (host, port, username, password)
+_connections = {}
+_connections_lock = threading.Lock()
+
+# Linux TCP options missing from the socket module of older Pythons
+_TCP_OPTIONS = {}
+if sys.platform.startswith('linux'):
+    _TCP_OPTIONS['TCP_USER_TIMEOUT'] = 18
+
+
+def close_all():
+    """Close every cached ssh connection."""
+    with _connections_lock:
+        connections = _connections.values()
+        _connections.clear()
+    for ssh in connections:
+        ssh.close()
+
+
+atexit.register(close_all)
+
+
+def close_host(host):
+    """Close every cached ssh connection to host, e.g. once the server
+    behind it is deleted, so that its transport thread ends."""
+    with _connections_lock:
+        keys = [key for key in _connections if key[0] == host]
+        connections = [_connections.pop(key) for key in keys]
+    for ssh in connections:
+        ssh.close()
+
+
+def _enable_tcp_keepalive(sock, interval, count=3):
+    """Make the kernel drop a connection whose peer has stopped answering
+    for about count * interval seconds, where the platform allows it."""
+    interval = max(1, int(interval))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for name, value in (('TCP_KEEPIDLE', interval),
+                        ('TCP_KEEPINTVL', interval),
+                        ('TCP_KEEPCNT', count),
+                        # Also covers unacknowledged ssh keepalives
+                        ('TCP_USER_TIMEOUT', interval * count * 1000)):
+        option = getattr(socket, name, _TCP_OPTIONS.get(name))
+        if option is None:
+            continue
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, option, value)
+        except socket.error:
+            pass
+
+
+class ReadinessProber(object):
+    """Opens an ssh connection to a guest that may still be booting.
+
+    Readiness is checked in increasingly expensive stages: a plain TCP
+    connect to the ssh port, reading the server's SSH banner and finally the
+    paramiko key exchange and password authentication. Failed attempts back
+    off exponentially instead of spinning, and the time spent in each stage
+    is kept in `timings`.
+
+    """
+
+    def __init__(self, host, username, password, timeout=300, port=22,
+                 strategy=None):
+        """Initialize a prober.
+
+        :param timeout: Seconds to keep trying before giving up.
+        :param strategy: `poll.PollStrategy` pacing the retries.
+
+        """
         self.host = host
         self.username = username
         self.password = password
         self.timeout = timeout
+        self.port = port
+        self.strategy = strategy or poll.ExponentialBackoff(
+                initial=0.25, factor=2, max_interval=10, fast_polls=2)
+        self.timings = {'tcp': 0.0, 'banner': 0.0, 'auth': 0.0,
+                        'attempts': 0}
 
-    def _get_ssh_connection(self):
-        """Returns an ssh connection to the specified host"""
-        _timeout = True
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(
-            paramiko.AutoAddPolicy())
-        _start_time = time.time()
+    def connect(self):
+        """Wait for the guest to accept ssh logins.
+
+        :returns: connected `paramiko.SSHClient`
+        :raises: paramiko.AuthenticationException if the guest stayed
+                 reachable but kept rejecting the credentials,
+                 socket.error if it could not be reached in time
+
+        """
+        started = instrument.start()
+        try:
+            ssh = self._connect()
+        except Exception, e:
+            instrument.stop(started, 'ssh', 'connect',
+                            status=type(e).__name__,
+                            attempts=self.timings['attempts'])
+            raise
+        instrument.stop(started, 'ssh', 'connect', status='ok',
+                        attempts=self.timings['attempts'])
+        return ssh
+
+    def _connect(self):
+        deadline = poll.Deadline(self.timeout)
+        delays = self.strategy.delays()
+        last_error = None
 
-        while not self._is_timed_out(self.timeout, _start_time):
+        while True:
+            self.timings['attempts'] += 1
             try:
-                ssh.connect(self.host, username=self.username,
-                    password=self.password, look_for_keys=False,
-                    timeout=self.timeout)
-                _timeout = False
+                sock = self._timed('tcp', self._probe_port, deadline)
+                self._timed('banner', self._read_banner, deadline, sock)
+                ssh = self._timed('auth', self._authenticate, deadline)
+                LOG.debug("ssh to %s ready: %s", self.host, self.timings)
+                return ssh
+            except paramiko.AuthenticationException, e:
+                last_error = e
+            except (socket.error, paramiko.SSHException, EOFError):
+                last_error = None
+
+            if deadline.expired():
                 break
-            except socket.error:
-                continue
-            except paramiko.AuthenticationException:
-                time.sleep(15)
-                continue
-        if _timeout:
-            raise socket.error("SSH connect timed out")
+            clock.sleep(poll.next_delay(delays, None, deadline))
+
+        LOG.debug("ssh to %s timed out: %s", self.host, self.timings)
+        if last_error is not None:
+            raise last_error
+        raise socket.error("SSH connect timed out")
+
+    def _timed(self, stage, func, deadline, *args):
+        start = poll.monotonic()
+        try:
+            return func(deadline, *args)
+        finally:
+            self.timings[stage] += poll.monotonic() - start
+
+    def _stage_timeout(self, deadline):
+        return max(0.1, min(10.0, deadline.remaining()))
+
+    def _probe_port(self, deadline):
+        return socket.create_connection((self.host, self.port),
+                                        self._stage_timeout(deadline))
+
+    def _read_banner(self, deadline, sock):
+        """Read the identification string sshd sends first; sshd closes the
+        connection or stays silent while the guest is still starting up."""
+        try:
+            sock.settimeout(self._stage_timeout(deadline))
+            data = ''
+            while '\n' not in data and len(data) < 4096:
+                chunk = sock.recv(256)
+                if not chunk:
+                    raise socket.error("Connection closed before banner")
+                data += chunk
+            if not any(line.startswith('SSH-')
+                       for line in data.splitlines()):
+                raise socket.error("No SSH banner received")
+        finally:
+            sock.close()
+
+    def _authenticate(self, deadline):
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            ssh.connect(self.host, port=self.port, username=self.username,
+                        password=self.password, look_for_keys=False,
+                        timeout=self._stage_timeout(deadline))
+        except Exception:
+            ssh.close()
+            raise
         return ssh
 
-    def _is_timed_out(self, timeout, start_time):
-        return (time.time() - timeout) > start_time
+
+class Client(object):
+    """Runs commands on a server over ssh.
+
+    Connections are cached per (host, port, username, password) and shared by
+    all clients, so consecutive commands run as new channels on one
+    authenticated transport instead of paying for a new key exchange and
+    authentication each time. A dropped transport is replaced transparently.
+    Cached transports send keepalives, so one whose server went away is
+    noticed and its thread ends; `close_host` drops them once the server
+    is deleted.
+
+    """
+
+    def __init__(self, host, username, password, timeout=300, port=22,
+                 keepalive_interval=2):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.port = port
+        self.keepalive_interval = keepalive_interval
+        self.probe_timings = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the cached connection for this host and credentials."""
+        self._forget_connection()
+
+    def _key(self):
+        return (self.host, self.port, self.username, self.password)
+
+    def _cache_connection(self, ssh):
+        self._keep_alive(ssh)
+        with _connections_lock:
+            old = _connections.get(self._key())
+            _connections[self._key()] = ssh
+        if old is not None and old is not ssh:
+            old.close()
+
+    def _keep_alive(self, ssh):
+        """Send keepalives every `keepalive_interval` seconds, both over
+        the ssh transport and at the TCP level."""
+        transport = ssh.get_transport()
+        if transport is None or not self.keepalive_interval:
+            return
+        transport.set_keepalive(self.keepalive_interval)
+        _enable_tcp_keepalive(transport.sock, self.keepalive_interval)
+
+    def _forget_connection(self, ssh=None):
+        """Drop the cached connection (only if it is still ssh, when given)
+        and close it."""
+        with _connections_lock:
+            cached = _connections.get(self._key())
+            if cached is None or (ssh is not None and cached is not ssh):
+                cached = None
+            else:
+                del _connections[self._key()]
+        for connection in (cached, ssh):
+            if connection is not None:
+                connection.close()
+
+    def _get_cached_connection(self):
+        """Return the shared connection, reconnecting if it was lost."""
+        with _connections_lock:
+            ssh = _connections.get(self._key())
+        transport = ssh and ssh.get_transport()
+        if transport is not None and transport.is_active():
+            return ssh
+        ssh = self._get_ssh_connection()
+        self._cache_connection(ssh)
+        return ssh
+
+    def _get_ssh_connection(self):
+        """Returns an ssh connection to the specified host"""
+        prober = ReadinessProber(self.host, self.username, self.password,
+                                 self.timeout, port=self.port)
+        try:
+            return prober.connect()
+        finally:
+            self.probe_timings = prober.timings
 
     def connect_until_closed(self):
-        """Connect to the server and wait until connection is lost"""
+        """Connect to the server and wait until connection is lost.
+
+        Keepalives are sent every `keepalive_interval` seconds, both over
+        the ssh transport and at the TCP level, so a peer that vanishes
+        without closing the connection (as on a hard reboot) is noticed
+        within a few intervals. The wait blocks on the transport's reader
+        thread rather than polling.
+
+        The connection already cached, if any, is the one watched, so a
+        drop which happened before the call is reported right away.
+
+        :returns: clock.time() at which the connection dropped, or None if
+                  it was still up after `timeout` seconds
+
+        """
+        ssh = None
+        dropped_at = None
         try:
-            ssh = self._get_ssh_connection()
-            _transport = ssh.get_transport()
-            _start_time = time.time()
-            _timed_out = self._is_timed_out(self.timeout, _start_time)
-            while _transport.is_active() and not _timed_out:
-                time.sleep(5)
-                _timed_out = self._is_timed_out(self.timeout, _start_time)
-            ssh.close()
+            # A connection cached before the call may already have been
+            # dropped; reconnecting would wait on the rebooted guest instead
+            with _connections_lock:
+                ssh = _connections.get(self._key())
+            if ssh is None:
+                ssh = self._get_ssh_connection()
+                self._cache_connection(ssh)
+            transport = ssh.get_transport()
+            if transport is None or not transport.is_active():
+                self._forget_connection(ssh)
+                return clock.time()
+            self._keep_alive(ssh)
+            # The transport's thread exits as soon as its socket fails
+            transport.join(self.timeout)
+            if not transport.is_active():
+                dropped_at = clock.time()
         except (EOFError, paramiko.AuthenticationException, socket.error):
-            return
+            pass
+        if ssh is not None:
+            self._forget_connection(ssh)
+        return dropped_at
 
     def exec_command(self, cmd):
         """Execute the specified command on the server.
 
+        Runs as a new channel on the cached connection. If that connection
+        turns out to be dead, it is re-established and the command retried
+        once.
+
         :returns: data read from standard output of the command
 
         """
-        ssh = self._get_ssh_connection()
+        ssh = self._get_cached_connection()
+        try:
+            return self._exec_command(ssh, cmd)
+        except (paramiko.SSHException, EOFError, socket.error):
+            self._forget_connection(ssh)
+        return self._exec_command(self._get_cached_connection(), cmd)
+
+    def _exec_command(self, ssh, cmd):
+        return self._run(ssh, cmd)[1]
+
+    def _run(self, ssh, cmd):
+        """Run cmd and return its exit status and standard output."""
+        started = instrument.start()
         stdin, stdout, stderr = ssh.exec_command(cmd)
         output = stdout.read()
-        ssh.close()
-        return output
+        status = stdout.channel.recv_exit_status()
+        instrument.stop(started, 'ssh', 'exec', bytes=len(output))
+        return status, output
+
+    def wait_until_ready(self, timeout=None, booted_after=None,
+                         max_uptime=None, marker=None, stable_checks=2,
+                         strategy=None):
+        """Wait until the guest reliably accepts logins and looks booted.
+
+        Nova reports a server ACTIVE again after a reboot, rebuild or resize
+        before its sshd is necessarily back, or while the old instance is
+        still shutting down. Each check logs in afresh and verifies the
+        optional sentinels; the guest is ready once stable_checks checks in
+        a row pass, and the last connection is kept for the commands which
+        usually follow.
+
+        :param timeout: Seconds to wait. Defaults to the client's timeout.
+        :param booted_after: `clock.time()` the guest must have booted after,
+                             judged from its /proc/uptime.
+        :param max_uptime: Seconds the /proc/uptime of the guest must be
+                           below.
+        :param marker: Path of a file which must exist on the guest.
+        :param strategy: `poll.PollStrategy` pacing the checks.
+        :returns: seconds waited
+        :raises: TimeoutException if the guest was not ready in time
+
+        """
+        deadline = poll.Deadline(timeout or self.timeout)
+        strategy = strategy or poll.ExponentialBackoff(
+                initial=0.5, factor=2, max_interval=5,
+                fast_polls=stable_checks)
+        delays = strategy.delays()
+        passed = 0
+        problem = None
+
+        while True:
+            ssh = None
+            try:
+                prober = ReadinessProber(self.host, self.username,
+                                         self.password, deadline.remaining(),
+                                         port=self.port)
+                ssh = prober.connect()
+                problem = self._check_guest(ssh, booted_after, max_uptime,
+                                            marker)
+            except (paramiko.SSHException, EOFError, socket.error), e:
+                problem = str(e) or type(e).__name__
+
+            if problem is None:
+                passed += 1
+                if passed >= stable_checks:
+                    self._cache_connection(ssh)
+                    return deadline.elapsed()
+            else:
+                passed = 0
+            if ssh is not None:
+                ssh.close()
+
+            if deadline.expired():
+                raise exceptions.TimeoutException(
+                        "Guest %s not ready after %.0fs: %s" %
+                        (self.host, deadline.elapsed(), problem))
+            clock.sleep(poll.next_delay(delays, None, deadline))
+
+    def _check_guest(self, ssh, booted_after, max_uptime, marker):
+        """Return why the guest does not look ready yet, or None."""
+        if booted_after is not None or max_uptime is not None:
+            _status, output = self._run(ssh, 'cat /proc/uptime')
+            try:
+                uptime = float(output.split()[0])
+            except (IndexError, ValueError):
+                return "unreadable /proc/uptime %r" % output
+            if max_uptime is not None and uptime > max_uptime:
+                return "up for %.0fs" % uptime
+            if booted_after is not None and \
+               clock.time() - uptime < booted_after:
+                return "not rebooted yet"
+        if marker is not None:
+            status, _output = self._run(ssh, 'cat %s' % marker)
+            if status != 0:
+                return "%s does not exist" % marker
+        return None
 
     def test_connection_auth(self):
         """ Returns true if ssh can connect to server"""
         try:
             connection = self._get_ssh_connection()
-            connection.close()
         except paramiko.AuthenticationException:
             return False
 
+        # Always authenticate afresh, but keep the new connection around
+        # for the commands which usually follow
+        self._cache_connection(connection)
         return True
@@ -0,0 +1,95 @@
+"""Measure how long importing each module takes.
+
+`ImportProfiler` wraps the builtin `__import__` so the first import of
+every module is timed, both including (cumulative) and excluding (self)
+the modules it imports in turn. Imports of modules already loaded cost
+next to nothing and are not reported. Only imports made by the thread
+that started the profiler are timed.
+
+"""
+
+import __builtin__
+import sys
+import threading
+import timeit
+
+
+class ImportProfiler(object):
+    """Times the imports made between `start` and `stop`."""
+
+    def __init__(self, timer=timeit.default_timer):
+        self.timer = timer
+        self.timings = {}
+        self._stack = []
+        self._original = None
+        self._started = None
+        self._elapsed = None
+        self._thread = None
+
+    def start(self):
+        if self._original is not None:
+            return
+        self._original = __builtin__.__import__
+        self._thread = threading.current_thread()
+        self._started = self.timer()
+        __builtin__.__import__ = self._import
+
+    def stop(self):
+        if self._original is None:
+            return
+        __builtin__.__import__ = self._original
+        self._original = None
+        self._elapsed = self.timer() - self._started
+
+    def elapsed(self):
+        """Seconds since `start`, or between `start` and `stop`."""
+        if self._elapsed is not None:
+            return self._elapsed
+        return self._started is not None and \
+            self.timer() - self._started or 0.0
+
+    def _import(self, name, globals=None, locals=None, fromlist=None,
+                level=-1):
+        if threading.current_thread() is not self._thread:
+            return self._original(name, globals, locals, fromlist, level)
+
+        before = set(sys.modules)
+        frame = [0.0]
+        self._stack.append(frame)
+        started = self.timer()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            cumulative = self.timer() - started
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][0] += cumulative
+            loaded = [m for m in set(sys.modules) - before
+                      if sys.modules[m] is not None]
+            if loaded:
+                self.timings[self._imported(name, fromlist, loaded)] = \
+                    (cumulative, cumulative - frame[0])
+
+    @staticmethod
+    def _imported(name, fromlist, loaded):
+        """Tell which of the modules loaded by an import it was for."""
+        for candidate in ['%s.%s' % (name, item) for item in fromlist or ()
+                          if item != '*'] + [name]:
+            if candidate in loaded:
+                return candidate
+        # An implicit relative import, resolved within the importer's
+        # package
+        relative = [m for m in loaded if m.endswith('.' + name)]
+        return min(relative or loaded, key=len)
+
+    def report(self, stream, limit=20):
+        """Write the slowest imports, by cumulative time, to stream."""
+        stream.write('%-40s %10s %10s\n' % ('module', 'cumulative',
+                                            'self'))
+        ranked = sorted(self.timings.items(), key=lambda item: -item[1][0])
+        for module, (cumulative, own) in ranked[:limit]:
+            stream.write('%-40s %9.1fms %9.1fms\n' % (module,
+                                                      cumulative * 1000,
+                                                      own * 1000))
+        stream.write('\n%d module(s) imported, startup took %.1fms\n' % (
+                     len(self.timings), self.elapsed() * 1000))
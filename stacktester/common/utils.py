@@ -0,0 +1,114 @@
+import importlib
+import itertools
+import math
+import os
+import unittest
+import uuid
+import warnings
+
+
+# Every resource created by the tests is named with this prefix
+PREFIX = 'stacktester'
+
+_counter = itertools.count(1)
+
+# IDs of the tests the runner selected, None when unknown
+_selected_tests = None
+
+
+def run_id():
+    """Return the ID shared by every process of the current test run.
+
+    The first call generates it and exports it through the environment so
+    worker processes started afterwards inherit the same value.
+
+    """
+    if 'STACKTESTER_RUN_ID' not in os.environ:
+        os.environ['STACKTESTER_RUN_ID'] = uuid.uuid4().hex[:8]
+    return os.environ['STACKTESTER_RUN_ID']
+
+
+def run_prefix(prefix=PREFIX):
+    """Return the start of every `unique_name` generated by this run."""
+    return '%s-%s-' % (prefix, run_id())
+
+
+def unique_name(prefix=PREFIX):
+    """Return a resource name no other test, worker or run will use.
+
+    :param prefix: Leading part of the name.
+    :returns: '<prefix>-<run id>-<pid>-<counter>'
+
+    """
+    return '%s%d-%d' % (run_prefix(prefix), os.getpid(), next(_counter))
+
+
+def select_tests(test_ids):
+    """Record the IDs ('module.Class.method') of the tests about to run."""
+    global _selected_tests
+    _selected_tests = frozenset(test_ids)
+
+
+def runnable_tests(cls):
+    """Return the names of the tests of a class which will run: those the
+    runner selected (all of them if it did not say) and not skipped."""
+    if getattr(cls, '__unittest_skip__', False):
+        return []
+    names = []
+    for name in unittest.TestLoader().getTestCaseNames(cls):
+        if getattr(getattr(cls, name), '__unittest_skip__', False):
+            continue
+        test_id = '%s.%s.%s' % (cls.__module__, cls.__name__, name)
+        if _selected_tests is not None and test_id not in _selected_tests:
+            continue
+        names.append(name)
+    return names
+
+
+def percentile(samples, pct):
+    """Return the nearest-rank percentile of a list of numbers.
+
+    :param samples: Sorted list of numbers.
+    :param pct: Percentile to compute, between 0 and 100.
+    :returns: float, or None when there are no samples
+
+    """
+    if not samples:
+        return None
+    rank = int(math.ceil(pct / 100.0 * len(samples)))
+    return samples[max(0, rank - 1)]
+
+
+class LazyModule(object):
+    """Stand-in for a module that is only imported on first use.
+
+    Lets heavy dependencies such as paramiko stay out of the way of runs
+    that never need them, e.g. test collection or flavor-only runs.
+
+    """
+
+    def __init__(self, name, quiet=False):
+        """Initialize a lazy module.
+
+        :param name: Dotted name of the module to import.
+        :param quiet: Ignore any warning raised while importing it.
+
+        """
+        self.__name = name
+        self.__quiet = quiet
+        self.__module = None
+
+    def __load(self):
+        if self.__module is None:
+            with warnings.catch_warnings():
+                if self.__quiet:
+                    warnings.simplefilter("ignore")
+                self.__module = importlib.import_module(self.__name)
+        return self.__module
+
+    def __getattr__(self, attribute):
+        return getattr(self.__load(), attribute)
+
+    def __repr__(self):
+        state = self.__module is None and 'not loaded' or 'loaded'
+        return '<lazy module %r (%s)>' % (self.__name, state)
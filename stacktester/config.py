@@ -1,111 +1,257 @@
+"""Configuration of stacktester, resolved once per process.
+
+Values are layered, later sources winning over earlier ones:
+
+    1. the defaults below
+    2. the INI file (etc/stacktester.cfg)
+    3. environment variables named STACKTESTER_<SECTION>_<OPTION>, e.g.
+       STACKTESTER_NOVA_HOST
+    4. overrides given on the command line as section.option=value
+
+and converted and validated as they are loaded, so a bad value fails the
+run up front rather than in the middle of a test. `get_config` returns the
+configuration shared by the whole process; `configure` sets its sources
+and `reload` re-reads them.
+
+"""
+
 import ConfigParser
+import os
+import threading
+
+
+ENV_PREFIX = 'STACKTESTER_'
+
+
+class ConfigError(ValueError):
+    """A configuration value is missing or invalid."""
+    pass
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    try:
+        return ConfigParser.RawConfigParser._boolean_states[value.lower()]
+    except (KeyError, AttributeError):
+        raise ValueError("not a boolean: %r" % value)
+
+
+def _positive(convert):
+    def positive(value):
+        value = convert(value)
+        if value < 0:
+            raise ValueError("must not be negative: %r" % value)
+        return value
+    return positive
+
+
+def _ttl(value):
+    # 0 disables expiry
+    return _positive(float)(value) or None
+
+
+def _raw(value):
+    return value
+
+
+class _Section(object):
+    """Typed values of one section of the configuration.
+
+    Subclasses list their options as (attribute, option, type, default)
+    tuples; each is converted once and set as an attribute.
+
+    """
+
+    name = None
+    options = ()
+
+    def __init__(self, values):
+        """Resolve the options of the section.
+
+        :param values: dict of option names to raw values for the section.
+        :raises: ConfigError if a value cannot be converted
+
+        """
+        for attribute, option, convert, default in self.options:
+            value = values.get(option, default)
+            try:
+                value = convert(value)
+            except (TypeError, ValueError), e:
+                raise ConfigError("Invalid value for %s.%s: %s" %
+                                  (self.name, option, e))
+            setattr(self, attribute, value)
+
+    def to_dict(self):
+        return dict((option, getattr(self, attribute))
+                    for attribute, option, _convert, _default
+                    in self.options)
 
 
-class NovaConfig(object):
+class NovaConfig(_Section):
     """Provides configuration information for connecting to Nova."""
 
-    def __init__(self, conf):
-        """Initialize a Nova-specific configuration object."""
-        self.conf = conf
-
-    def get(self, item_name, default_value):
-        try:
-            return self.conf.get("nova", item_name)
-        except (ConfigParser.NoSectionError, ConfigParser.NoOptionError):
-            return default_value
-
-    @property
-    def host(self):
-        """Host for the Nova HTTP API. Defaults to 127.0.0.1."""
-        return self.get("host", "127.0.0.1")
-
-    @property
-    def port(self):
-        """Port for the Nova HTTP API. Defaults to 8774."""
-        return int(self.get("port", 8774))
-
-    @property
-    def username(self):
-        """Username to use for Nova API requests. Defaults to 'admin'."""
-        return self.get("user", "admin")
-
-    @property
-    def base_url(self):
-        """Base of the HTTP API URL. Defaults to '/v1.1'."""
-        return self.get("base_url", "/v1.1")
-
-    @property
-    def project_id(self):
-        """Base of the HTTP API URL. Defaults to '/v1.1'."""
-        return self.get("project_id", "admin")
-
-    @property
-    def api_key(self):
-        """API key to use when authenticating. Defaults to 'admin_key'."""
-        return self.get("api_key", "admin_key")
-
-    @property
-    def ssh_timeout(self):
-        """Timeout in seconds to use when connecting via ssh."""
-        return float(self.get("ssh_timeout", 300))
-
-    @property
-    def build_timeout(self):
-        """Timeout in seconds to use when connecting via ssh."""
-        return float(self.get("build_timeout", 300))
-
-
-class EnvironmentConfig(object):
-    def __init__(self, conf):
-        """Initialize a Environment-specific configuration object."""
-        self.conf = conf
-
-    def get(self, item_name, default_value):
-        try:
-            return self.conf.get("environment", item_name)
-        except (ConfigParser.NoSectionError, ConfigParser.NoOptionError):
-            return default_value
-
-    @property
-    def image_ref(self):
-        """Valid imageRef to use """
-        return self.get("image_ref", 3)
-
-    @property
-    def image_ref_alt(self):
-        """Valid imageRef to rebuild images with"""
-        return self.get("image_ref_alt", 3)
-
-    @property
-    def flavor_ref(self):
-        """Valid flavorRef to use"""
-        return self.get("flavor_ref", 1)
-
-    @property
-    def flavor_ref_alt(self):
-        """Valid flavorRef to resize images with"""
-        return self.get("flavor_ref_alt", 2)
-
-    @property
-    def multi_node(self):
-        """ Does the test environment have more than one compute node """
-        return self.get("multi_node", 'false') != 'false'
+    name = 'nova'
+    options = (
+        # Host and port of the Nova HTTP API
+        ('host', 'host', str, '127.0.0.1'),
+        ('port', 'port', _positive(int), 8774),
+        # Credentials to use for Nova API requests
+        ('username', 'user', str, 'admin'),
+        ('api_key', 'api_key', str, 'admin_key'),
+        ('project_id', 'project_id', str, 'admin'),
+        # Base of the HTTP API URL
+        ('base_url', 'base_url', str, '/v1.1'),
+        # Seconds to reuse an auth token before re-authenticating; 0 reuses
+        # it until the API returns 401
+        ('auth_ttl', 'auth_ttl', _ttl, 3600),
+        # Idle keep-alive HTTP connections kept per host, and for how long
+        ('http_pool_size', 'http_pool_size', _positive(int), 10),
+        ('http_idle_timeout', 'http_idle_timeout', _positive(float), 60),
+        # Flavor and image responses kept in the response cache, 0 disables
+        # it, and seconds to reuse them before revalidating with the server
+        ('http_cache_size', 'http_cache_size', _positive(int), 0),
+        ('http_cache_ttl', 'http_cache_ttl', _positive(float), 300),
+        # Status poll bodies whose decoded fields are remembered, 0 for none
+        ('json_memo_size', 'json_memo_size', _positive(int), 32),
+        # Timeout in seconds to use when connecting via ssh
+        ('ssh_timeout', 'ssh_timeout', _positive(float), 300),
+        # Seconds between keepalives while waiting for an ssh connection to
+        # drop
+        ('ssh_keepalive_interval', 'ssh_keepalive_interval',
+         _positive(float), 2),
+        # Timeout in seconds to wait for servers and images to build
+        ('build_timeout', 'build_timeout', _positive(float), 300),
+    )
+
+
+class EnvironmentConfig(_Section):
+    """Provides configuration information about the cloud under test."""
+
+    name = 'environment'
+    options = (
+        # Valid imageRefs to boot, and to rebuild servers with
+        ('image_ref', 'image_ref', _raw, 3),
+        ('image_ref_alt', 'image_ref_alt', _raw, 3),
+        # Valid flavorRefs to boot, and to resize servers to
+        ('flavor_ref', 'flavor_ref', _raw, 1),
+        ('flavor_ref_alt', 'flavor_ref_alt', _raw, 2),
+        # Servers to boot ahead of time for server action tests; 0 boots
+        # each test's server in its setUp
+        ('server_pool_size', 'server_pool_size', _positive(int), 0),
+        # Whether the environment has more than one compute node
+        ('multi_node', 'multi_node', _boolean, False),
+    )
 
 
 class StackConfig(object):
     """Provides `stacktester` configuration information."""
 
-    _path = None
+    sections = (NovaConfig, EnvironmentConfig)
+
+    def __init__(self, path=None, overrides=None, environ=None):
+        """Resolve a configuration from its layered sources.
 
-    def __init__(self, path=None):
-        """Initialize a configuration from a path."""
-        self._path = path or self._path
-        self._conf = self.load_config(self._path)
-        self.nova = NovaConfig(self._conf)
-        self.env = EnvironmentConfig(self._conf)
+        :param path: INI file to read, if any.
+        :param overrides: dict of 'section.option' to values, applied last.
+        :param environ: Environment to read STACKTESTER_* variables from.
+                        Defaults to os.environ.
+        :raises: ConfigError on an invalid value or override
+
+        """
+        self.path = path
+        values = self.load_config(path)
+        self._apply_environ(values, os.environ if environ is None
+                            else environ)
+        self._apply_overrides(values, overrides or {})
+        self.nova = NovaConfig(values.get('nova', {}))
+        self.env = EnvironmentConfig(values.get('environment', {}))
 
     def load_config(self, path=None):
-        """Read configuration from given path and return a config object."""
+        """Read the INI file at path into {section: {option: value}}."""
         config = ConfigParser.SafeConfigParser()
-        config.read(path)
-        return config
+        if path:
+            config.read(path)
+        return dict((section, dict(config.items(section)))
+                    for section in config.sections())
+
+    def _apply_environ(self, values, environ):
+        for section in self.sections:
+            for _attribute, option, _convert, _default in section.options:
+                name = '%s%s_%s' % (ENV_PREFIX, section.name.upper(),
+                                    option.upper())
+                if name in environ:
+                    values.setdefault(section.name, {})[option] = \
+                        environ[name]
+
+    def _apply_overrides(self, values, overrides):
+        known = dict((section.name, set(o[1] for o in section.options))
+                     for section in self.sections)
+        for key, value in overrides.items():
+            section, _sep, option = key.partition('.')
+            if option not in known.get(section, ()):
+                raise ConfigError("Unknown configuration option %s" % key)
+            values.setdefault(section, {})[option] = value
+
+    def to_dict(self):
+        return {'nova': self.nova.to_dict(),
+                'environment': self.env.to_dict()}
+
+
+def parse_overrides(items):
+    """Turn 'section.option=value' strings into a dict of overrides.
+
+    :raises: ConfigError on an item without '='
+
+    """
+    overrides = {}
+    for item in items or ():
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ConfigError("Expected section.option=value, got %r" % item)
+        overrides[key.strip()] = value.strip()
+    return overrides
+
+
+_lock = threading.Lock()
+_sources = {'path': None, 'overrides': {}}
+_config = None
+
+
+def configure(path=None, overrides=None):
+    """Set the sources of the process-wide configuration and load it.
+
+    :returns: the new `StackConfig`
+
+    """
+    with _lock:
+        _sources['path'] = path
+        _sources['overrides'] = dict(overrides or {})
+    return reload()
+
+
+def get_config():
+    """Return the process-wide configuration, loading it on first use."""
+    if _config is None:
+        return reload()
+    return _config
+
+
+def set_config(config):
+    """Make an already resolved configuration the process-wide one, e.g.
+    the parent's in a worker process."""
+    global _config
+    _config = config
+
+
+def reload():
+    """Re-read the configuration from its sources and share the result.
+
+    Objects built from the previous configuration keep it; only later
+    `get_config` callers see the new one.
+
+    """
+    global _config
+    with _lock:
+        _config = StackConfig(_sources['path'], _sources['overrides'])
+        return _config
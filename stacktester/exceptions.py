@@ -8,3 +8,29 @@ class TimeoutException(Exception):
 
 class ServerNotFound(KeyError):
     pass
+
+
+class EntityStatusException(AssertionError):
+    """An entity will not reach the status that is being waited for.
+
+    :ivar entity_name: Type of the entity ('server', 'image', ...).
+    :ivar entity_id: ID of the entity.
+    :ivar status: The status that was being waited for.
+    :ivar statuses: Sequence of distinct statuses observed, in order.
+    :ivar entity: Last entity body seen, or None if none was.
+    :ivar reason: Why the wait ended.
+
+    """
+
+    def __init__(self, entity_name, entity_id, status, statuses, entity,
+                 reason):
+        self.entity_name = entity_name
+        self.entity_id = entity_id
+        self.status = status
+        self.statuses = list(statuses)
+        self.entity = entity
+        self.reason = reason
+        msg = "%s %s failed to reach status %s: %s (observed %s)" % \
+              (entity_name, entity_id, status, reason,
+               ' -> '.join(self.statuses) or 'nothing')
+        super(EntityStatusException, self).__init__(msg)
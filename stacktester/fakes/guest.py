@@ -0,0 +1,247 @@
+"""Stand-in for a booted guest, to exercise `ssh.Client` locally.
+
+`FakeGuest` runs a paramiko ssh server on localhost which accepts password
+logins and answers the few commands the suite runs on its servers (`cat`
+and `echo [-n] ... > file`) from an in-memory filesystem, where
+/proc/uptime reflects the last simulated boot. Reboots drop every open
+connection and refuse new ones for a while, as a real guest would:
+
+    with FakeGuest(password='secret') as guest:
+        client = ssh.Client(guest.host, 'root', 'secret', port=guest.port)
+        client.exec_command('cat /proc/uptime')
+
+Connect and auth delays let the readiness probing and connection reuse of
+`ssh.Client` be measured without a cloud. Passed to `FakeNova`, the guest
+follows the builds, reboots, rebuilds and password changes of its servers.
+
+"""
+
+import logging
+import re
+import socket
+import threading
+import warnings
+
+from stacktester.common import clock
+from stacktester.common import poll
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    import paramiko
+
+
+LOG = logging.getLogger(__name__)
+
+_ECHO_RE = re.compile(r'^echo( -n)? (.*?) > (\S+)$')
+_CAT_RE = re.compile(r'^cat (\S+)$')
+
+_host_key = None
+_host_key_lock = threading.Lock()
+
+
+def _get_host_key():
+    """Return the host key shared by every fake guest of the process."""
+    global _host_key
+    with _host_key_lock:
+        if _host_key is None:
+            _host_key = paramiko.RSAKey.generate(1024)
+        return _host_key
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    """Authenticates a connection and runs its commands on the guest."""
+
+    def __init__(self, guest):
+        self.guest = guest
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        if self.guest.auth_delay:
+            clock.sleep(self.guest.auth_delay)
+        if (username, password) == (self.guest.username,
+                                    self.guest.password):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        # Answer from another thread, the transport's must keep reading
+        thread = threading.Thread(target=self.guest._exec,
+                                  args=(channel, command))
+        thread.daemon = True
+        thread.start()
+        return True
+
+
+class FakeGuest(object):
+    """In-memory guest reachable over ssh on localhost."""
+
+    def __init__(self, host='127.0.0.1', port=0, username='root',
+                 password='password', files=None, connect_delay=0,
+                 auth_delay=0):
+        """Initialize a fake guest. Nothing is served until `start`.
+
+        :param port: Port to listen on, 0 picks a free one.
+        :param files: dict of paths to contents the image comes with.
+        :param connect_delay: Seconds a new connection waits before the
+                              ssh banner is sent.
+        :param auth_delay: Seconds each password check takes.
+
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.image_files = dict(files or {})
+        self.files = dict(self.image_files)
+        self.connect_delay = connect_delay
+        self.auth_delay = auth_delay
+        self.booted_at = clock.time()
+        self.connections = 0
+        self.commands = []
+        self._down_until = None
+        self._transports = []
+        self._lock = threading.Lock()
+        self._sock = None
+
+    def start(self):
+        """Start accepting connections on a background thread."""
+        self._sock = socket.socket()
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self._sock.listen(16)
+        self.port = self._sock.getsockname()[1]
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        self.drop_connections()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    # Control of the guest
+
+    def write_file(self, path, contents):
+        with self._lock:
+            self.files[path] = contents
+
+    def set_password(self, password):
+        self.password = password
+
+    def drop_connections(self):
+        """Close every open ssh connection."""
+        with self._lock:
+            transports, self._transports = self._transports, []
+        for transport in transports:
+            transport.close()
+
+    def reboot(self, downtime=0):
+        """Drop every connection and refuse new ones for downtime seconds,
+        after which the guest counts as freshly booted."""
+        with self._lock:
+            self._down_until = poll.monotonic() + downtime
+            self.booted_at = clock.time() + downtime
+        self.drop_connections()
+
+    def rebuild(self, downtime=0, password=None):
+        """Reboot onto a pristine copy of the image files."""
+        with self._lock:
+            self.files = dict(self.image_files)
+        if password is not None:
+            self.set_password(password)
+        self.reboot(downtime)
+
+    def is_up(self):
+        down_until = self._down_until
+        return down_until is None or poll.monotonic() >= down_until
+
+    # Serving
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _addr = self._sock.accept()
+            except (socket.error, AttributeError):
+                return
+            thread = threading.Thread(target=self._serve, args=(sock,))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, sock):
+        # A guest still booting has no sshd answering yet
+        if not self.is_up():
+            sock.close()
+            return
+        if self.connect_delay:
+            clock.sleep(self.connect_delay)
+
+        transport = paramiko.Transport(sock)
+        transport.add_server_key(_get_host_key())
+        try:
+            transport.start_server(server=_ServerInterface(self))
+        except (paramiko.SSHException, EOFError, socket.error), e:
+            LOG.debug("fake guest handshake failed: %s", e)
+            transport.close()
+            return
+        with self._lock:
+            self.connections += 1
+            self._transports.append(transport)
+
+    def _exec(self, channel, command):
+        with self._lock:
+            self.commands.append(command)
+        status, stdout, stderr = self.run(command)
+        try:
+            if stdout:
+                channel.sendall(stdout)
+            if stderr:
+                channel.sendall_stderr(stderr)
+            channel.send_exit_status(status)
+            # Only send EOF and leave closing the channel to the client:
+            # a close may overtake the reply to the exec request, which
+            # paramiko clients take for a failure
+            channel.shutdown_write()
+        except (socket.error, EOFError):
+            pass
+
+    def run(self, command):
+        """Run a shell command on the in-memory filesystem.
+
+        :returns: (exit status, stdout, stderr)
+
+        """
+        match = _ECHO_RE.match(command.strip())
+        if match:
+            newline, contents, path = match.groups()
+            self.write_file(path, contents + ('' if newline else '\n'))
+            return 0, '', ''
+
+        match = _CAT_RE.match(command.strip())
+        if match:
+            path = match.group(1)
+            if path == '/proc/uptime':
+                uptime = max(0.0, clock.time() - self.booted_at)
+                return 0, '%.2f %.2f\n' % (uptime, uptime), ''
+            with self._lock:
+                contents = self.files.get(path)
+            if contents is None:
+                return 1, '', 'cat: %s: No such file or directory\n' % path
+            return 0, contents, ''
+
+        name = command.split(' ', 1)[0]
+        return 127, '', 'sh: %s: command not found\n' % name
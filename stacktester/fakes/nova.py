@@ -0,0 +1,814 @@
+"""Stand-in for the Nova API, to run stacktester without an OpenStack.
+
+`FakeNova` implements the parts of the v1.1 API the suite uses (auth,
+servers and their actions, metadata and addresses, images and flavors) on
+a localhost HTTP server. Servers and images move through their statuses
+on a timer, compressed by `time_scale` so a build takes a fraction of a
+second, and latency and faults can be injected to exercise the client's
+polling, auth and connection handling deterministically:
+
+    with FakeNova(time_scale=0.01) as fake:
+        api = nova.API(fake.host, fake.port, 'v1.1/', 'admin', 'admin_key')
+        ...
+
+It can also be run on its own, e.g. to point the suite at it:
+
+    python -m stacktester.fakes.nova --port 8774
+
+"""
+
+import base64
+import BaseHTTPServer
+import hashlib
+import json
+import optparse
+import re
+import socket
+import SocketServer
+import sys
+import threading
+import time
+import urllib
+import urlparse
+import uuid
+
+from stacktester.common import clock
+from stacktester.common import poll
+
+
+# Seconds each transitional status lasts on a real cloud, before scaling
+DURATIONS = {
+    'BUILD': 60.0,
+    'REBOOT': 20.0,
+    'HARD_REBOOT': 30.0,
+    'REBUILD': 60.0,
+    'RESIZE': 90.0,
+    'REVERT_RESIZE': 30.0,
+    'PASSWORD': 5.0,
+    'SAVING': 30.0,
+    'DELETE': 5.0,
+}
+
+FLAVORS = {
+    '1': {'name': 'm1.tiny', 'ram': 512, 'disk': 0},
+    '2': {'name': 'm1.small', 'ram': 2048, 'disk': 20},
+    '3': {'name': 'm1.medium', 'ram': 4096, 'disk': 40},
+}
+
+IMAGES = {
+    '1': 'ubuntu-11.04',
+    '2': 'ubuntu-10.10',
+}
+
+
+class Fault(object):
+    """A canned error response for requests matching method and path."""
+
+    def __init__(self, method, pattern, status, times):
+        self.method = method
+        self.pattern = re.compile(pattern)
+        self.status = status
+        self.times = times
+
+    def matches(self, method, path):
+        return ((self.method is None or self.method == method) and
+                self.pattern.search(path) is not None)
+
+
+class _Entity(object):
+    """A server or image and the transition it is going through."""
+
+    def __init__(self, entity_id, name, status):
+        self.id = entity_id
+        self.name = name
+        self.status = status
+        self.metadata = {}
+        self.created = self.updated = _timestamp()
+        # (status being left, started, ends, next status, callback)
+        self.transition = None
+        self.deleted_at = None
+
+
+def _timestamp():
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+
+class FakeNova(object):
+    """In-memory Nova API served over HTTP on localhost."""
+
+    def __init__(self, host='127.0.0.1', port=0, base_url='v1.1',
+                 project_id='admin', users=None, time_scale=0.01,
+                 durations=None, latency=0, guest_address='127.0.0.1',
+                 guest=None):
+        """Initialize a fake Nova. Nothing is served until `start`.
+
+        :param port: Port to listen on, 0 picks a free one.
+        :param users: dict of user names to API keys. Defaults to
+                      {'admin': 'admin_key'}.
+        :param time_scale: Factor applied to every duration.
+        :param durations: Overrides of `DURATIONS`, in unscaled seconds.
+        :param latency: Seconds added to every response.
+        :param guest_address: IPv4 address reported for every server.
+        :param guest: `FakeGuest` standing in for every server, which is
+                      then rebooted, rebuilt and given passwords along
+                      with them. Its host replaces guest_address.
+
+        """
+        self.host = host
+        self.port = port
+        self.base_url = base_url.strip('/')
+        self.project_id = project_id
+        self.users = users or {'admin': 'admin_key'}
+        self.time_scale = time_scale
+        self.durations = dict(DURATIONS, **(durations or {}))
+        self.latency = latency
+        self.guest = guest
+        self.guest_address = guest and guest.host or guest_address
+
+        self.servers = {}
+        self.images = {}
+        self.requests = []
+        self._tokens = set()
+        self._faults = []
+        self._failing = {}
+        # Ids of new servers and images never reuse those of the catalog
+        first_id = max(int(image_id) for image_id in IMAGES) + 1
+        self._ids = iter(xrange(first_id, sys.maxint))
+        self._lock = threading.RLock()
+        self._httpd = None
+        self._thread = None
+
+        for image_id, name in sorted(IMAGES.items()):
+            image = _Entity(image_id, name, 'ACTIVE')
+            image.progress = 100
+            image.server_id = None
+            self.images[image_id] = image
+        self._routes = self._build_routes()
+
+    # Control of the fake
+
+    def start(self):
+        """Start serving on a background thread."""
+        self._httpd = _HTTPServer((self.host, self.port), _Handler)
+        self._httpd.fake = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd.close_connections()
+            self._thread.join()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def endpoint(self):
+        return 'http://%s:%s' % (self.host, self.port)
+
+    def add_fault(self, method=None, pattern='', status=500, times=1):
+        """Answer the next requests matching method and the path regex
+        pattern with an error status. times=None fails them forever."""
+        with self._lock:
+            self._faults.append(Fault(method, pattern, status, times))
+
+    def fail_transition(self, status, times=1):
+        """Send the next entities leaving status to ERROR instead."""
+        with self._lock:
+            self._failing[status] = self._failing.get(status, 0) + times
+
+    def revoke_tokens(self):
+        """Invalidate every token handed out so far."""
+        with self._lock:
+            self._tokens.clear()
+
+    # Request handling
+
+    def handle(self, method, path, headers, body):
+        """Answer one API request.
+
+        :param headers: dict of request headers with lower-cased names.
+        :returns: (status, dict of response headers, body)
+
+        """
+        if self.latency:
+            clock.sleep(self.latency)
+        path, _sep, query = path.partition('?')
+        with self._lock:
+            self.requests.append((method, path))
+            for fault in self._faults:
+                if fault.matches(method, path):
+                    if fault.times is not None:
+                        fault.times -= 1
+                        if fault.times <= 0:
+                            self._faults.remove(fault)
+                    return self._fault(fault.status, 'Injected fault')
+
+            if path.rstrip('/') == '/' + self.base_url:
+                return self._authenticate(headers)
+
+            prefix = '/%s/%s' % (self.base_url, self.project_id)
+            if not path.startswith(prefix + '/'):
+                return self._fault(404, 'Unknown resource')
+            if headers.get('x-auth-token') not in self._tokens:
+                return self._fault(401, 'Unauthorized')
+
+            resource = path[len(prefix):].rstrip('/')
+            for route_method, pattern, handler in self._routes:
+                match = pattern.match(resource)
+                if match and route_method == method:
+                    try:
+                        data = body and json.loads(body) or {}
+                    except ValueError:
+                        return self._fault(400, 'Malformed request body')
+                    response = handler(data, urlparse.parse_qs(query),
+                                       *match.groups())
+                    if method == 'GET':
+                        return self._conditional(headers, response)
+                    return response
+            return self._fault(404, 'Unknown resource')
+
+    def _build_routes(self):
+        routes = [
+            ('GET', r'/servers', self._list_servers),
+            ('GET', r'/servers/detail', self._list_servers_detail),
+            ('POST', r'/servers', self._create_server),
+            ('GET', r'/servers/(\w+)', self._show_server),
+            ('PUT', r'/servers/(\w+)', self._update_server),
+            ('DELETE', r'/servers/(\w+)', self._delete_server),
+            ('POST', r'/servers/(\w+)/action', self._server_action),
+            ('GET', r'/servers/(\w+)/metadata', self._show_metadata),
+            ('POST', r'/servers/(\w+)/metadata', self._update_metadata),
+            ('PUT', r'/servers/(\w+)/metadata', self._replace_metadata),
+            ('GET', r'/servers/(\w+)/metadata/(\w+)', self._show_meta),
+            ('PUT', r'/servers/(\w+)/metadata/(\w+)', self._set_meta),
+            ('DELETE', r'/servers/(\w+)/metadata/(\w+)', self._delete_meta),
+            ('GET', r'/servers/(\w+)/ips', self._show_ips),
+            ('GET', r'/servers/(\w+)/ips/(\w+)', self._show_network),
+            ('GET', r'/images', self._list_images),
+            ('GET', r'/images/detail', self._list_images_detail),
+            ('GET', r'/images/(\w+)', self._show_image),
+            ('DELETE', r'/images/(\w+)', self._delete_image),
+            ('GET', r'/flavors', self._list_flavors),
+            ('GET', r'/flavors/detail', self._list_flavors_detail),
+            ('GET', r'/flavors/(\w+)', self._show_flavor),
+        ]
+        return [(method, re.compile(pattern + '$'), handler)
+                for method, pattern, handler in routes]
+
+    def _authenticate(self, headers):
+        user = headers.get('x-auth-user')
+        if user not in self.users or \
+           self.users[user] != headers.get('x-auth-key'):
+            return self._fault(401, 'Unauthorized')
+        token = uuid.uuid4().hex
+        self._tokens.add(token)
+        management_url = '%s/%s/%s' % (self.endpoint, self.base_url,
+                                       self.project_id)
+        return 204, {'X-Auth-Token': token,
+                     'X-Server-Management-Url': management_url}, ''
+
+    # Responses
+
+    def _conditional(self, headers, response):
+        """Tag a successful GET with an ETag, answering 304 if the client
+        already has that version."""
+        status, response_headers, body = response
+        if status != 200:
+            return response
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        response_headers = dict(response_headers, ETag=etag)
+        if headers.get('if-none-match') == etag:
+            return 304, response_headers, ''
+        return status, response_headers, body
+
+    def _json(self, status, data, headers=None):
+        return status, headers or {}, json.dumps(data)
+
+    def _paginate(self, collection, path, view, entities, query):
+        """List the page of entities selected by the limit and marker query
+        parameters, linking to the next page if there is one."""
+        entities = list(entities)
+        ids = [str(getattr(e, 'id', e)) for e in entities]
+        start = 0
+        if 'marker' in query:
+            marker = query['marker'][0]
+            if marker not in ids:
+                return self._fault(400, 'Marker %s not found' % marker)
+            start = ids.index(marker) + 1
+        try:
+            limit = int(query.get('limit', [len(entities)])[0])
+        except ValueError:
+            return self._fault(400, 'Invalid limit')
+        data = {collection: [view(e) for e in entities[start:start + limit]]}
+        if limit and start + limit < len(entities):
+            data[collection + '_links'] = [{
+                'rel': 'next',
+                'href': '%s/%s/%s%s?%s' % (
+                    self.endpoint, self.base_url, self.project_id, path,
+                    urllib.urlencode({'limit': limit,
+                                      'marker': ids[start + limit - 1]})),
+            }]
+        return self._json(200, data)
+
+    def _fault(self, status, message):
+        names = {400: 'badRequest', 401: 'unauthorized',
+                 404: 'itemNotFound', 409: 'conflictingRequest'}
+        name = names.get(status, 'computeFault')
+        return self._json(status, {name: {'message': message,
+                                          'code': status}})
+
+    def _links(self, collection, entity_id):
+        path = '%s/%s/%s' % (self.project_id, collection, entity_id)
+        return [
+            {'rel': 'self',
+             'href': '%s/%s/%s' % (self.endpoint, self.base_url, path)},
+            {'rel': 'bookmark', 'href': '%s/%s' % (self.endpoint, path)},
+        ]
+
+    # State machine
+
+    def _scaled(self, status):
+        return self.durations[status] * self.time_scale
+
+    def _begin(self, entity, status, then, callback=None):
+        now = poll.monotonic()
+        entity.status = status
+        entity.updated = _timestamp()
+        entity.transition = (status, now, now + self._scaled(status), then,
+                             callback)
+
+    def _advance(self, entity):
+        """Bring an entity up to date; returns False once it is gone."""
+        now = poll.monotonic()
+        if entity.deleted_at is not None and now >= entity.deleted_at:
+            return False
+        if entity.transition is not None:
+            status, started, ends, then, callback = entity.transition
+            if now >= ends:
+                entity.transition = None
+                entity.updated = _timestamp()
+                if self._failing.get(status):
+                    self._failing[status] -= 1
+                    entity.status = 'ERROR'
+                else:
+                    entity.status = then
+                    if callback is not None:
+                        callback(entity)
+        return True
+
+    def _progress(self, entity):
+        if entity.transition is None:
+            return entity.status == 'ACTIVE' and 100 or 0
+        _status, started, ends, _then, _callback = entity.transition
+        if ends <= started:
+            return 100
+        return int(100 * (poll.monotonic() - started) / (ends - started))
+
+    def _live(self, entities):
+        for entity_id in sorted(entities.keys(), key=int):
+            if self._advance(entities[entity_id]):
+                yield entities[entity_id]
+            else:
+                del entities[entity_id]
+
+    def _get(self, entities, entity_id):
+        entity = entities.get(entity_id)
+        if entity is not None and not self._advance(entity):
+            del entities[entity_id]
+            entity = None
+        return entity
+
+    # Servers
+
+    def _server_basic(self, server):
+        return {'id': int(server.id), 'name': server.name,
+                'links': self._links('servers', server.id)}
+
+    def _server_detail(self, server):
+        data = self._server_basic(server)
+        data.update({
+            'uuid': server.uuid,
+            'hostId': server.host_id,
+            'status': server.status,
+            'progress': self._progress(server),
+            'metadata': dict(server.metadata),
+            'addresses': self._addresses(server),
+            'image': {'id': server.image_ref,
+                      'links': self._links('images', server.image_ref)},
+            'flavor': {'id': server.flavor_ref,
+                       'links': self._links('flavors', server.flavor_ref)},
+            'created': server.created,
+            'updated': server.updated,
+            'accessIPv4': server.access_ipv4,
+            'accessIPv6': server.access_ipv6,
+        })
+        return data
+
+    def _addresses(self, server):
+        if server.status == 'BUILD':
+            return {}
+        return {'public': [{'version': 4, 'addr': self.guest_address}]}
+
+    def _list_servers(self, data, query):
+        return self._paginate('servers', '/servers', self._server_basic,
+                              self._live(self.servers), query)
+
+    def _list_servers_detail(self, data, query):
+        return self._paginate('servers', '/servers/detail',
+                              self._server_detail, self._live(self.servers),
+                              query)
+
+    def _create_server(self, data, query):
+        try:
+            entity = data['server']
+            name = entity['name']
+            image_ref = entity['imageRef']
+            flavor_ref = entity['flavorRef']
+        except (KeyError, TypeError):
+            return self._fault(400, 'Malformed server entity')
+        if str(image_ref) not in self.images:
+            return self._fault(400, 'Cannot find requested image')
+        if str(flavor_ref) not in FLAVORS:
+            return self._fault(400, 'Cannot find requested flavor')
+        try:
+            files = [(item['path'], base64.b64decode(item['contents']))
+                     for item in entity.get('personality') or []]
+        except (KeyError, TypeError):
+            return self._fault(400, 'Malformed personality')
+
+        server = _Entity(str(next(self._ids)), name, 'BUILD')
+        server.uuid = str(uuid.uuid4())
+        server.host_id = hashlib.sha224(self.project_id).hexdigest()
+        server.image_ref = image_ref
+        server.flavor_ref = flavor_ref
+        server.old_flavor_ref = None
+        server.admin_pass = entity.get('adminPass') or uuid.uuid4().hex[:12]
+        server.access_ipv4 = entity.get('accessIPv4', '')
+        server.access_ipv6 = entity.get('accessIPv6', '')
+        server.metadata = dict(entity.get('metadata') or {})
+        self.servers[server.id] = server
+        self._begin(server, 'BUILD', 'ACTIVE')
+        if self.guest is not None:
+            self.guest.rebuild(self._scaled('BUILD'), server.admin_pass)
+            for path, contents in files:
+                self.guest.write_file(path, contents)
+
+        body = self._server_detail(server)
+        body['adminPass'] = server.admin_pass
+        return self._json(202, {'server': body})
+
+    def _show_server(self, data, query, server_id):
+        server = self._get(self.servers, server_id)
+        if server is None:
+            return self._fault(404, 'Server not found')
+        return self._json(200, {'server': self._server_detail(server)})
+
+    def _update_server(self, data, query, server_id):
+        server = self._get(self.servers, server_id)
+        if server is None:
+            return self._fault(404, 'Server not found')
+        changes = data.get('server') or {}
+        if 'name' in changes:
+            server.name = changes['name']
+        if 'accessIPv4' in changes:
+            server.access_ipv4 = changes['accessIPv4']
+        if 'accessIPv6' in changes:
+            server.access_ipv6 = changes['accessIPv6']
+        server.updated = _timestamp()
+        return self._json(200, {'server': self._server_detail(server)})
+
+    def _delete_server(self, data, query, server_id):
+        server = self._get(self.servers, server_id)
+        if server is None:
+            return self._fault(404, 'Server not found')
+        if server.deleted_at is None:
+            server.deleted_at = poll.monotonic() + self._scaled('DELETE')
+        return 204, {}, ''
+
+    def _server_action(self, data, query, server_id):
+        server = self._get(self.servers, server_id)
+        if server is None:
+            return self._fault(404, 'Server not found')
+        if len(data) != 1:
+            return self._fault(400, 'Exactly one action is required')
+        action, args = data.items()[0]
+        handler = getattr(self, '_action_%s' % action, None)
+        if handler is None:
+            return self._fault(400, 'Unknown action %s' % action)
+        if action not in ('createImage',) and server.transition is not None:
+            return self._fault(409, 'Server is in status %s' %
+                               server.status)
+        return handler(server, args or {})
+
+    def _action_reboot(self, server, args):
+        status = args.get('type') == 'HARD' and 'HARD_REBOOT' or 'REBOOT'
+        self._begin(server, status, 'ACTIVE')
+        if self.guest is not None:
+            self.guest.reboot(self._scaled(status))
+        return 202, {}, ''
+
+    def _action_rebuild(self, server, args):
+        image_ref = args.get('imageRef')
+        if str(image_ref) not in self.images:
+            return self._fault(400, 'Cannot find requested image')
+
+        def rebuilt(server):
+            server.image_ref = image_ref
+        server.admin_pass = args.get('adminPass') or uuid.uuid4().hex[:12]
+        self._begin(server, 'REBUILD', 'ACTIVE', rebuilt)
+        if self.guest is not None:
+            self.guest.rebuild(self._scaled('REBUILD'), server.admin_pass)
+        body = self._server_detail(server)
+        body['adminPass'] = server.admin_pass
+        return self._json(202, {'server': body})
+
+    def _action_resize(self, server, args):
+        flavor_ref = args.get('flavorRef')
+        if str(flavor_ref) not in FLAVORS:
+            return self._fault(400, 'Cannot find requested flavor')
+
+        def resized(server):
+            server.old_flavor_ref = server.flavor_ref
+            server.flavor_ref = flavor_ref
+        self._begin(server, 'RESIZE', 'VERIFY_RESIZE', resized)
+        return 202, {}, ''
+
+    def _action_confirmResize(self, server, args):
+        if server.status != 'VERIFY_RESIZE':
+            return self._fault(409, 'Server is not resized')
+        server.status = 'ACTIVE'
+        server.old_flavor_ref = None
+        return 204, {}, ''
+
+    def _action_revertResize(self, server, args):
+        if server.status != 'VERIFY_RESIZE':
+            return self._fault(409, 'Server is not resized')
+
+        def reverted(server):
+            server.flavor_ref = server.old_flavor_ref
+            server.old_flavor_ref = None
+        self._begin(server, 'REVERT_RESIZE', 'ACTIVE', reverted)
+        return 202, {}, ''
+
+    def _action_changePassword(self, server, args):
+        if not args.get('adminPass'):
+            return self._fault(400, 'adminPass is required')
+        server.admin_pass = args['adminPass']
+        self._begin(server, 'PASSWORD', 'ACTIVE')
+        if self.guest is not None:
+            self.guest.set_password(server.admin_pass)
+        return 202, {}, ''
+
+    def _action_createImage(self, server, args):
+        if not args.get('name'):
+            return self._fault(400, 'name is required')
+        image = _Entity(str(next(self._ids)), args['name'], 'SAVING')
+        image.server_id = server.id
+        image.metadata = dict(args.get('metadata') or {})
+        self.images[image.id] = image
+        self._begin(image, 'SAVING', 'ACTIVE')
+        location = self._links('images', image.id)[0]['href']
+        return 202, {'Location': location}, ''
+
+    # Metadata and addresses
+
+    def _show_metadata(self, data, query, server_id):
+        server = self._get(self.servers, server_id)
+        if server is None:
+            return self._fault(404, 'Server not found')
+        return self._json(200, {'metadata': dict(server.metadata)})
+
+    def _update_metadata(self, data, query, server_id):
+        server = self._get(self.servers, server_id)
+        if server is None:
+            return self._fault(404, 'Server not found')
+        server.metadata.update(data.get('metadata') or {})
+        return self._json(200, {'metadata': dict(server.metadata)})
+
+    def _replace_metadata(self, data, query, server_id):
+        server = self._get(self.servers, server_id)
+        if server is None:
+            return self._fault(404, 'Server not found')
+        server.metadata = dict(data.get('metadata') or {})
+        return self._json(200, {'metadata': dict(server.metadata)})
+
+    def _show_meta(self, data, query, server_id, key):
+        server = self._get(self.servers, server_id)
+        if server is None or key not in server.metadata:
+            return self._fault(404, 'Metadata item not found')
+        return self._json(200, {'meta': {key: server.metadata[key]}})
+
+    def _set_meta(self, data, query, server_id, key):
+        server = self._get(self.servers, server_id)
+        if server is None:
+            return self._fault(404, 'Server not found')
+        meta = data.get('meta') or {}
+        if meta.keys() != [key]:
+            return self._fault(400, 'Request body and URI mismatch')
+        server.metadata[key] = meta[key]
+        return self._json(200, {'meta': meta})
+
+    def _delete_meta(self, data, query, server_id, key):
+        server = self._get(self.servers, server_id)
+        if server is None or key not in server.metadata:
+            return self._fault(404, 'Metadata item not found')
+        del server.metadata[key]
+        return 204, {}, ''
+
+    def _show_ips(self, data, query, server_id):
+        server = self._get(self.servers, server_id)
+        if server is None:
+            return self._fault(404, 'Server not found')
+        return self._json(200, {'addresses': self._addresses(server)})
+
+    def _show_network(self, data, query, server_id, network):
+        server = self._get(self.servers, server_id)
+        addresses = server and self._addresses(server) or {}
+        if network not in addresses:
+            return self._fault(404, 'Network not found')
+        return self._json(200, {network: addresses[network]})
+
+    # Images
+
+    def _image_basic(self, image):
+        return {'id': int(image.id), 'name': image.name,
+                'links': self._links('images', image.id)}
+
+    def _image_detail(self, image):
+        data = self._image_basic(image)
+        data.update({
+            'status': image.status,
+            'progress': self._progress(image),
+            'metadata': dict(image.metadata),
+            'created': image.created,
+            'updated': image.updated,
+        })
+        if image.server_id is not None:
+            data['server'] = {
+                'id': int(image.server_id),
+                'links': self._links('servers', image.server_id),
+            }
+        return data
+
+    def _list_images(self, data, query):
+        return self._paginate('images', '/images', self._image_basic,
+                              self._live(self.images), query)
+
+    def _list_images_detail(self, data, query):
+        return self._paginate('images', '/images/detail',
+                              self._image_detail, self._live(self.images),
+                              query)
+
+    def _show_image(self, data, query, image_id):
+        image = self._get(self.images, image_id)
+        if image is None:
+            return self._fault(404, 'Image not found')
+        return self._json(200, {'image': self._image_detail(image)})
+
+    def _delete_image(self, data, query, image_id):
+        image = self._get(self.images, image_id)
+        if image is None:
+            return self._fault(404, 'Image not found')
+        del self.images[image_id]
+        return 204, {}, ''
+
+    # Flavors
+
+    def _flavor_basic(self, flavor_id):
+        return {'id': int(flavor_id), 'name': FLAVORS[flavor_id]['name'],
+                'links': self._links('flavors', flavor_id)}
+
+    def _flavor_detail(self, flavor_id):
+        data = self._flavor_basic(flavor_id)
+        data['ram'] = FLAVORS[flavor_id]['ram']
+        data['disk'] = FLAVORS[flavor_id]['disk']
+        return data
+
+    def _list_flavors(self, data, query):
+        return self._paginate('flavors', '/flavors', self._flavor_basic,
+                              sorted(FLAVORS, key=int), query)
+
+    def _list_flavors_detail(self, data, query):
+        return self._paginate('flavors', '/flavors/detail',
+                              self._flavor_detail, sorted(FLAVORS, key=int),
+                              query)
+
+    def _show_flavor(self, data, query, flavor_id):
+        if flavor_id not in FLAVORS:
+            return self._fault(404, 'Flavor not found')
+        return self._json(200, {'flavor': self._flavor_detail(flavor_id)})
+
+
+class _HTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Threaded HTTP server which can hang up its kept-alive connections.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, server_address, handler_class):
+        BaseHTTPServer.HTTPServer.__init__(self, server_address,
+                                           handler_class)
+        self.connections = set()
+        self.connections_lock = threading.Condition()
+
+    def process_request(self, request, client_address):
+        # Registered before the handler thread starts, so a connection
+        # accepted right before shutdown is hung up as well
+        with self.connections_lock:
+            self.connections.add(request)
+        SocketServer.ThreadingMixIn.process_request(self, request,
+                                                    client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            SocketServer.ThreadingMixIn.process_request_thread(
+                    self, request, client_address)
+        finally:
+            with self.connections_lock:
+                self.connections.discard(request)
+                self.connections_lock.notify_all()
+
+    def close_connections(self, timeout=1):
+        """Hang up every connection and wait up to timeout seconds for
+        their handler threads to finish."""
+        with self.connections_lock:
+            connections = list(self.connections)
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        deadline = time.time() + timeout
+        with self.connections_lock:
+            while self.connections and time.time() < deadline:
+                self.connections_lock.wait(deadline - time.time())
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Hands requests to the `FakeNova` of the server, keeping connections
+    alive like the real API does."""
+
+    protocol_version = 'HTTP/1.1'
+    # Send each response in one piece rather than header by header, which
+    # stalls kept-alive connections on delayed ACKs
+    wbufsize = -1
+
+    def _dispatch(self):
+        length = int(self.headers.get('content-length') or 0)
+        body = length and self.rfile.read(length) or ''
+        headers = dict((k.lower(), v) for k, v in self.headers.items())
+        status, response_headers, response_body = self.server.fake.handle(
+                self.command, self.path, headers, body)
+
+        self.send_response(status)
+        for name, value in response_headers.items():
+            self.send_header(name, value)
+        if response_body:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv=None):
+    parser = optparse.OptionParser()
+    parser.add_option("--host", dest="host", default="127.0.0.1",
+                      help="Address to listen on.")
+    parser.add_option("--port", dest="port", type="int", default=8774,
+                      help="Port to listen on.")
+    parser.add_option("--time-scale", dest="time_scale", type="float",
+                      default=0.01,
+                      help="Factor applied to every status duration.")
+    parser.add_option("--latency", dest="latency", type="float", default=0,
+                      help="Seconds added to every response.")
+    options, args = parser.parse_args(argv)
+
+    fake = FakeNova(options.host, options.port,
+                    time_scale=options.time_scale, latency=options.latency)
+    fake.start()
+    print "Fake Nova listening on %s" % fake.endpoint
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
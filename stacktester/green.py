@@ -0,0 +1,96 @@
+"""Cooperative Nova client for driving many servers from one process.
+
+Requires eventlet, which is not a hard dependency of stacktester: install
+the "green" extra for it.
+
+"""
+
+from stacktester import nova
+from stacktester.common import http
+
+try:
+    import eventlet
+    import eventlet.semaphore
+    # After the plain httplib2 is imported, so it is not clobbered
+    httplib2 = eventlet.import_patched('httplib2')
+except ImportError:
+    eventlet = None
+
+
+class GreenAPI(nova.API):
+    """Nova API client whose requests and waits yield to other green threads.
+
+    Offers the same methods as `nova.API` (authenticate, request,
+    create_server, get_server, delete_server, wait_for_server_status,
+    wait_for_image_status, ...), but HTTP goes through eventlet's green
+    sockets and polling sleeps on the eventlet hub. Run the calls with
+    `spawn` to have hundreds of server lifecycles in flight on a single OS
+    thread:
+
+        api = GreenAPI(host, port, base_url, user, api_key)
+        threads = [api.spawn(api.create_server, entity)
+                   for entity in entities]
+        servers = [thread.wait() for thread in threads]
+
+    Keep-alive connections are reused through a private
+    `http.ConnectionPool` of green `httplib2.Http` objects.
+
+    """
+
+    def __init__(self, host, port, base_url, user, api_key, project_id='',
+                 auth_ttl=None, poll_strategy=None, concurrency=1000,
+                 http_pool_size=100, http_idle_timeout=60):
+        """Initialize a green Nova HTTP API client.
+
+        Takes the same arguments as `nova.API` plus:
+
+        :param concurrency: Maximum number of green threads run by `spawn`
+                            at once.
+        :param http_pool_size: Idle keep-alive connections kept per host.
+        :param http_idle_timeout: Seconds an idle connection is kept open.
+        :raises: ImportError if eventlet is not installed
+
+        """
+        if eventlet is None:
+            raise ImportError("GreenAPI requires eventlet")
+        super(GreenAPI, self).__init__(host, port, base_url, user, api_key,
+                                       project_id, auth_ttl, poll_strategy)
+        self.pool = http.ConnectionPool(http_pool_size, http_idle_timeout,
+                                        http_factory=httplib2.Http)
+        self.green_pool = eventlet.GreenPool(concurrency)
+        self._auth_lock = eventlet.semaphore.Semaphore()
+
+    def sleep(self, seconds):
+        eventlet.sleep(seconds)
+
+    def run_in_background(self, func):
+        # Outside of green_pool, which may be full of the callers waiting
+        return eventlet.spawn(func).wait
+
+    def _get_auth_token(self):
+        # Green threads starting together would otherwise all authenticate
+        with self._auth_lock:
+            return super(GreenAPI, self)._get_auth_token()
+
+    def spawn(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) in a green thread.
+
+        Blocks only if `concurrency` green threads are already running.
+
+        :returns: `eventlet.greenthread.GreenThread`; its wait() returns the
+                  result of func or raises its exception
+
+        """
+        return self.green_pool.spawn(func, *args, **kwargs)
+
+    def imap(self, func, *iterables):
+        """Like itertools.imap, running the calls concurrently.
+
+        Results are yielded in the order of the arguments.
+
+        """
+        return self.green_pool.imap(func, *iterables)
+
+    def waitall(self):
+        """Wait for every green thread started with `spawn` to finish."""
+        self.green_pool.waitall()
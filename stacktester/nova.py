@@ -1,15 +1,122 @@
 import json
 import logging
 import subprocess
+import sys
+import threading
+import urllib
+import urlparse
 
 import stacktester.common.http
 from stacktester import exceptions
+from stacktester import timeline
+from stacktester.common import clock
+from stacktester.common import instrument
+from stacktester.common import jsonutils
+from stacktester.common import poll
+
+
+class _StatusTracker(object):
+    """Follows the statuses one entity goes through while it is waited on.
+    """
+
+    def __init__(self, entity_name, entity_id, status, terminal_states,
+                 detect_regressions):
+        self.entity_name = entity_name
+        self.entity_id = entity_id
+        self.status = status
+        self.terminal_states = frozenset(terminal_states)
+        self.detect_regressions = detect_regressions
+        self.statuses = []
+        self.entity = None
+        self.body = None
+        self.timeline = timeline.start(entity_name, entity_id, status)
+
+    def observe(self, current, entity, progress=None, body=None):
+        """Record an observed status.
+
+        :param entity: dict of the entity's attributes, if decoded.
+        :param progress: Progress of the entity, when entity is None.
+        :param body: Response body of the entity, decoded only if the wait
+                     fails, when entity is None.
+        :returns: True once the target status is reached
+        :raises: EntityStatusException if the target can no longer be
+                 reached
+
+        """
+        if entity is not None or body is not None:
+            self.entity, self.body = entity, body
+        if entity is not None:
+            progress = entity.get('progress')
+        if self.timeline is not None:
+            self.timeline.observe(current, progress)
+
+        if not self.statuses or self.statuses[-1] != current:
+            # Going back to a status that was already left means the
+            # transition was undone (e.g. a failed resize going back to
+            # ACTIVE), so the target will never show up
+            regressed = (self.detect_regressions and
+                         current != self.status and
+                         current in self.statuses)
+            self.statuses.append(current)
+            if regressed:
+                self.fail('regressed to status %s' % current)
+
+        if current == self.status:
+            if self.timeline is not None:
+                self.timeline.outcome = 'reached'
+            return True
+        if current in self.terminal_states:
+            self.fail('entered terminal status %s' % current)
+        return False
+
+    def fail(self, reason):
+        if self.timeline is not None:
+            self.timeline.outcome = reason
+        if self.entity is None and self.body is not None:
+            try:
+                self.entity = jsonutils.loads(self.body)[self.entity_name]
+            except (ValueError, KeyError, TypeError):
+                pass
+        raise exceptions.EntityStatusException(self.entity_name,
+                                               self.entity_id,
+                                               self.status,
+                                               self.statuses,
+                                               self.entity,
+                                               reason)
 
 
 class API(stacktester.common.http.Client):
     """Barebones Nova HTTP API client."""
 
-    def __init__(self, host, port, base_url, user, api_key, project_id=''):
+    # Statuses which end a status wait immediately, keyed by entity type and
+    # then by the status being waited for (None applies to any status
+    # without its own entry). DELETED stands for the entity not existing.
+    TERMINAL_STATES = {
+        'server': {
+            None: ('ERROR', 'DELETED'),
+            'DELETED': (),
+        },
+        'image': {
+            None: ('ERROR', 'DELETED'),
+            'DELETED': (),
+        },
+    }
+
+    # Whether returning to a previously left status ends a status wait
+    DETECT_REGRESSIONS = True
+
+    # Paths of the catalogs, which do not change unless the tests change
+    # them and are worth caching
+    CATALOG_PATHS = (r'/flavors(/|$)', r'/images(/|$)')
+
+    # Server actions such as createImage add to the images catalog
+    CACHE_INVALIDATES = {'servers': ('images',)}
+
+    # Entities requested per page by the list iterators
+    PAGE_SIZE = 100
+
+    def __init__(self, host, port, base_url, user, api_key, project_id='',
+                 auth_ttl=None, poll_strategy=None, cache=None):
         """Initialize Nova HTTP API client.
 
         :param host: Hostname/IP of the Nova API to test.
@@ -17,15 +124,28 @@ class API(stacktester.common.http.Client):
         :param base_url: Version identifier (normally /v1.0 or /v1.1)
         :param user: The username to use for tests.
         :param api_key: The API key of the user.
+        :param auth_ttl: Seconds to reuse a cached auth token before
+                         re-authenticating. None reuses it until the API
+                         answers with a 401.
+        :param poll_strategy: Default `poll.PollStrategy` for the status
+                              waiters. Defaults to exponential backoff.
+        :param cache: `http.ResponseCache` to reuse GET responses from.
         :returns: None
 
         """
-        super(API, self).__init__(host, port, base_url)
+        poll_strategy = poll_strategy or poll.ExponentialBackoff()
+        super(API, self).__init__(host, port, base_url,
+                                  poll_strategy=poll_strategy, cache=cache)
         self.user = user
         self.api_key = api_key
         self.project_id = project_id
+        # Users sharing the management URL may be shown different listings
+        self.cache_scope = (user, project_id)
+        self.auth_ttl = auth_ttl
         # Default to same as base_url, but will be change on auth
         self.management_url = self.base_url
+        self._auth_token = None
+        self._auth_expires = None
 
     def authenticate(self, user, api_key, project_id):
         """Request and return an authentication token from Nova.
@@ -51,45 +171,238 @@ class API(stacktester.common.http.Client):
             print "Failed to authenticate user"
             raise
 
-    def _wait_for_entity_status(self, url, entity_name, status, **kwargs):
+    def _get_auth_token(self):
+        """Return the cached auth token, authenticating if it is missing
+        or has outlived auth_ttl."""
+        expired = (self._auth_expires is not None and
+                   clock.monotonic() >= self._auth_expires)
+        if self._auth_token is None or expired:
+            started = instrument.start()
+            self._auth_token = self.authenticate(self.user, self.api_key,
+                                                 self.project_id)
+            instrument.stop(started, 'auth', 'authenticate')
+            if self.auth_ttl is None:
+                self._auth_expires = None
+            else:
+                self._auth_expires = clock.monotonic() + self.auth_ttl
+        return self._auth_token
+
+    def invalidate_auth_token(self):
+        """Forget the cached auth token so the next request re-authenticates.
+        """
+        self._auth_token = None
+        self._auth_expires = None
+
+    def _status_tracker(self, entity_name, entity_id, status,
+                        terminal_states=None, detect_regressions=None):
+        """Build the tracker for one waited-on entity, falling back to the
+        class defaults for anything the caller did not override."""
+        if terminal_states is None:
+            by_status = self.TERMINAL_STATES.get(entity_name, {})
+            terminal_states = by_status.get(status, by_status.get(None, ()))
+        if detect_regressions is None:
+            detect_regressions = self.DETECT_REGRESSIONS
+        return _StatusTracker(entity_name, entity_id, status,
+                              terminal_states, detect_regressions)
+
+    def _wait_for_entity_status(self, url, entity_name, entity_id, status,
+                                **kwargs):
         """Poll the provided url until expected entity status is returned"""
+        tracker = self._status_tracker(
+                entity_name, entity_id, status,
+                terminal_states=kwargs.pop('terminal_states', None),
+                detect_regressions=kwargs.pop('detect_regressions', None))
 
         def check_response(resp, body):
+            if resp.status == 404:
+                return tracker.observe('DELETED', None)
+            # Only the status and progress are needed on every tick
             try:
-                data = json.loads(body)
-                return data[entity_name]['status'] == status
-            except (ValueError, KeyError):
+                status, progress = jsonutils.extract(
+                        body, (entity_name, 'status'),
+                        (entity_name, 'progress'))
+            except ValueError:
+                return False
+            if status is None:
                 return False
+            return tracker.observe(status, None, progress, body)
 
         try:
             self.poll_request('GET', url, check_response, **kwargs)
         except exceptions.TimeoutException:
-            msg = "%s failed to reach status %s" % (entity_name, status)
-            raise AssertionError(msg)
+            tracker.fail('timed out')
 
-    def wait_for_server_status(self, server_id, status='ACTIVE', **kwargs):
+    def wait_for_server_status(self, server_id, status='ACTIVE',
+                               strategy=None, **kwargs):
         """Wait for the server status to be equal to the status passed in.
 
         :param server_id: Server ID to query.
         :param status: The status string to look for.
+        :param strategy: `poll.PollStrategy` to pace the polling with.
         :returns: None
-        :raises: AssertionError if request times out
+        :raises: EntityStatusException (an AssertionError) if the request
+                 times out or the server enters a terminal state
 
         """
         url = '/servers/%s' % server_id
-        return self._wait_for_entity_status(url, 'server', status, **kwargs)
+        return self._wait_for_entity_status(url, 'server', server_id, status,
+                                            strategy=strategy, **kwargs)
 
-    def wait_for_image_status(self, image_id, status='ACTIVE', **kwargs):
+    def wait_for_image_status(self, image_id, status='ACTIVE',
+                              strategy=None, **kwargs):
         """Wait for the image status to be equal to the status passed in.
 
         :param image_id: Image ID to query.
         :param status: The status string to look for.
+        :param strategy: `poll.PollStrategy` to pace the polling with.
         :returns: None
-        :raises: AssertionError if request times out
+        :raises: EntityStatusException (an AssertionError) if the request
+                 times out or the image enters a terminal state
 
         """
         url = '/images/%s' % image_id
-        return self._wait_for_entity_status(url, 'image', status, **kwargs)
+        return self._wait_for_entity_status(url, 'image', image_id, status,
+                                            strategy=strategy, **kwargs)
+
+    def _iter_entities_status(self, url, entity_name, collection_name,
+                              entity_ids, status, **kwargs):
+        """Poll a detail listing until each entity reaches the given status.
+
+        Every tick reads the listing, following its pages only as far as
+        needed to find all of the pending entities, and updates them from
+        it. An entity missing from the whole listing is considered DELETED.
+
+        :param timeout: Seconds to wait for each entity, or a dict mapping
+                        entity ids to their own timeout.
+        :returns: generator of (entity_id, entity) pairs in the order the
+                  entities reach the status. entity is None for DELETED.
+        :raises: EntityStatusException if an entity times out or enters
+                 a terminal state
+
+        """
+        timeout = kwargs.pop('timeout', 180)
+        strategy = self._get_poll_strategy(kwargs)
+        delays = strategy.delays()
+        terminal_states = kwargs.pop('terminal_states', None)
+        detect_regressions = kwargs.pop('detect_regressions', None)
+        kwargs.setdefault('cache', False)
+
+        if isinstance(timeout, dict):
+            timeouts = dict((str(k), v) for k, v in timeout.items())
+            default_timeout = 180
+        else:
+            timeouts = {}
+            default_timeout = timeout
+
+        pending = {}
+        for entity_id in entity_ids:
+            entity_id = str(entity_id)
+            entity_timeout = timeouts.get(entity_id, default_timeout)
+            tracker = self._status_tracker(entity_name, entity_id, status,
+                                           terminal_states,
+                                           detect_regressions)
+            pending[entity_id] = (tracker, poll.Deadline(entity_timeout))
+
+        started = instrument.start()
+        polls = 0
+        try:
+            while pending:
+                polls += 1
+                # None for an unusable listing: nothing can be concluded
+                # this tick
+                resp, entities = self._find_in_listing(
+                    url, collection_name, pending, **kwargs)
+
+                for entity_id in sorted(pending.keys()):
+                    tracker, deadline = pending[entity_id]
+                    if entities is not None:
+                        entity = entities.get(entity_id)
+                        if entity is None:
+                            current = 'DELETED'
+                        else:
+                            current = entity.get('status')
+
+                        # Listed without a status: nothing to observe yet
+                        if current is not None and \
+                           tracker.observe(current, entity):
+                            del pending[entity_id]
+                            yield entity_id, entity
+                            continue
+
+                    if deadline.expired():
+                        tracker.fail('timed out')
+
+                if pending:
+                    deadline = min([d for t, d in pending.values()],
+                                   key=lambda d: d.expires)
+                    self.sleep(poll.next_delay(delays, resp, deadline))
+        finally:
+            instrument.stop(started, 'poll', instrument.url_template(url),
+                            polls=polls)
+
+    def iter_servers_status(self, server_ids, status='ACTIVE',
+                            strategy=None, **kwargs):
+        """Yield (server_id, server) as each server reaches the status.
+
+        Reads /servers/detail once per tick for all servers.
+
+        :param server_ids: Server IDs to wait on.
+        :param status: The status string to look for.
+        :param strategy: `poll.PollStrategy` to pace the polling with.
+        :raises: EntityStatusException if a server times out or enters a
+                 terminal state
+
+        """
+        return self._iter_entities_status('/servers/detail', 'server',
+                                          'servers', server_ids, status,
+                                          strategy=strategy, **kwargs)
+
+    def wait_for_servers_status(self, server_ids, status='ACTIVE',
+                                strategy=None, **kwargs):
+        """Wait for every server to reach the status.
+
+        :param server_ids: Server IDs to wait on.
+        :param status: The status string to look for.
+        :param strategy: `poll.PollStrategy` to pace the polling with.
+        :returns: dict mapping server IDs to their last seen attributes
+        :raises: EntityStatusException if a server times out or enters a
+                 terminal state
+
+        """
+        return dict(self.iter_servers_status(server_ids, status,
+                                             strategy=strategy, **kwargs))
+
+    def iter_images_status(self, image_ids, status='ACTIVE',
+                           strategy=None, **kwargs):
+        """Yield (image_id, image) as each image reaches the status.
+
+        Reads /images/detail once per tick for all images.
+
+        :param image_ids: Image IDs to wait on.
+        :param status: The status string to look for.
+        :param strategy: `poll.PollStrategy` to pace the polling with.
+        :raises: EntityStatusException if an image times out or enters a
+                 terminal state
+
+        """
+        return self._iter_entities_status('/images/detail', 'image',
+                                          'images', image_ids, status,
+                                          strategy=strategy, **kwargs)
+
+    def wait_for_images_status(self, image_ids, status='ACTIVE',
+                               strategy=None, **kwargs):
+        """Wait for every image to reach the status.
+
+        :param image_ids: Image IDs to wait on.
+        :param status: The status string to look for.
+        :param strategy: `poll.PollStrategy` to pace the polling with.
+        :returns: dict mapping image IDs to their last seen attributes
+        :raises: EntityStatusException if an image times out or enters a
+                 terminal state
+
+        """
+        return dict(self.iter_images_status(image_ids, status,
+                                            strategy=strategy, **kwargs))
 
     def request(self, method, url, **kwargs):
         """Generic HTTP request on the Nova API.
@@ -103,10 +416,18 @@ class API(stacktester.common.http.Client):
         headers = kwargs.get('headers', {})
         project_id = kwargs.get('project_id', self.project_id)
 
-        headers['X-Auth-Token'] = self.authenticate(self.user, self.api_key,
-                                                    self.project_id)
+        headers['X-Auth-Token'] = self._get_auth_token()
         kwargs['headers'] = headers
-        return super(API, self).request(method, url, **kwargs)
+        resp, body = super(API, self).request(method, url, **kwargs)
+
+        # The cached token was revoked or expired server-side, so get a
+        # fresh one and retry exactly once
+        if resp.status == 401:
+            self.invalidate_auth_token()
+            headers['X-Auth-Token'] = self._get_auth_token()
+            resp, body = super(API, self).request(method, url, **kwargs)
+
+        return resp, body
 
     def get_server(self, server_id):
         """Fetch a server by id
@@ -119,7 +440,7 @@ class API(stacktester.common.http.Client):
         resp, body = self.request('GET', '/servers/%s' % server_id)
         try:
             assert resp['status'] == '200'
-            data = json.loads(body)
+            data = jsonutils.loads(body)
             return data['server']
         except (AssertionError, ValueError, TypeError, KeyError):
             raise exceptions.ServerNotFound(server_id)
@@ -139,11 +460,26 @@ class API(stacktester.common.http.Client):
         resp, body = self.request('POST', '/servers', body=post_body)
         try:
             assert resp['status'] == '202'
-            data = json.loads(body)
+            data = jsonutils.loads(body)
             return data['server']
         except (AssertionError, ValueError, TypeError, KeyError):
             raise AssertionError("Failed to create server")
 
+    def reboot_server(self, server_id, reboot_type='SOFT'):
+        """Attempt to reboot a server.
+
+        :param server_id: server identifier
+        :param reboot_type: SOFT or HARD
+        :returns: None
+        :raises: AssertionError if the reboot request is refused
+
+        """
+        post_body = json.dumps({'reboot': {'type': reboot_type}})
+        url = '/servers/%s/action' % server_id
+        resp, body = self.request('POST', url, body=post_body)
+        if resp['status'] != '202':
+            raise AssertionError("Failed to reboot server %s" % server_id)
+
     def delete_server(self, server_id):
         """Attempt to delete a server.
 
@@ -153,3 +489,183 @@ class API(stacktester.common.http.Client):
         """
         url = '/servers/%s' % server_id
         response, body = self.request('DELETE', url)
+
+    def delete_image(self, image_id):
+        """Attempt to delete an image.
+
+        :param image_id: image identifier
+        :returns: None
+
+        """
+        url = '/images/%s' % image_id
+        response, body = self.request('DELETE', url)
+
+    def iter_servers(self, detail=False, limit=None, prefetch=True):
+        """Yield every server, one page of the listing at a time.
+
+        :param detail: Whether to list the detailed server entities.
+        :param limit: Servers to request per page. Defaults to PAGE_SIZE.
+        :param prefetch: Fetch the next page while the current one is
+                         being consumed.
+        :returns: generator of dicts of server attributes
+        :raises: AssertionError if a page cannot be fetched
+
+        """
+        return self._iter_collection('servers', detail, limit, prefetch)
+
+    def iter_images(self, detail=True, limit=None, prefetch=True):
+        """Yield every image, one page of the listing at a time.
+
+        See `iter_servers` for the parameters.
+
+        """
+        return self._iter_collection('images', detail, limit, prefetch)
+
+    def iter_flavors(self, detail=True, limit=None, prefetch=True):
+        """Yield every flavor, one page of the listing at a time.
+
+        See `iter_servers` for the parameters.
+
+        """
+        return self._iter_collection('flavors', detail, limit, prefetch)
+
+    def _iter_collection(self, collection, detail, limit, prefetch):
+        """Follow the pages of a listing, through its 'next' links or else
+        with limit/marker, so that at most two pages are held at once."""
+        limit = limit or self.PAGE_SIZE
+        path = '/%s%s' % (collection, detail and '/detail' or '')
+        url = '%s?%s' % (path, urllib.urlencode({'limit': limit}))
+        page = self._fetch_page(url, collection)
+        while True:
+            entities, next_url = page()
+            if next_url is None and len(entities) == limit:
+                next_url = '%s?%s' % (path, urllib.urlencode({
+                    'limit': limit, 'marker': entities[-1]['id']}))
+            if next_url == url:
+                # The server ignores the marker; stop rather than loop
+                next_url = None
+            if next_url is not None:
+                url = next_url
+                if prefetch:
+                    page = self._fetch_page_async(next_url, collection)
+                else:
+                    page = self._fetch_page(next_url, collection)
+            for entity in entities:
+                yield entity
+            if next_url is None:
+                return
+            # Drop this page before the next one is waited on
+            del entities
+
+    def _fetch_page(self, url, collection):
+        """Fetch one page of a listing.
+
+        :returns: callable returning (entities, url of the next page or
+                  None)
+
+        """
+        resp, entities, next_url = self._get_page(url, collection)
+        if entities is None:
+            raise AssertionError("Failed to list %s (status %s)" %
+                                 (collection, resp.status))
+        return lambda: (entities, next_url)
+
+    def _get_page(self, url, collection, **kwargs):
+        """GET one page of a listing.
+
+        :param url: Path, or absolute URL as found in a 'next' link.
+        :returns: (response, entities, url of the next page or None);
+                  entities is None if the page could not be read
+
+        """
+        if url.startswith(self.management_url + '/'):
+            url = url[len(self.management_url):]
+        elif '://' in url:
+            parts = urlparse.urlsplit(url)
+            kwargs['base_url'] = '%s://%s' % (parts.scheme, parts.netloc)
+            url = urlparse.urlunsplit(('', '', parts.path, parts.query, ''))
+
+        resp, body = self.request('GET', url, **kwargs)
+        try:
+            assert resp.status == 200
+            data = jsonutils.loads(body)
+            entities = data[collection]
+            assert isinstance(entities, list)
+            assert all(isinstance(e, dict) and 'id' in e for e in entities)
+        except (AssertionError, ValueError, TypeError, KeyError):
+            return resp, None, None
+        next_url = None
+        for link in data.get('%s_links' % collection, ()):
+            if link.get('rel') == 'next':
+                next_url = link['href']
+        if not entities:
+            next_url = None
+        return resp, entities, next_url
+
+    def _find_in_listing(self, url, collection, entity_ids, **kwargs):
+        """Read the pages of a listing until every one of entity_ids is
+        found, or the listing ends.
+
+        Pages are followed through their 'next' links, or with a marker
+        after the last entity on servers which do not link them, so an
+        entity missing from the result is missing from the whole listing.
+
+        :returns: (last response, dict mapping entity ids to the entities
+                  read, or None if a page could not be read)
+
+        """
+        path = url.split('?')[0]
+        found = {}
+        missing = set(entity_ids)
+        linked = False
+        while True:
+            resp, page, next_url = self._get_page(url, collection, **kwargs)
+            if page is None:
+                return resp, None
+            # Servers which ignore the marker send the same page again
+            if not page or str(page[0]['id']) in found:
+                return resp, found
+            for entity in page:
+                found[str(entity['id'])] = entity
+                missing.discard(str(entity['id']))
+            linked = linked or next_url is not None
+            if not missing or (linked and next_url is None):
+                return resp, found
+            url = next_url or '%s?%s' % (path, urllib.urlencode(
+                {'marker': page[-1]['id']}))
+
+    def run_in_background(self, func):
+        """Start calling func() concurrently, e.g. to prefetch a page.
+        Overridden by clients which must not start OS threads.
+
+        :returns: callable waiting for func to return
+
+        """
+        thread = threading.Thread(target=func)
+        thread.daemon = True
+        thread.start()
+        return thread.join
+
+    def _fetch_page_async(self, url, collection):
+        """Start fetching one page of a listing in the background.
+
+        :returns: callable waiting for the page, see `_fetch_page`
+
+        """
+        result = {}
+
+        def fetch():
+            try:
+                result['page'] = self._fetch_page(url, collection)
+            except Exception:
+                result['error'] = sys.exc_info()
+
+        join = self.run_in_background(fetch)
+
+        def wait():
+            join()
+            if 'error' in result:
+                error_type, error, traceback = result['error']
+                raise error_type, error, traceback
+            return result['page']()
+        return wait
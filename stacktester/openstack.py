@@ -1,3 +1,5 @@
+import stacktester.common.http
+import stacktester.common.jsonutils
 import stacktester.config
 import stacktester.nova
 
@@ -6,10 +8,24 @@ class Manager(object):
     """Top-level object to access OpenStack resources."""
 
     def __init__(self):
-        self.config = stacktester.config.StackConfig()
+        self.config = stacktester.config.get_config()
+        stacktester.common.http.configure_pool(
+                self.config.nova.http_pool_size,
+                self.config.nova.http_idle_timeout)
+        stacktester.common.jsonutils.configure_memo(
+                self.config.nova.json_memo_size)
+        cache = None
+        if self.config.nova.http_cache_size:
+            ttl = self.config.nova.http_cache_ttl
+            rules = [(path, ttl)
+                     for path in stacktester.nova.API.CATALOG_PATHS]
+            cache = stacktester.common.http.configure_cache(
+                    self.config.nova.http_cache_size, rules)
         self.nova = stacktester.nova.API(self.config.nova.host,
                                     self.config.nova.port,
                                     self.config.nova.base_url,
                                     self.config.nova.username,
                                     self.config.nova.api_key,
-                                    self.config.nova.project_id)
+                                    self.config.nova.project_id,
+                                    self.config.nova.auth_ttl,
+                                    cache=cache)
@@ -0,0 +1,218 @@
+"""Run the test suite across a pool of worker processes."""
+
+import inspect
+import multiprocessing
+import os
+import re
+import shutil
+import StringIO
+import sys
+import tempfile
+import time
+from xml.etree import ElementTree
+
+import nose
+import nose.config
+import nose.core
+import nose.loader
+
+from stacktester import cleanup
+from stacktester import config
+from stacktester import plugins
+from stacktester import results
+from stacktester import timeline
+from stacktester.common import instrument
+from stacktester.common import utils
+
+
+# Separator nose (and its xunit plugin) print before their summaries
+_SEPARATOR = '-' * 70
+_SUMMARY_RE = re.compile('\n%s\n(?:XML: |Ran )' % _SEPARATOR)
+
+# Plugins writing a report of the tests they ran, by name: the plugin
+# class, extra arguments for it in workers and the function merging the
+# workers' reports into one
+_REPORTERS = {
+    'instrument': (plugins.InstrumentPlugin, ['--instrument-quiet'],
+                   instrument.merge_reports),
+    'timeline': (plugins.TimelinePlugin, ['--timeline-quiet'],
+                 timeline.merge_reports),
+    'results': (plugins.ResultsPlugin, [], results.merge_reports),
+}
+
+
+def collect_test_names(names):
+    """Expand test names into the addresses of every individual test.
+
+    Following the convention of nose's multiprocess plugin, a test class
+    with class-level fixtures is kept whole as 'module:Class' unless it
+    sets `_multiprocess_can_split_ = True`.
+
+    :param names: Test names as accepted by nose (packages, modules,
+                  module:Class, ...).
+    :returns: list of 'module:Class.method' or 'module:Class' names
+
+    """
+    config = nose.config.Config(plugins=nose.core.DefaultPluginManager())
+    loader = nose.loader.TestLoader(config=config)
+    collected = []
+    for name in names:
+        for test in plugins.iter_tests(loader.loadTestsFromName(name)):
+            _path, module, call = test.address()
+            if call is None:
+                address = module
+            elif not _can_split(test):
+                address = '%s:%s' % (module, call.split('.', 1)[0])
+            else:
+                address = '%s:%s' % (module, call)
+            if address not in collected:
+                collected.append(address)
+    return collected
+
+
+def _can_split(test):
+    cls = type(getattr(test, 'test', test))
+    if getattr(cls, '_multiprocess_can_split_', False):
+        return True
+    for klass in inspect.getmro(cls):
+        if klass.__module__.startswith('unittest'):
+            continue
+        if 'setUpClass' in vars(klass) or 'tearDownClass' in vars(klass):
+            return False
+    return True
+
+
+def _init_worker(stack_config):
+    config.set_config(stack_config)
+
+
+def _run_test(task):
+    """Run one test in a worker process under its own nose instance."""
+    name, nose_args, xunit_file, reports = task
+    argv = ['stacktester', '--with-xunit', '--xunit-file=' + xunit_file]
+    for reporter, path in sorted(reports.items()):
+        argv.append('--with-%s' % reporter)
+        argv.extend(_REPORTERS[reporter][1])
+        argv.append('--%s-file=%s' % (reporter, path))
+    argv.extend(nose_args)
+    argv.append(name)
+
+    stream = StringIO.StringIO()
+    stderr = sys.stderr
+    sys.stderr = stream
+    try:
+        extra = [plugin() for plugin, _args, _merge in _REPORTERS.values()]
+        extra.append(plugins.SelectionPlugin())
+        success = nose.run(argv=argv, addplugins=extra)
+        # Deletions queued by the test must not die with the worker, and
+        # the parent confirms them
+        deleted = cleanup.handoff()
+    finally:
+        sys.stderr = stderr
+
+    output = _SUMMARY_RE.split(stream.getvalue(), 1)[0]
+    return name, success, output, deleted
+
+
+def merge_xunit(paths, output_path):
+    """Merge several xunit files into a single testsuite.
+
+    :returns: dict of the merged 'tests', 'errors', 'failures' and 'skip'
+              counts
+
+    """
+    counts = {'tests': 0, 'errors': 0, 'failures': 0, 'skip': 0}
+    merged = ElementTree.Element('testsuite', name='nosetests')
+    for path in paths:
+        try:
+            suite = ElementTree.parse(path).getroot()
+        except (IOError, ElementTree.ParseError):
+            continue
+        for key in counts:
+            counts[key] += int(suite.get(key, 0))
+        for case in suite:
+            merged.append(case)
+
+    for key, value in counts.items():
+        merged.set(key, str(value))
+    ElementTree.ElementTree(merged).write(output_path, encoding='UTF-8')
+    return counts
+
+
+def run(names, workers, nose_args=None, xunit_file=None, stream=None,
+        reports=None):
+    """Run the given tests spread over a pool of processes.
+
+    Each test runs in its own nose invocation inside a worker, so every
+    worker builds its own `openstack.Manager`, from the configuration
+    resolved in the parent. Results are printed as each
+    test finishes and the workers' xunit output is merged into one report.
+    The servers and images the workers deleted are handed to the cleanup
+    manager of this process, which is left to confirm they are gone.
+
+    :param names: Test names to collect and run.
+    :param workers: Number of worker processes.
+    :param nose_args: Extra command line arguments passed to nose.
+    :param xunit_file: Where to write the merged xunit report, if anywhere.
+    :param reports: dict mapping the names of the reporting plugins to
+                    enable ('instrument', 'timeline' or 'results') to the
+                    file their merged report is written to.
+    :returns: True if every test passed
+
+    """
+    stream = stream or sys.stdout
+    nose_args = list(nose_args or [])
+    tests = collect_test_names(names)
+    scratch = tempfile.mkdtemp(prefix='stacktester-')
+    reports = reports or {}
+    tasks = [(name, nose_args, os.path.join(scratch, '%d.xml' % index),
+              dict((reporter, os.path.join(scratch, '%d-%s.json' %
+                                           (index, reporter)))
+                   for reporter in reports))
+             for index, name in enumerate(tests)]
+
+    start = time.time()
+    # Fix the run ID before forking so all workers name resources alike
+    utils.run_id()
+    # Hand workers the resolved configuration rather than the sources
+    pool = multiprocessing.Pool(workers, _init_worker,
+                                (config.get_config(),))
+    try:
+        try:
+            for name, success, output, deleted in pool.imap_unordered(
+                    _run_test, tasks):
+                stream.write(output)
+                stream.flush()
+                if any(deleted.values()):
+                    cleanup.get_manager().adopt(deleted)
+            pool.close()
+        except:
+            # Interrupted or failed: the workers must not outlive the run,
+            # and joining a pool which is still running would raise
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        elapsed = time.time() - start
+
+        merged_path = xunit_file or os.path.join(scratch, 'merged.xml')
+        counts = merge_xunit([task[2] for task in tasks], merged_path)
+        for reporter, path in sorted(reports.items()):
+            merge = _REPORTERS[reporter][2]
+            merge([task[3][reporter] for task in tasks], path, stream)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    stream.write('\n%s\nRan %d test%s in %.3fs\n\n' % (_SEPARATOR,
+                 counts['tests'],
+                 counts['tests'] != 1 and 's' or '', elapsed))
+    problems = ['%s=%d' % (key, counts[key])
+                for key in ('errors', 'failures', 'skip') if counts[key]]
+    failed = counts['errors'] or counts['failures']
+    if failed:
+        stream.write('FAILED (%s)\n' % ', '.join(problems))
+    elif problems:
+        stream.write('OK (%s)\n' % ', '.join(problems))
+    else:
+        stream.write('OK\n')
+    return not failed
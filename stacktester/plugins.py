@@ -0,0 +1,194 @@
+"""nose plugins of the test runner.
+
+They are kept apart from the modules whose records they report on
+(`instrument`, `timeline` and `results`), so that only the runner needs
+nose: HTTP clients and tools built on them import those modules too.
+
+"""
+
+import unittest
+
+import nose.case
+from nose.plugins import Plugin
+import unittest2
+
+from stacktester import results
+from stacktester import timeline
+from stacktester.common import instrument
+from stacktester.common import poll
+from stacktester.common import utils
+
+
+# nose reports skips as errors of the SkipTest class that was raised: the
+# suite raises unittest2's, which is not the standard library's
+_SKIP_ERRORS = (unittest.SkipTest, unittest2.SkipTest)
+
+
+class InstrumentPlugin(Plugin):
+    """nose plugin attributing records to tests and reporting them."""
+
+    name = 'instrument'
+
+    def options(self, parser, env):
+        super(InstrumentPlugin, self).options(parser, env)
+        parser.add_option('--instrument-file', action='store',
+                          dest='instrument_file', metavar='FILE',
+                          default=env.get('NOSE_INSTRUMENT_FILE',
+                                          'stacktester-timing.json'),
+                          help='Write the timing records to FILE as JSON.')
+        parser.add_option('--instrument-quiet', action='store_true',
+                          dest='instrument_quiet', default=False,
+                          help="Don't print the timing report.")
+
+    def configure(self, options, conf):
+        super(InstrumentPlugin, self).configure(options, conf)
+        if not self.enabled:
+            return
+        self.path = options.instrument_file
+        self.quiet = options.instrument_quiet
+        instrument.reset()
+        instrument.enable()
+
+    def beforeTest(self, test):
+        instrument.set_test(test.id())
+
+    def afterTest(self, test):
+        instrument.set_test(None)
+
+    def report(self, stream):
+        records = instrument.snapshot()
+        if not self.quiet:
+            stream.write('\n')
+            instrument.format_report(records, stream)
+        if self.path:
+            instrument.write_json(records, self.path)
+
+
+class TimelinePlugin(Plugin):
+    """nose plugin recording status timelines and reporting on them."""
+
+    name = 'timeline'
+
+    def options(self, parser, env):
+        super(TimelinePlugin, self).options(parser, env)
+        parser.add_option('--timeline-file', action='store',
+                          dest='timeline_file', metavar='FILE',
+                          default=env.get('NOSE_TIMELINE_FILE',
+                                          'stacktester-timeline.json'),
+                          help='Write the timelines to FILE, as CSV if it '
+                               'ends with .csv and as JSON otherwise.')
+        parser.add_option('--timeline-quiet', action='store_true',
+                          dest='timeline_quiet', default=False,
+                          help="Don't print the timeline summary.")
+
+    def configure(self, options, conf):
+        super(TimelinePlugin, self).configure(options, conf)
+        if not self.enabled:
+            return
+        self.path = options.timeline_file
+        self.quiet = options.timeline_quiet
+        timeline.reset()
+        timeline.enable()
+
+    def beforeTest(self, test):
+        instrument.set_test(test.id())
+
+    def afterTest(self, test):
+        instrument.set_test(None)
+
+    def report(self, stream):
+        recorded = timeline.timelines()
+        if not self.quiet:
+            stream.write('\n')
+            timeline.format_summary(timeline.summarize(recorded), stream)
+        if self.path:
+            timeline.write(recorded, self.path)
+
+
+class ResultsPlugin(Plugin):
+    """nose plugin writing the run record of the tests it runs.
+
+    Status timelines are recorded while it is enabled, since transitions
+    are part of the record.
+
+    """
+
+    name = 'results'
+    # Ahead of nose's skip plugin, which stops skips reaching addError
+    score = 1100
+
+    def options(self, parser, env):
+        super(ResultsPlugin, self).options(parser, env)
+        parser.add_option('--results-file', action='store',
+                          dest='results_file', metavar='FILE',
+                          default=env.get('NOSE_RESULTS_FILE',
+                                          'stacktester-run.json'),
+                          help='Write the run record to FILE as JSON.')
+
+    def configure(self, options, conf):
+        super(ResultsPlugin, self).configure(options, conf)
+        if not self.enabled:
+            return
+        self.path = options.results_file
+        self.record = results.new_record()
+        self._started = {}
+        timeline.enable()
+
+    def beforeTest(self, test):
+        self._started[test.id()] = poll.monotonic()
+
+    def _finish(self, test, outcome):
+        started = self._started.pop(test.id(), None)
+        if started is not None:
+            self.record['tests'][test.id()] = {
+                'time': poll.monotonic() - started,
+                'outcome': outcome,
+            }
+
+    def addSuccess(self, test):
+        self._finish(test, 'ok')
+
+    def addFailure(self, test, err):
+        self._finish(test, 'failed')
+
+    def addError(self, test, err):
+        if issubclass(err[0], _SKIP_ERRORS):
+            self._finish(test, 'skipped')
+        else:
+            self._finish(test, 'error')
+
+    def afterTest(self, test):
+        # Tests which ended without an outcome reaching the plugin
+        self._started.pop(test.id(), None)
+
+    def finalize(self, result):
+        results.add_timelines(self.record, timeline.timelines())
+        results.write_record(self.record, self.path)
+
+
+class SelectionPlugin(Plugin):
+    """nose plugin telling test classes which of their tests will run, so
+    class fixtures can size themselves, see `utils.runnable_tests`.
+
+    Always enabled.
+
+    """
+
+    name = 'selection'
+    enabled = True
+
+    def configure(self, options, conf):
+        self.conf = conf
+
+    def prepareTest(self, test):
+        utils.select_tests(case.id() for case in iter_tests(test))
+
+
+def iter_tests(suite):
+    """Yield every test case of a nose suite."""
+    if isinstance(suite, nose.case.Test):
+        yield suite
+        return
+    for test in suite:
+        for case in iter_tests(test):
+            yield case
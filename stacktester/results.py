@@ -0,0 +1,148 @@
+"""History of test and status transition timings across runs.
+
+Each run is summarized as a record of how long every test took and how
+long servers and images spent in each status (see `timeline`). Records
+are appended to a JSON-lines store, one line per run, which later runs
+are compared against to catch performance regressions.
+
+"""
+
+import json
+import time
+
+from stacktester.common import utils
+
+
+def new_record():
+    """Return an empty run record for the current run."""
+    return {
+        'run_id': utils.run_id(),
+        'started_at': time.time(),
+        'tests': {},
+        'transitions': {},
+    }
+
+
+def add_timelines(record, timelines):
+    """Add the status durations of timelines to a run record."""
+    for t in timelines:
+        for status, seconds in t.durations():
+            key = '%s %s' % (t.entity_name, status)
+            record['transitions'].setdefault(key, []).append(seconds)
+
+
+def merge_records(records):
+    """Combine the records of several workers of the same run."""
+    merged = new_record()
+    for record in records:
+        merged['started_at'] = min(merged['started_at'],
+                                   record['started_at'])
+        merged['tests'].update(record['tests'])
+        for key, values in record['transitions'].items():
+            merged['transitions'].setdefault(key, []).extend(values)
+    return merged
+
+
+def read_record(path):
+    """Load a run record written by `ResultsPlugin`, None if missing."""
+    try:
+        with open(path) as report:
+            return json.load(report)
+    except (IOError, ValueError):
+        return None
+
+
+def write_record(record, path):
+    with open(path, 'w') as report:
+        json.dump(record, report, indent=2, sort_keys=True)
+
+
+def merge_reports(paths, path, stream):
+    """Merge the run records written by workers into path."""
+    records = filter(None, [read_record(p) for p in paths])
+    write_record(merge_records(records), path)
+
+
+def append(record, store):
+    """Append a run record to the store at path store."""
+    with open(store, 'a') as history:
+        history.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+def load(store, runs=None):
+    """Return the last runs records of a store, oldest first.
+
+    Lines which cannot be parsed (e.g. from an interrupted write) are
+    skipped.
+
+    """
+    records = []
+    try:
+        with open(store) as history:
+            for line in history:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except IOError:
+        return []
+    if runs:
+        records = records[-runs:]
+    return records
+
+
+def _median(values):
+    return utils.percentile(sorted(values), 50)
+
+
+def compare(record, baseline, threshold=1.5, min_delta=1.0, min_samples=3):
+    """Find the tests and transitions which got slower than in baseline.
+
+    The median of the current samples is compared to the median of the
+    samples in the baseline runs. A key regressed when its median grew by
+    more than the threshold ratio and by at least min_delta seconds, so
+    that noise on very short timings is not reported. Keys without
+    min_samples baseline samples are not compared; neither are tests
+    which did not pass, as a failure usually distorts their duration.
+
+    :param record: Run record of the current run.
+    :param baseline: List of earlier run records.
+    :param threshold: Ratio of current to baseline median to flag.
+    :param min_delta: Seconds the median must have grown by to flag.
+    :param min_samples: Baseline samples needed to compare a key.
+    :returns: list of (kind, key, baseline median, current median) tuples,
+              kind being 'test' or 'transition', worst ratio first
+
+    """
+    history = {'test': {}, 'transition': {}}
+    for old in baseline:
+        for test, result in old.get('tests', {}).items():
+            if result['outcome'] == 'ok':
+                history['test'].setdefault(test, []).append(result['time'])
+        for key, values in old.get('transitions', {}).items():
+            history['transition'].setdefault(key, []).extend(values)
+
+    current = {'test': {}, 'transition': {}}
+    for test, result in record['tests'].items():
+        if result['outcome'] == 'ok':
+            current['test'][test] = [result['time']]
+    current['transition'] = record['transitions']
+
+    regressions = []
+    for kind in ('test', 'transition'):
+        for key, values in current[kind].items():
+            past = history[kind].get(key, [])
+            if len(past) < min_samples or not values:
+                continue
+            before, now = _median(past), _median(values)
+            if now - before >= min_delta and now > before * threshold:
+                regressions.append((kind, key, before, now))
+    regressions.sort(key=lambda r: -float(r[3]) / max(r[2], 0.001))
+    return regressions
+
+
+def format_regressions(regressions, stream):
+    for kind, key, before, now in regressions:
+        stream.write('REGRESSION %-10s %-50s %7.1fs -> %7.1fs (x%.1f)\n' % (
+                     kind, key, before, now,
+                     float(now) / max(before, 0.001)))
@@ -0,0 +1,204 @@
+"""Pool of servers booted ahead of the tests that need them."""
+
+import logging
+import Queue
+import threading
+
+from stacktester import cleanup
+from stacktester.common import utils
+
+
+LOG = logging.getLogger(__name__)
+
+
+class ServerPool(object):
+    """Boots servers in the background and hands out ACTIVE ones.
+
+    Servers are booted in parallel, waited on until ACTIVE and checked with
+    an optional `verify` callable before they are handed out. Every server
+    taken out of the pool triggers the boot of a replacement, so the next
+    test rarely has to wait for a build, until `limit` servers have been
+    booted.
+
+    """
+
+    def __init__(self, nova, server, size, verify=None, build_timeout=300,
+                 cleaner=None, limit=None):
+        """Initialize a server pool. Nothing is booted until `start`.
+
+        :param nova: `nova.API` used to manage the servers.
+        :param server: dict of attributes to create servers with. A unique
+                       name is generated for each server.
+        :param size: Number of servers to keep booted ahead of time.
+        :param verify: Callable taking a server dict, raising or returning
+                       False if the server is not usable.
+        :param build_timeout: Seconds to wait for a server to become ACTIVE.
+        :param cleaner: `cleanup.CleanupManager` deleting the servers the
+                        pool is done with. Defaults to the shared one, so
+                        the end of run reap knows about them.
+        :param limit: Total number of servers to boot, usually the number
+                      of tests using the pool. None keeps refilling.
+
+        """
+        self.nova = nova
+        self.server = server
+        self.size = size
+        self.verify = verify
+        self.build_timeout = build_timeout
+        self.cleaner = cleaner or cleanup.get_manager()
+        self.limit = limit
+        self._ready = Queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._booting = set()
+        self._booted = 0
+        self._closed = False
+
+    def start(self):
+        """Start booting the initial servers."""
+        for _ in range(self.size):
+            self._refill()
+
+    def acquire(self, timeout=None):
+        """Take a verified ACTIVE server out of the pool.
+
+        Blocks until one is available and starts booting its replacement,
+        unless `limit` servers were booted already.
+
+        :param timeout: Seconds to wait for a server, None to wait forever.
+        :returns: dict of server attributes
+        :raises: The exception that made the boot of this server fail.
+
+        """
+        self._refill()
+        try:
+            server = self._ready.get(timeout=timeout)
+        except Queue.Empty:
+            raise AssertionError("No pooled server became available")
+        if isinstance(server, Exception):
+            raise server
+        return server
+
+    def release(self, server, recycle=False):
+        """Give a server back once a test is done with it.
+
+        :param server: dict of server attributes as returned by `acquire`.
+        :param recycle: Put the server back in the pool instead of deleting
+                        it. Only do this if the test left it untouched.
+
+        """
+        with self._lock:
+            recycle = recycle and not self._closed
+            if recycle:
+                self._booting.add(server['id'])
+        if recycle:
+            self._spawn(self._recycle, server)
+        else:
+            self._delete(server)
+
+    def close(self):
+        """Stop refilling and queue the deletion of every server the pool
+        still owns, without waiting for the servers still booting: they
+        are deleted right away and their boots end on their own.
+
+        """
+        with self._lock:
+            self._closed = True
+            booting = list(self._booting)
+            self._booting.clear()
+        for server_id in booting:
+            self.cleaner.delete_server(server_id)
+        while True:
+            try:
+                server = self._ready.get_nowait()
+            except Queue.Empty:
+                break
+            if not isinstance(server, Exception):
+                self._delete(server)
+
+    def join(self, timeout=None):
+        """Wait for the background boots to end, e.g. after `close`."""
+        with self._lock:
+            threads = list(self._threads)
+        for thread in threads:
+            thread.join(timeout)
+
+    def _refill(self):
+        """Start booting one more server, unless `limit` were booted."""
+        with self._lock:
+            if self.limit is not None and self._booted >= self.limit:
+                return
+            self._booted += 1
+        self._spawn(self._boot)
+
+    def _spawn(self, target, *args):
+        with self._lock:
+            if self._closed:
+                return
+            self._threads = [t for t in self._threads if t.is_alive()]
+            thread = threading.Thread(target=target, args=args)
+            thread.daemon = True
+            self._threads.append(thread)
+            thread.start()
+
+    def _boot(self):
+        entity = dict(self.server, name=utils.unique_name())
+        server = None
+        try:
+            server = self.nova.create_server(entity)
+            with self._lock:
+                closed = self._closed
+                if not closed:
+                    self._booting.add(server['id'])
+            if closed:
+                self._delete(server)
+                return
+            self._make_ready(server)
+        except Exception, e:
+            if not self._disown(server):
+                # close already deleted it
+                return
+            LOG.exception("Failed to boot pooled server")
+            if server is not None:
+                self._delete(server)
+            self._ready.put(e)
+
+    def _recycle(self, server):
+        try:
+            self._make_ready(server)
+        except Exception:
+            if not self._disown(server):
+                return
+            LOG.exception("Failed to recycle pooled server")
+            self._delete(server)
+            self._refill()
+
+    def _make_ready(self, server):
+        """Wait for a server to be usable, then queue it (or drop it if the
+        pool was closed in the meantime)."""
+        self.nova.wait_for_server_status(server['id'], 'ACTIVE',
+                                         timeout=self.build_timeout)
+        server = self.nova.get_server(server['id'])
+        if self.verify is not None and self.verify(server) is False:
+            raise AssertionError("Server %s failed verification" %
+                                 server['id'])
+        with self._lock:
+            # Once closed, close has deleted every server still booting
+            if not self._closed:
+                self._booting.discard(server['id'])
+                self._ready.put(server)
+
+    def _disown(self, server):
+        """Stop tracking a server whose boot failed.
+
+        :returns: False if the pool was closed, which deleted the server
+                  already
+
+        """
+        with self._lock:
+            if server is not None:
+                self._booting.discard(server['id'])
+            return not self._closed
+
+    def _delete(self, server):
+        self.cleaner.delete_server(server['id'])
@@ -14,13 +14,18 @@ class FlavorsTest(unittest.TestCase):
     def tearDown(self):
         pass
 
-    def _index_flavors(self):
-        url = '/flavors'
+    def _assert_flavor_listing(self, url):
+        """Check the response of one direct GET of a listing; its pages
+        are then read through the iterators."""
         response, body = self.os.nova.request('GET', url)
         self.assertEqual(response['status'], '200')
-        body_dict = json.loads(body)
-        self.assertEqual(body_dict.keys(), ['flavors'])
-        return body_dict['flavors']
+        keys = set(json.loads(body).keys())
+        keys.discard('flavors_links')
+        self.assertEqual(keys, set(['flavors']))
+
+    def _index_flavors(self):
+        self._assert_flavor_listing('/flavors')
+        return self.os.nova.iter_flavors(detail=False)
 
     def _show_flavor(self, flavor_id):
         url = '/flavors/%s' % flavor_id
@@ -91,12 +96,6 @@ class FlavorsTest(unittest.TestCase):
     def test_index_flavors_detailed(self):
         """List all flavors in detail"""
 
-        url = '/flavors/detail'
-        response, body = self.os.nova.request('GET', url)
-        self.assertEqual(response['status'], '200')
-        body_dict = json.loads(body)
-        self.assertEqual(body_dict.keys(), ['flavors'])
-        flavors = body_dict['flavors']
-
-        for flavor in flavors:
+        self._assert_flavor_listing('/flavors/detail')
+        for flavor in self.os.nova.iter_flavors(detail=True):
             self._assert_flavor_entity_detailed(flavor)
@@ -43,6 +43,13 @@ class ImagesTest(unittest.TestCase):
 
         self.assertEqual(image['links'], expected_links)
 
+    def _assert_image_listing(self, url):
+        response, body = self.os.nova.request('GET', url)
+        self.assertEqual(response['status'], '200')
+        keys = set(json.loads(body).keys())
+        keys.discard('images_links')
+        self.assertEqual(keys, set(['images']))
+
     def _assert_image_entity_basic(self, image):
         actual_keys = set(image.keys())
         expected_keys = set((
@@ -76,23 +83,13 @@ class ImagesTest(unittest.TestCase):
     def test_index(self):
         """List all images"""
 
-        response, body = self.os.nova.request('GET', '/images')
-
-        self.assertEqual(response['status'], '200')
-        resp_body = json.loads(body)
-        self.assertEqual(resp_body.keys(), ['images'])
-
-        for image in resp_body['images']:
+        self._assert_image_listing('/images')
+        for image in self.os.nova.iter_images(detail=False):
             self._assert_image_entity_basic(image)
 
     def test_detail(self):
         """List all images in detail"""
 
-        response, body = self.os.nova.request('GET', '/images/detail')
-
-        self.assertEqual(response['status'], '200')
-        resp_body = json.loads(body)
-        self.assertEqual(resp_body.keys(), ['images'])
-
-        for image in resp_body['images']:
+        self._assert_image_listing('/images/detail')
+        for image in self.os.nova.iter_images(detail=True):
             self._assert_image_entity_detailed(image)
@@ -1,17 +1,65 @@
 
 import json
-import time
 
+from stacktester import cleanup
+from stacktester import config
 from stacktester import exceptions
 from stacktester import openstack
+from stacktester import server_pool
+from stacktester.common import clock
 from stacktester.common import ssh
+from stacktester.common import utils
 
 import unittest2 as unittest
 
 
 class ServerActionsTest(unittest.TestCase):
 
-    multi_node = openstack.Manager().config.env.multi_node
+    multi_node = config.get_config().env.multi_node
+    server_password = 'testpwd'
+
+    # Tests sharing a server pool have to stay in the same worker process
+    _multiprocess_can_split_ = \
+            config.get_config().env.server_pool_size == 0
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server_pool = None
+        manager = openstack.Manager()
+        pool_size = manager.config.env.server_pool_size
+        ssh_timeout = manager.config.nova.ssh_timeout
+
+        def verify(server):
+            access_ip = server['addresses']['public'][0]['addr']
+            # Pooled servers may never be acquired: leave no connection
+            with ssh.Client(access_ip, 'root', cls.server_password,
+                            ssh_timeout) as client:
+                return client.test_connection_auth()
+
+        if pool_size > 0:
+            # Each test that runs takes one server, so never boot more
+            tests = utils.runnable_tests(cls)
+            cls.server_pool = server_pool.ServerPool(
+                    manager.nova,
+                    cls._server_entity(manager.config),
+                    pool_size,
+                    verify=verify,
+                    build_timeout=manager.config.nova.build_timeout,
+                    limit=len(tests))
+            cls.server_pool.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.server_pool is not None:
+            cls.server_pool.close()
+
+    @classmethod
+    def _server_entity(cls, config):
+        return {
+            'imageRef': config.env.image_ref,
+            'flavorRef': config.env.flavor_ref,
+            'adminPass': cls.server_password,
+        }
 
     def setUp(self):
         self.os = openstack.Manager()
@@ -21,17 +69,23 @@ class ServerActionsTest(unittest.TestCase):
         self.flavor_ref = self.os.config.env.flavor_ref
         self.flavor_ref_alt = self.os.config.env.flavor_ref_alt
         self.ssh_timeout = self.os.config.nova.ssh_timeout
+        self.ssh_keepalive_interval = \
+            self.os.config.nova.ssh_keepalive_interval
         self.build_timeout = self.os.config.nova.build_timeout
 
-        self.server_password = 'testpwd'
-        self.server_name = 'stacktester1'
+        if self.server_pool is not None:
+            # Pooled servers were already verified to be ACTIVE and
+            # reachable over ssh
+            server = self.server_pool.acquire()
+            self.server_name = server['name']
+            self.server_id = server['id']
+            self.access_ip = server['addresses']['public'][0]['addr']
+            return
 
-        expected_server = {
-            'name': self.server_name,
-            'imageRef': self.image_ref,
-            'flavorRef': self.flavor_ref,
-            'adminPass': self.server_password,
-        }
+        self.server_name = utils.unique_name()
+
+        expected_server = self._server_entity(self.os.config)
+        expected_server['name'] = self.server_name
 
         created_server = self.os.nova.create_server(expected_server)
 
@@ -45,10 +99,15 @@ class ServerActionsTest(unittest.TestCase):
         self._assert_ssh_password()
 
     def tearDown(self):
-        self.os.nova.delete_server(self.server_id)
+        ssh.close_host(self.access_ip)
+        if self.server_pool is not None:
+            self.server_pool.release({'id': self.server_id})
+        else:
+            cleanup.get_manager().delete_server(self.server_id)
 
     def _get_ssh_client(self, password):
-        return ssh.Client(self.access_ip, 'root', password, self.ssh_timeout)
+        return ssh.Client(self.access_ip, 'root', password, self.ssh_timeout,
+                          keepalive_interval=self.ssh_keepalive_interval)
 
     def _assert_ssh_password(self, password=None):
         _password = password or self.server_password
@@ -56,17 +115,24 @@ class ServerActionsTest(unittest.TestCase):
         self.assertTrue(client.test_connection_auth())
 
     def _wait_for_server_status(self, server_id, status):
+        # Fails the test (EntityStatusException is an AssertionError),
+        # saying which statuses the server went through
+        self.os.nova.wait_for_server_status(server_id, status,
+                                            timeout=self.build_timeout)
+
+    def _wait_for_guest(self, password=None, booted_after=None):
+        """Wait for the guest to be back up after an action restarted it"""
+        client = self._get_ssh_client(password or self.server_password)
         try:
-            self.os.nova.wait_for_server_status(server_id, status,
-                                                timeout=self.build_timeout)
-        except exceptions.TimeoutException:
-            self.fail("Server failed to change status to %s" % status)
+            client.wait_until_ready(booted_after=booted_after)
+        except exceptions.TimeoutException, e:
+            self.fail(str(e))
 
     def _get_boot_time(self):
         """Return the time the server was started"""
         output = self._read_file("/proc/uptime")
         uptime = float(output.split().pop(0))
-        return time.time() - uptime
+        return clock.time() - uptime
 
     def _write_file(self, filename, contents, password=None):
         command = "echo -n %s > %s" % (contents, filename)
@@ -99,6 +165,7 @@ class ServerActionsTest(unittest.TestCase):
         self._wait_for_server_status(self.server_id, 'ACTIVE')
 
         # SSH and verify uptime is less than before
+        self._wait_for_guest(booted_after=initial_time_started)
         post_reboot_time_started = self._get_boot_time()
         self.assertTrue(initial_time_started < post_reboot_time_started)
 
@@ -118,10 +185,12 @@ class ServerActionsTest(unittest.TestCase):
         # KNOWN-ISSUE
         #self._wait_for_server_status(self.server_id, 'HARD_REBOOT')
         ssh_client = self._get_ssh_client(self.server_password)
-        ssh_client.connect_until_closed()
+        dropped_at = ssh_client.connect_until_closed()
+        self.assertTrue(dropped_at, "ssh connection survived a hard reboot")
         self._wait_for_server_status(self.server_id, 'ACTIVE')
 
         # SSH and verify uptime is less than before
+        self._wait_for_guest(booted_after=initial_time_started)
         post_reboot_time_started = self._get_boot_time()
         self.assertTrue(initial_time_started < post_reboot_time_started)
 
@@ -155,6 +224,7 @@ class ServerActionsTest(unittest.TestCase):
         self.assertEqual(self._read_file(FILENAME), CONTENTS)
 
         # Make rebuild request
+        rebuilt_at = clock.time()
         post_body = json.dumps({'rebuild': {'imageRef': self.image_ref_alt}})
         url = '/servers/%s/action' % self.server_id
         response, body = self.os.nova.request('POST', url, body=post_body)
@@ -168,8 +238,8 @@ class ServerActionsTest(unittest.TestCase):
         self._wait_for_server_status(self.server_id, 'REBUILD')
         self._wait_for_server_status(self.server_id, 'ACTIVE')
 
-        # Treats an issue where we ssh'd in too soon after rebuild
-        time.sleep(30)
+        # ACTIVE comes before the rebuilt guest accepts logins
+        self._wait_for_guest(generated_password, rebuilt_at)
 
         # Check that the instance's imageRef matches the new imageRef
         server = self.os.nova.get_server(self.server_id)
@@ -191,6 +261,7 @@ class ServerActionsTest(unittest.TestCase):
         specified_password = 'some_password'
 
         # Make rebuild request
+        rebuilt_at = clock.time()
         post_body = json.dumps({
             'rebuild': {
                 'imageRef': self.image_ref,
@@ -209,8 +280,8 @@ class ServerActionsTest(unittest.TestCase):
         self._wait_for_server_status(self.server_id, 'REBUILD')
         self._wait_for_server_status(self.server_id, 'ACTIVE')
 
-        # Treats an issue where we ssh'd in too soon after rebuild
-        time.sleep(30)
+        # ACTIVE comes before the rebuilt guest accepts logins
+        self._wait_for_guest(specified_password, rebuilt_at)
 
         # Check that the instance's imageRef matches the new imageRef
         server = self.os.nova.get_server(self.server_id)
@@ -241,6 +312,7 @@ class ServerActionsTest(unittest.TestCase):
         self.assertEqual(self.flavor_ref_alt, server['flavor']['id'])
 
         #SSH into the server to ensure it came back up
+        self._wait_for_guest()
         self._assert_ssh_password()
 
         # Make confirmResize request
@@ -270,6 +342,7 @@ class ServerActionsTest(unittest.TestCase):
         self._wait_for_server_status(self.server_id, 'VERIFY_RESIZE')
 
         # SSH into the server to ensure it came back up
+        self._wait_for_guest()
         self._assert_ssh_password()
 
         # Ensure API reports new flavor
@@ -300,7 +373,7 @@ class SnapshotTests(unittest.TestCase):
         self.ssh_timeout = self.os.config.nova.ssh_timeout
         self.build_timeout = self.os.config.nova.build_timeout
 
-        self.server_name = 'stacktester1'
+        self.server_name = utils.unique_name()
 
         expected_server = {
             'name': self.server_name,
@@ -312,14 +385,13 @@ class SnapshotTests(unittest.TestCase):
         self.server_id = created_server['id']
 
     def tearDown(self):
-        self.os.nova.delete_server(self.server_id)
+        cleanup.get_manager().delete_server(self.server_id)
 
     def _wait_for_server_status(self, server_id, status):
-        try:
-            self.os.nova.wait_for_server_status(server_id, status,
-                                                timeout=self.build_timeout)
-        except exceptions.TimeoutException:
-            self.fail("Server failed to change status to %s" % status)
+        # Fails the test (EntityStatusException is an AssertionError),
+        # saying which statuses the server went through
+        self.os.nova.wait_for_server_status(server_id, status,
+                                            timeout=self.build_timeout)
 
     def test_snapshot_server_active(self):
         """Create image from an existing server"""
@@ -328,7 +400,7 @@ class SnapshotTests(unittest.TestCase):
         self._wait_for_server_status(self.server_id, 'ACTIVE')
 
         # Create snapshot
-        image_data = {'name': 'backup'}
+        image_data = {'name': utils.unique_name()}
         req_body = json.dumps({'createImage': image_data})
         url = '/servers/%s/action' % self.server_id
         response, body = self.os.nova.request('POST', url, body=req_body)
@@ -348,13 +420,14 @@ class SnapshotTests(unittest.TestCase):
         self.os.nova.wait_for_image_status(snapshot['id'], 'ACTIVE')
 
         # Cleaning up
-        self.os.nova.request('DELETE', '/images/%s' % snapshot_id)
+        cleanup.get_manager().delete_image(snapshot_id)
 
     def test_snapshot_server_inactive(self):
         """Ensure inability to snapshot server in BUILD state"""
 
         # Create snapshot
-        req_body = json.dumps({'createImage': {'name': 'backup'}})
+        image_data = {'name': utils.unique_name()}
+        req_body = json.dumps({'createImage': image_data})
         url = '/servers/%s/action' % self.server_id
         response, body = self.os.nova.request('POST', url, body=req_body)
 
@@ -363,4 +436,4 @@ class SnapshotTests(unittest.TestCase):
         self.assertEqual(response['status'], '202')
         snapshot_id = response['location'].rsplit('/', 1)[1]
         # Delete image for now, won't need this once correct status code is in
-        self.os.nova.request('DELETE', '/images/%s' % snapshot_id)
+        cleanup.get_manager().delete_image(snapshot_id)
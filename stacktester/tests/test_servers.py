@@ -5,13 +5,17 @@ import os
 
 import unittest2 as unittest
 
+from stacktester import cleanup
 from stacktester import openstack
 from stacktester import exceptions
 from stacktester.common import ssh
+from stacktester.common import utils
 
 
 class ServersTest(unittest.TestCase):
 
+    _multiprocess_can_split_ = True
+
     @classmethod
     def setUpClass(self):
         self.os = openstack.Manager()
@@ -76,7 +80,7 @@ class ServersTest(unittest.TestCase):
         file_contents = 'testing'
 
         expected_server = {
-            'name': 'stacktester1',
+            'name': utils.unique_name(),
             'imageRef': self.image_ref,
             'flavorRef': self.flavor_ref,
             'personality': [
@@ -121,7 +125,8 @@ class ServersTest(unittest.TestCase):
         self.assertEqual(injected_file, file_contents)
 
         # Clean up created server
-        self.os.nova.delete_server(server['id'])
+        ssh.close_host(ip)
+        cleanup.get_manager().delete_server(server['id'])
 
     def test_build_server_with_password(self):
         """Build a server with a password"""
@@ -129,7 +134,7 @@ class ServersTest(unittest.TestCase):
         server_password = 'testpwd'
 
         expected_server = {
-            'name': 'stacktester1',
+            'name': utils.unique_name(),
             'imageRef': self.image_ref,
             'flavorRef': self.flavor_ref,
             'adminPass': server_password,
@@ -169,14 +174,15 @@ class ServersTest(unittest.TestCase):
         self.assertTrue(client.test_connection_auth())
 
         # Clean up created server
-        self.os.nova.delete_server(server['id'])
+        ssh.close_host(ip)
+        cleanup.get_manager().delete_server(server['id'])
 
     def test_delete_server_building(self):
         """Delete a server while building"""
 
         # Make create server request
         server = {
-            'name': 'stacktester1',
+            'name': utils.unique_name(),
             'imageRef': self.image_ref,
             'flavorRef': self.flavor_ref,
         }
@@ -200,7 +206,7 @@ class ServersTest(unittest.TestCase):
 
         # Don't block for the server until later
         expected_server = {
-            'name': 'stacktester1',
+            'name': utils.unique_name(),
             'imageRef': self.image_ref,
             'flavorRef': self.flavor_ref,
             'metadata': {'testEntry': 'testValue'},
@@ -233,7 +239,8 @@ class ServersTest(unittest.TestCase):
         self.assertEqual(server['metadata'], created_server['metadata'])
 
         # Update name
-        new_server = {'name': 'stacktester2'}
+        new_name = utils.unique_name()
+        new_server = {'name': new_name}
         put_body = json.dumps({'server': new_server})
         url = '/servers/%s' % server_id
         resp, body = self.os.nova.request('PUT', url, body=put_body)
@@ -243,12 +250,12 @@ class ServersTest(unittest.TestCase):
         data = json.loads(body)
         self.assertEqual(data.keys(), ['server'])
         self._assert_server_entity(data['server'])
-        self.assertEqual('stacktester2', data['server']['name'])
+        self.assertEqual(new_name, data['server']['name'])
 
         # Check that name was changed
         updated_server = self.os.nova.get_server(server_id)
         self._assert_server_entity(updated_server)
-        self.assertEqual('stacktester2', updated_server['name'])
+        self.assertEqual(new_name, updated_server['name'])
 
         # Update accessIPv4
         new_server = {'accessIPv4': '192.168.0.200'}
@@ -447,6 +454,7 @@ class ServersTest(unittest.TestCase):
         self.assertTrue(client.test_connection_auth())
 
         # Delete server
+        ssh.close_host(ip)
         url = '/servers/%s' % server_id
         response, body = self.os.nova.request('DELETE', url)
         self.assertEqual(response.status, 204)
@@ -463,7 +471,7 @@ class ServersTest(unittest.TestCase):
 
         post_body = json.dumps({
             'server': {
-                'name': 'stacktester1',
+                'name': utils.unique_name(),
                 'imageRef': -1,
                 'flavorRef': self.flavor_ref,
             }
@@ -488,7 +496,7 @@ class ServersTest(unittest.TestCase):
 
         post_body = json.dumps({
             'server': {
-                'name': 'stacktester1',
+                'name': utils.unique_name(),
                 'imageRef': self.image_ref,
                 'flavorRef': -1,
             }
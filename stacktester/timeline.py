@@ -0,0 +1,211 @@
+"""Timelines of the statuses servers and images go through.
+
+Every status wait of `nova.API` already fetches the entity on each poll.
+While recording is enabled, the (status, progress) pairs seen by those
+polls are kept with monotonic offsets from the start of the wait, so no
+extra API request is made. From the timelines, the time spent in each
+status (BUILD, REBUILD, RESIZE, ...) is derived and summarized across a
+run.
+
+"""
+
+import csv
+import json
+import threading
+
+from stacktester.common import clock
+from stacktester.common import instrument
+from stacktester.common import poll
+from stacktester.common import utils
+
+
+_enabled = False
+_lock = threading.Lock()
+_timelines = []
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    """Forget every timeline recorded so far."""
+    global _timelines
+    with _lock:
+        _timelines = []
+
+
+def start(entity_name, entity_id, status):
+    """Begin the timeline of a wait, or return None when disabled.
+
+    :param entity_name: 'server' or 'image'.
+    :param entity_id: ID of the entity waited on.
+    :param status: Status being waited for.
+
+    """
+    if not _enabled:
+        return None
+    timeline = Timeline(instrument.current_test(), entity_name,
+                        str(entity_id), status)
+    with _lock:
+        _timelines.append(timeline)
+    return timeline
+
+
+def timelines():
+    """Return the timelines recorded so far."""
+    with _lock:
+        return list(_timelines)
+
+
+class Timeline(object):
+    """The statuses one entity went through during one wait."""
+
+    def __init__(self, test, entity_name, entity_id, status,
+                 started_at=None):
+        self.test = test
+        self.entity_name = entity_name
+        self.entity_id = entity_id
+        self.status = status
+        # Wall clock start, so runs can be compared over time; points are
+        # offsets on the monotonic clock
+        self.started_at = started_at or clock.time()
+        self.outcome = None
+        self.points = []
+        self._start = poll.monotonic()
+
+    def observe(self, status, progress=None):
+        """Add a point if status or progress changed since the last one."""
+        if self.points and self.points[-1][1:] == (status, progress):
+            return
+        self.points.append((poll.monotonic() - self._start, status,
+                            progress))
+
+    def durations(self):
+        """Return [(status, seconds)] for every status that was left.
+
+        A status counts from the first poll that saw it to the first poll
+        that saw the next one, so the figures are as precise as the
+        polling interval.
+
+        """
+        durations = []
+        entered = None
+        for offset, status, _progress in self.points:
+            if entered is not None and status == entered[1]:
+                continue
+            if entered is not None:
+                durations.append((entered[1], offset - entered[0]))
+            entered = (offset, status)
+        return durations
+
+    def to_dict(self):
+        return {
+            'test': self.test,
+            'entity': self.entity_name,
+            'id': self.entity_id,
+            'status': self.status,
+            'started_at': self.started_at,
+            'outcome': self.outcome,
+            'points': [list(point) for point in self.points],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        timeline = cls(data['test'], data['entity'], data['id'],
+                       data['status'], data['started_at'])
+        timeline.outcome = data.get('outcome')
+        timeline.points = [tuple(point) for point in data['points']]
+        return timeline
+
+
+def summarize(timelines):
+    """Summarize the time spent in each status across timelines.
+
+    :returns: {entity: {status: {'count', 'mean', 'p50', 'p95', 'max'}}}
+
+    """
+    samples = {}
+    for timeline in timelines:
+        for status, seconds in timeline.durations():
+            samples.setdefault(timeline.entity_name, {}).setdefault(
+                    status, []).append(seconds)
+
+    summary = {}
+    for entity_name, by_status in samples.items():
+        for status, values in by_status.items():
+            values.sort()
+            summary.setdefault(entity_name, {})[status] = {
+                'count': len(values),
+                'mean': sum(values) / len(values),
+                'p50': utils.percentile(values, 50),
+                'p95': utils.percentile(values, 95),
+                'max': values[-1],
+            }
+    return summary
+
+
+def write_json(timelines, path):
+    with open(path, 'w') as report:
+        json.dump({'timelines': [t.to_dict() for t in timelines],
+                   'summary': summarize(timelines)},
+                  report, indent=2, sort_keys=True)
+
+
+def read_json(paths):
+    """Load the timelines written by `write_json` to paths."""
+    loaded = []
+    for path in paths:
+        try:
+            with open(path) as report:
+                data = json.load(report)['timelines']
+        except (IOError, ValueError, KeyError):
+            continue
+        loaded.extend(Timeline.from_dict(t) for t in data)
+    return loaded
+
+
+def write_csv(timelines, path):
+    """Write one row per point of every timeline."""
+    with open(path, 'wb') as report:
+        writer = csv.writer(report)
+        writer.writerow(['test', 'entity', 'id', 'status', 'started_at',
+                         'outcome', 'offset', 'observed', 'progress'])
+        for t in timelines:
+            for offset, status, progress in t.points:
+                writer.writerow([t.test, t.entity_name, t.entity_id,
+                                 t.status, '%.3f' % t.started_at,
+                                 t.outcome, '%.3f' % offset, status,
+                                 progress is not None and progress or ''])
+
+
+def write(timelines, path):
+    """Write timelines as CSV if path ends with .csv, else as JSON."""
+    if path.endswith('.csv'):
+        write_csv(timelines, path)
+    else:
+        write_json(timelines, path)
+
+
+def merge_reports(paths, path, stream):
+    """Merge the JSON timelines of several workers, print and write them."""
+    loaded = read_json(paths)
+    stream.write('\n')
+    format_summary(summarize(loaded), stream)
+    write(loaded, path)
+
+
+def format_summary(summary, stream):
+    stream.write('%-6s %-16s %6s %8s %8s %8s %8s\n' % (
+                 'entity', 'status', 'count', 'mean', 'p50', 'p95', 'max'))
+    for entity_name in sorted(summary):
+        for status, row in sorted(summary[entity_name].items()):
+            stream.write('%-6s %-16s %6d %7.1fs %7.1fs %7.1fs %7.1fs\n' % (
+                         entity_name, status, row['count'], row['mean'],
+                         row['p50'], row['p95'], row['max']))
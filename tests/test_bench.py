@@ -0,0 +1,105 @@
+"""Unit-tests for `stacktester.bench`."""
+
+import itertools
+import StringIO
+import sys
+import threading
+import unittest
+
+from stacktester import bench
+
+
+class FakeNova(object):
+    """Servers reach any status as soon as they are waited on."""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.created = []
+        self.rebooted = []
+        self.deleted = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def create_server(self, entity):
+        with self._lock:
+            server_id = next(self._ids)
+            self.created.append(server_id)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return dict(entity, id=server_id)
+
+    def wait_for_server_status(self, server_id, status, **kwargs):
+        pass
+
+    def reboot_server(self, server_id):
+        self.rebooted.append(server_id)
+
+    def delete_server(self, server_id):
+        with self._lock:
+            self.deleted.append(server_id)
+            self.in_flight -= 1
+
+
+class TestProfiles(unittest.TestCase):
+
+    def test_ramp_up(self):
+        self.assertEqual(bench.PROFILES['linear'](10, 5, 10), 5)
+        self.assertEqual(bench.PROFILES['linear'](10, 20, 10), 10)
+        self.assertEqual(bench.PROFILES['step'](10, 0, 10), 2.5)
+        self.assertEqual(bench.PROFILES['step'](10, 6, 10), 7.5)
+        self.assertEqual(bench.PROFILES['constant'](10, 0, 10), 10)
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_cycles_are_recorded(self):
+        nova = FakeNova()
+        benchmark = bench.Benchmark(nova, {'imageRef': 1}, concurrency=3,
+                                    rate=50, duration=0.3)
+        summary = benchmark.run()
+
+        cycles = summary['cycle']['count']
+        self.assertTrue(cycles > 5)
+        self.assertEqual(summary['cycle']['errors'], 0)
+        for name in ('BUILD->ACTIVE', 'REBOOT->ACTIVE', 'ACTIVE->DELETED'):
+            self.assertEqual(summary[name]['count'], cycles)
+        self.assertEqual(sorted(nova.deleted), nova.created)
+        self.assertEqual(nova.rebooted, nova.created)
+        self.assertTrue(nova.max_in_flight <= 3)
+
+        stream = StringIO.StringIO()
+        bench.format_summary(summary, benchmark.elapsed, stream)
+        self.assertTrue('BUILD->ACTIVE' in stream.getvalue())
+
+    def test_failed_cycle_still_deletes(self):
+        nova = FakeNova()
+
+        def fail(server_id):
+            raise AssertionError("reboot refused")
+        nova.reboot_server = fail
+
+        benchmark = bench.Benchmark(nova, {'imageRef': 1}, rate=20,
+                                    duration=0.1)
+        summary = benchmark.run()
+        self.assertEqual(summary['cycle']['count'], 0)
+        self.assertTrue(summary['cycle']['errors'] > 0)
+        self.assertEqual(sorted(nova.deleted), nova.created)
+
+
+class TestMain(unittest.TestCase):
+
+    def test_configuration_error(self):
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            status = bench.main(['-o', 'nova.port'])
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(status, 2)
+        self.assertTrue(output.startswith('Configuration error: '))
+
+
+if __name__ == '__main__':
+    unittest.main()
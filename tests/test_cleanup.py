@@ -0,0 +1,104 @@
+"""Unit-tests for `stacktester.cleanup`."""
+
+import json
+import threading
+import unittest
+import urlparse
+
+import httplib2
+
+from stacktester import cleanup
+from stacktester import nova
+from stacktester.common import poll
+
+
+class InMemoryAPI(nova.API):
+    """Keeps servers and images in dicts instead of talking to Nova."""
+
+    def __init__(self, servers, images):
+        super(InMemoryAPI, self).__init__('fake', 8774, 'v1.1/', 'admin',
+                                          'key', 'admin',
+                                          poll_strategy=poll.FixedInterval(0))
+        self.entities = {'servers': servers, 'images': images}
+        self.deletes = []
+        self.listed = 0
+        self._lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        url, _, query = url.partition('?')
+        parts = url.strip('/').split('/')
+        collection = self.entities[parts[0]]
+        if method == 'DELETE':
+            with self._lock:
+                self.deletes.append(url)
+                collection.pop(parts[1], None)
+            return httplib2.Response({'status': '204'}), ''
+        entities = sorted(collection.values(), key=lambda e: e['id'])
+        query = urlparse.parse_qs(query)
+        if 'marker' in query:
+            entities = [e for e in entities if e['id'] > query['marker'][0]]
+        if 'limit' in query:
+            entities = entities[:int(query['limit'][0])]
+        self.listed += 1
+        body = json.dumps({parts[0]: entities})
+        return httplib2.Response({'status': '200'}), body
+
+
+class TestCleanupManager(unittest.TestCase):
+
+    def setUp(self):
+        self.api = InMemoryAPI(
+            {'1': {'id': '1', 'name': 'stacktester-abc-1', 'status': 'ACTIVE'},
+             '2': {'id': '2', 'name': 'production', 'status': 'ACTIVE'},
+             '3': {'id': '3', 'name': 'stacktester-xyz-1', 'status': 'ACTIVE'}},
+            {'7': {'id': '7', 'name': 'stacktester-abc-2', 'status': 'ACTIVE'}})
+        self.cleaner = cleanup.CleanupManager(self.api, workers=2)
+
+    def test_queued_deletions_are_sent_and_confirmed(self):
+        self.cleaner.delete_server('1')
+        self.cleaner.delete_image('7')
+
+        leftovers = self.cleaner.confirm(timeout=1)
+
+        self.assertEqual(leftovers, {'server': [], 'image': []})
+        self.assertEqual(sorted(self.api.deletes),
+                         ['/images/7', '/servers/1'])
+
+    def test_reap_only_touches_prefixed_resources(self):
+        reaped = self.cleaner.reap('stacktester-abc-')
+        self.cleaner.flush()
+
+        self.assertEqual(reaped, 2)
+        self.assertEqual(sorted(self.api.entities['servers']), ['2', '3'])
+        self.assertEqual(self.api.entities['images'], {})
+
+    def test_reap_follows_pages(self):
+        self.api.PAGE_SIZE = 1
+        reaped = self.cleaner.reap('stacktester-')
+        self.cleaner.flush()
+
+        self.assertEqual(reaped, 3)
+        self.assertEqual(self.api.entities['servers'].keys(), ['2'])
+        # Four pages of servers, the last empty, and two of images
+        self.assertEqual(self.api.listed, 6)
+
+    def test_reap_skips_already_queued(self):
+        self.cleaner.delete_server('1')
+        self.assertEqual(self.cleaner.reap('stacktester-abc-1'), 0)
+
+    def test_reap_skips_deletions_handed_off_or_under_way(self):
+        worker = cleanup.CleanupManager(self.api)
+        worker.delete_image('7')
+        self.assertEqual(worker.handoff(), {'server': [], 'image': ['7']})
+        # The image is still listed while its deletion completes
+        self.api.entities['images']['7'] = {'id': '7', 'status': 'ACTIVE',
+                                            'name': 'stacktester-abc-2'}
+        self.api.entities['servers']['3']['status'] = 'DELETED'
+        self.api.entities['servers']['1']['OS-EXT-STS:task_state'] = \
+            'deleting'
+        del self.api.deletes[:]
+
+        self.cleaner.adopt({'image': ['7']})
+        self.assertEqual(self.cleaner.reap('stacktester-'), 0)
+        self.cleaner.flush()
+        self.assertEqual(self.api.deletes, [])
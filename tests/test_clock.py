@@ -0,0 +1,73 @@
+"""Unit-tests for `stacktester.common.clock`."""
+
+import threading
+import time
+import unittest
+
+import httplib2
+
+from stacktester import exceptions
+from stacktester.common import clock
+from stacktester.common import http
+from stacktester.common import poll
+
+
+class StuckClient(http.Client):
+    """Answers every poll with a status that never changes."""
+
+    def __init__(self):
+        super(StuckClient, self).__init__()
+        self.requests = 0
+
+    def request(self, method, url, **kwargs):
+        self.requests += 1
+        return httplib2.Response({'status': '202'}), ''
+
+
+class TestVirtualClock(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = clock.VirtualClock(epoch=1000.0)
+        clock.set_clock(self.clock)
+
+    def tearDown(self):
+        clock.set_clock(None)
+
+    def test_sleep_moves_time_without_waiting(self):
+        started = time.time()
+        clock.sleep(3600)
+        self.assertEqual(clock.monotonic(), 3600)
+        self.assertEqual(clock.time(), 4600)
+        self.assertTrue(time.time() - started < 1)
+
+    def test_sleepers_wake_in_order(self):
+        # Leave the threads plenty of time to all fall asleep
+        self.clock.resolution = 0.1
+        woken = []
+
+        def sleeper(seconds):
+            clock.sleep(seconds)
+            woken.append((seconds, clock.monotonic()))
+
+        threads = [threading.Thread(target=sleeper, args=(seconds,))
+                   for seconds in (30, 10, 20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(woken, [(10, 10), (20, 20), (30, 30)])
+
+    def test_poll_timeout_expires_instantly(self):
+        client = StuckClient()
+        started = time.time()
+        self.assertRaises(exceptions.TimeoutException,
+                          client.poll_request_status, 'GET', '/',
+                          strategy=poll.FixedInterval(2), timeout=300)
+        self.assertTrue(time.time() - started < 5)
+        self.assertEqual(clock.monotonic(), 300)
+        self.assertEqual(client.requests, 151)
+
+    def test_set_clock_none_restores_real_time(self):
+        previous = clock.set_clock(None)
+        self.assertTrue(previous is self.clock)
+        self.assertTrue(clock.time() - time.time() < 1)
@@ -0,0 +1,78 @@
+"""Unit-tests for `stacktester.config`."""
+
+import os
+import tempfile
+import unittest
+
+from stacktester import config
+
+
+CONFIG = """[nova]
+host=10.0.0.1
+port=8775
+auth_ttl=0
+
+[environment]
+multi_node=true
+"""
+
+
+class TestStackConfig(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.write(fd, CONFIG)
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+        config.configure()
+
+    def test_defaults(self):
+        conf = config.StackConfig(environ={})
+        self.assertEqual(conf.nova.host, '127.0.0.1')
+        self.assertEqual(conf.nova.port, 8774)
+        self.assertEqual(conf.nova.auth_ttl, 3600)
+        self.assertEqual(conf.env.multi_node, False)
+
+    def test_file_values_are_typed(self):
+        conf = config.StackConfig(self.path, environ={})
+        self.assertEqual(conf.nova.host, '10.0.0.1')
+        self.assertEqual(conf.nova.port, 8775)
+        self.assertEqual(conf.nova.auth_ttl, None)
+        self.assertEqual(conf.env.multi_node, True)
+
+    def test_layers(self):
+        environ = {'STACKTESTER_NOVA_HOST': '10.0.0.2',
+                   'STACKTESTER_NOVA_PORT': '8776'}
+        conf = config.StackConfig(self.path, {'nova.port': '8777'},
+                                  environ=environ)
+        self.assertEqual(conf.nova.host, '10.0.0.2')
+        self.assertEqual(conf.nova.port, 8777)
+
+    def test_invalid_values(self):
+        self.assertRaises(config.ConfigError, config.StackConfig,
+                          overrides={'nova.port': 'http'}, environ={})
+        self.assertRaises(config.ConfigError, config.StackConfig,
+                          overrides={'nova.ssh_timeout': '-1'}, environ={})
+        self.assertRaises(config.ConfigError, config.StackConfig,
+                          overrides={'nova.nope': '1'}, environ={})
+
+    def test_parse_overrides(self):
+        self.assertEqual(config.parse_overrides(['nova.host = a=b']),
+                         {'nova.host': 'a=b'})
+        self.assertRaises(config.ConfigError, config.parse_overrides,
+                          ['nova.host'])
+
+    def test_loaded_once_until_reloaded(self):
+        conf = config.configure(self.path)
+        self.assertTrue(config.get_config() is conf)
+        self.assertTrue(config.get_config() is conf)
+
+        with open(self.path, 'a') as fh:
+            # Appended to the [environment] section
+            fh.write('server_pool_size=4\n')
+        self.assertEqual(config.get_config().env.server_pool_size, 0)
+        reloaded = config.reload()
+        self.assertTrue(config.get_config() is reloaded)
+        self.assertEqual(reloaded.env.server_pool_size, 4)
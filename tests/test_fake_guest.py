@@ -0,0 +1,131 @@
+"""Unit-tests for `stacktester.fakes.guest`, driven through `ssh.Client`."""
+
+import base64
+import threading
+import time
+import unittest
+
+from stacktester import exceptions
+from stacktester import nova
+from stacktester.common import clock
+from stacktester.common import poll
+from stacktester.common import ssh
+from stacktester.fakes.guest import FakeGuest
+from stacktester.fakes.nova import FakeNova
+
+
+class TestFakeGuest(unittest.TestCase):
+
+    def setUp(self):
+        self.guest = FakeGuest(password='secret',
+                               files={'/etc/test.txt': 'hello'}).start()
+
+    def tearDown(self):
+        ssh.close_all()
+        self.guest.stop()
+
+    def _client(self, password='secret', timeout=5):
+        return ssh.Client(self.guest.host, 'root', password, timeout=timeout,
+                          port=self.guest.port, keepalive_interval=1)
+
+    def test_commands_share_one_connection(self):
+        client = self._client()
+        self.assertEqual(client.exec_command('cat /etc/test.txt'), 'hello')
+        client.exec_command('echo -n WORDS > /tmp/testfile')
+        self.assertEqual(client.exec_command('cat /tmp/testfile'), 'WORDS')
+        self.assertEqual(self.guest.connections, 1)
+
+    def test_password_change(self):
+        self.assertTrue(self._client().test_connection_auth())
+        self.guest.set_password('changed')
+        self.assertFalse(self._client(timeout=0.5).test_connection_auth())
+        self.assertTrue(self._client('changed').test_connection_auth())
+
+    def test_reboot_resets_uptime(self):
+        client = self._client()
+        booted_at = time.time() - float(
+                client.exec_command('cat /proc/uptime').split()[0])
+        self.guest.reboot(downtime=0.5)
+
+        # The cached connection is gone, a new one waits for the reboot
+        started = poll.monotonic()
+        uptime = client.exec_command('cat /proc/uptime')
+        self.assertTrue(poll.monotonic() - started >= 0.4)
+        self.assertTrue(time.time() - float(uptime.split()[0]) > booted_at)
+
+    def test_connection_drops_while_connected(self):
+        client = self._client()
+        client.exec_command('cat /etc/test.txt')
+        timer = threading.Timer(0.3, self.guest.reboot)
+        timer.start()
+        dropped_at = client.connect_until_closed()
+        timer.join()
+        self.assertTrue(dropped_at is not None)
+
+    def test_rebuild_restores_image_files(self):
+        client = self._client()
+        client.exec_command('echo -n WORDS > /tmp/testfile')
+        self.guest.rebuild(password='rebuilt')
+        client = self._client('rebuilt')
+        self.assertEqual(client.exec_command('cat /tmp/testfile'), '')
+        self.assertEqual(client.exec_command('cat /etc/test.txt'), 'hello')
+
+    def test_wait_until_ready_after_rebuild(self):
+        client = self._client()
+        rebuilt_at = clock.time()
+        self.guest.rebuild(downtime=0.3)
+        strategy = poll.FixedInterval(0.05)
+        waited = client.wait_until_ready(booted_after=rebuilt_at,
+                                         strategy=strategy)
+        self.assertTrue(0.25 <= waited < 5)
+        # The last check's connection is reused
+        client.exec_command('cat /etc/test.txt')
+        self.assertEqual(self.guest.connections, 2)
+
+    def test_wait_until_ready_for_marker(self):
+        client = self._client()
+        timer = threading.Timer(0.3, self.guest.write_file,
+                                ('/var/run/ready', ''))
+        timer.start()
+        waited = client.wait_until_ready(marker='/var/run/ready',
+                                         strategy=poll.FixedInterval(0.05))
+        timer.join()
+        self.assertTrue(waited >= 0.25)
+
+    def test_wait_until_ready_times_out(self):
+        client = self._client()
+        self.assertRaises(exceptions.TimeoutException,
+                          client.wait_until_ready, timeout=0.3,
+                          max_uptime=-1, strategy=poll.FixedInterval(0.05))
+
+    def test_connect_delay_is_waited_out(self):
+        self.guest.connect_delay = 0.3
+        client = self._client()
+        client.test_connection_auth()
+        self.assertTrue(client.probe_timings['banner'] >= 0.3)
+
+
+class TestFakeNovaWithGuest(unittest.TestCase):
+
+    def test_guest_follows_server(self):
+        with FakeGuest() as guest:
+            with FakeNova(time_scale=0.001, guest=guest) as fake:
+                api = nova.API(fake.host, fake.port, 'v1.1/', 'admin',
+                               'admin_key',
+                               poll_strategy=poll.FixedInterval(0.01))
+                personality = [{'path': '/etc/test.txt',
+                                'contents': base64.b64encode('injected')}]
+                server = api.create_server({'name': 'test', 'imageRef': 1,
+                                            'flavorRef': 1,
+                                            'adminPass': 'testpwd',
+                                            'personality': personality})
+                api.wait_for_server_status(server['id'], 'ACTIVE',
+                                           timeout=5)
+                address = api.get_server(server['id'])['addresses']
+                client = ssh.Client(address['public'][0]['addr'], 'root',
+                                    'testpwd', timeout=5, port=guest.port)
+                try:
+                    self.assertEqual(client.exec_command(
+                            'cat /etc/test.txt'), 'injected')
+                finally:
+                    client.close()
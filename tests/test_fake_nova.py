@@ -0,0 +1,196 @@
+"""Unit-tests for `stacktester.fakes.nova`, driven through `nova.API`."""
+
+import json
+import unittest
+
+from stacktester import exceptions
+from stacktester import nova
+from stacktester.common import http
+from stacktester.common import poll
+from stacktester.fakes.nova import FakeNova
+
+
+class TestFakeNova(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeNova(time_scale=0.001).start()
+        self.api = nova.API(self.fake.host, self.fake.port, 'v1.1/',
+                            'admin', 'admin_key',
+                            poll_strategy=poll.FixedInterval(0.01))
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def _create_server(self):
+        return self.api.create_server({'name': 'test', 'imageRef': 1,
+                                       'flavorRef': 1})
+
+    def test_authentication(self):
+        self.api._get_auth_token()
+        self.assertEqual(self.api.management_url,
+                         '%s/v1.1/admin' % self.fake.endpoint)
+
+        bad = nova.API(self.fake.host, self.fake.port, 'v1.1/', 'admin',
+                       'wrong')
+        self.assertRaises(KeyError, bad._get_auth_token)
+
+    def test_revoked_token_is_renewed(self):
+        self.api._get_auth_token()
+        self.fake.revoke_tokens()
+        resp, body = self.api.request('GET', '/flavors')
+        self.assertEqual(resp.status, 200)
+
+    def test_server_lifecycle(self):
+        server = self._create_server()
+        self.assertEqual(server['status'], 'BUILD')
+        self.assertTrue(server['adminPass'])
+        self.api.wait_for_server_status(server['id'], 'ACTIVE', timeout=5)
+
+        # Long enough for the intermediate status to be seen
+        self.fake.durations['HARD_REBOOT'] = 300
+        self.api.reboot_server(server['id'], 'HARD')
+        self.assertEqual(self.api.get_server(server['id'])['status'],
+                         'HARD_REBOOT')
+        self.api.wait_for_server_status(server['id'], 'ACTIVE', timeout=5)
+
+        self.api.delete_server(server['id'])
+        self.api.wait_for_server_status(server['id'], 'DELETED', timeout=5)
+        self.assertRaises(exceptions.ServerNotFound, self.api.get_server,
+                          server['id'])
+
+    def test_resize_and_confirm(self):
+        server = self._create_server()
+        self.api.wait_for_server_status(server['id'], 'ACTIVE', timeout=5)
+        body = json.dumps({'resize': {'flavorRef': 2}})
+        url = '/servers/%s/action' % server['id']
+        resp, _body = self.api.request('POST', url, body=body)
+        self.assertEqual(resp.status, 202)
+        self.api.wait_for_server_status(server['id'], 'VERIFY_RESIZE',
+                                        timeout=5)
+
+        body = json.dumps({'confirmResize': None})
+        resp, _body = self.api.request('POST', url, body=body)
+        self.assertEqual(resp.status, 204)
+        server = self.api.get_server(server['id'])
+        self.assertEqual(server['status'], 'ACTIVE')
+        self.assertEqual(server['flavor']['id'], 2)
+
+    def test_create_image(self):
+        server = self._create_server()
+        self.api.wait_for_server_status(server['id'], 'ACTIVE', timeout=5)
+        body = json.dumps({'createImage': {'name': 'snapshot'}})
+        resp, _body = self.api.request(
+                'POST', '/servers/%s/action' % server['id'], body=body)
+        self.assertEqual(resp.status, 202)
+        image_id = resp['location'].rsplit('/', 1)[1]
+        self.api.wait_for_image_status(image_id, 'ACTIVE', timeout=5)
+
+    def test_metadata(self):
+        server = self._create_server()
+        url = '/servers/%s/metadata/key' % server['id']
+        body = json.dumps({'meta': {'key': 'value'}})
+        resp, _body = self.api.request('PUT', url, body=body)
+        self.assertEqual(resp.status, 200)
+        resp, body = self.api.request('GET', url)
+        self.assertEqual(json.loads(body), {'meta': {'key': 'value'}})
+        resp, _body = self.api.request('DELETE', url)
+        self.assertEqual(resp.status, 204)
+        resp, _body = self.api.request('GET', url)
+        self.assertEqual(resp.status, 404)
+
+    def test_paginated_listings(self):
+        for prefetch in (True, False):
+            flavors = list(self.api.iter_flavors(limit=2, prefetch=prefetch))
+            self.assertEqual([f['id'] for f in flavors], [1, 2, 3])
+            self.assertTrue('ram' in flavors[0])
+        pages = [r for r in self.fake.requests
+                 if r == ('GET', '/v1.1/admin/flavors/detail')]
+        self.assertEqual(len(pages), 4)
+
+        images = list(self.api.iter_images(detail=False, limit=1))
+        self.assertEqual([i['id'] for i in images], [1, 2])
+        self.assertEqual(list(self.api.iter_servers()), [])
+
+    def test_failed_page_raises(self):
+        self.fake.add_fault('GET', 'flavors', status=500)
+        self.assertRaises(AssertionError, list, self.api.iter_flavors())
+
+    def test_unknown_image_is_refused(self):
+        self.assertRaises(AssertionError, self.api.create_server,
+                          {'name': 'test', 'imageRef': 42, 'flavorRef': 1})
+
+    def test_injected_fault(self):
+        self.fake.add_fault('GET', r'^/v1\.1/admin/flavors$', status=503)
+        resp, _body = self.api.request('GET', '/flavors')
+        self.assertEqual(resp.status, 503)
+        resp, _body = self.api.request('GET', '/flavors')
+        self.assertEqual(resp.status, 200)
+
+    def test_failed_transition(self):
+        self.fake.fail_transition('BUILD')
+        server = self._create_server()
+        self.assertRaises(exceptions.EntityStatusException,
+                          self.api.wait_for_server_status, server['id'],
+                          'ACTIVE', timeout=5)
+        self.assertEqual(self.api.get_server(server['id'])['status'],
+                         'ERROR')
+
+
+class TestResponseCacheWithFakeNova(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeNova(time_scale=0.001).start()
+        rules = [(r'/flavors/detail$', 0)] + \
+            [(path, 60) for path in nova.API.CATALOG_PATHS]
+        self.cache = http.ResponseCache(rules=rules)
+        self.api = nova.API(self.fake.host, self.fake.port, 'v1.1/',
+                            'admin', 'admin_key', cache=self.cache,
+                            poll_strategy=poll.FixedInterval(0.01))
+        self.api._get_auth_token()
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def _gets(self, path):
+        return len([r for r in self.fake.requests if r == ('GET', path)])
+
+    def test_catalog_served_from_cache(self):
+        first = self.api.request('GET', '/flavors')
+        second = self.api.request('GET', '/flavors')
+        self.assertEqual(first[1], second[1])
+        self.assertEqual(self._gets('/v1.1/admin/flavors'), 1)
+
+        # Revalidated on every request, the server answering 304
+        first = self.api.request('GET', '/flavors/detail')
+        resp, body = self.api.request('GET', '/flavors/detail')
+        self.assertEqual((resp.status, body), (200, first[1]))
+        self.assertEqual(self._gets('/v1.1/admin/flavors/detail'), 2)
+        self.assertEqual(self.cache.revalidated, 1)
+
+        self.api.request('GET', '/servers')
+        self.api.request('GET', '/servers')
+        self.assertEqual(self._gets('/v1.1/admin/servers'), 2)
+
+    def test_users_do_not_share_cached_responses(self):
+        self.fake.users['demo'] = 'demo_key'
+        demo = nova.API(self.fake.host, self.fake.port, 'v1.1/', 'demo',
+                        'demo_key', cache=self.cache)
+
+        self.api.request('GET', '/flavors')
+        demo.request('GET', '/flavors')
+        demo.request('GET', '/flavors')
+        self.assertEqual(self._gets('/v1.1/admin/flavors'), 2)
+
+    def test_mutations_invalidate(self):
+        server = self.api.create_server({'name': 'test', 'imageRef': 1,
+                                         'flavorRef': 1})
+        self.api.wait_for_server_status(server['id'], 'ACTIVE', timeout=5)
+        images = json.loads(self.api.request('GET', '/images')[1])['images']
+
+        body = json.dumps({'createImage': {'name': 'snapshot'}})
+        resp, _body = self.api.request('POST',
+                                       '/servers/%s/action' % server['id'],
+                                       body=body)
+        self.assertEqual(resp.status, 202)
+        listed = json.loads(self.api.request('GET', '/images')[1])['images']
+        self.assertEqual(len(listed), len(images) + 1)
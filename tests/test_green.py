@@ -0,0 +1,92 @@
+"""Unit-tests for `stacktester.green`."""
+
+import json
+import threading
+import time
+import urlparse
+import unittest
+
+import httplib2
+
+from stacktester import green
+
+if green.eventlet is not None:
+    import eventlet
+
+
+class LaggyGreenAPI(green.GreenAPI):
+    """Answers every request after a green sleep, as a slow API would."""
+
+    LATENCY = 0.2
+
+    def __init__(self):
+        super(LaggyGreenAPI, self).__init__('fake', 8774, 'v1.1/', 'admin',
+                                            'key')
+        self.authentications = 0
+        self.polls = {}
+
+    def authenticate(self, user, api_key, project_id):
+        eventlet.sleep(self.LATENCY)
+        self.authentications += 1
+        return 'token'
+
+    def request(self, method, url, **kwargs):
+        self._get_auth_token()
+        eventlet.sleep(self.LATENCY)
+        server_id = url.rsplit('/', 1)[-1]
+        self.polls[server_id] = self.polls.get(server_id, 0) + 1
+        status = 'ACTIVE' if self.polls[server_id] > 2 else 'BUILD'
+        body = json.dumps({'server': {'id': server_id, 'status': status}})
+        return httplib2.Response({'status': '200'}), body
+
+
+class PagedGreenAPI(LaggyGreenAPI):
+    """Lists six servers, two per page."""
+
+    def request(self, method, url, **kwargs):
+        eventlet.sleep(self.LATENCY)
+        self.threads.add(threading.current_thread())
+        query = urlparse.parse_qs(urlparse.urlsplit(url).query)
+        start = int(query.get('marker', ['0'])[0])
+        servers = [{'id': i} for i in range(start + 1, min(start + 2, 6) + 1)]
+        body = json.dumps({'servers': servers})
+        return httplib2.Response({'status': '200'}), body
+
+
+@unittest.skipIf(green.eventlet is None, "eventlet is not installed")
+class TestGreenAPI(unittest.TestCase):
+
+    def test_waiters_run_concurrently(self):
+        api = LaggyGreenAPI()
+        start = time.time()
+        threads = [api.spawn(api.wait_for_server_status, str(i), 'ACTIVE',
+                             interval=0.1, timeout=10)
+                   for i in range(200)]
+        for thread in threads:
+            thread.wait()
+        # Three polls each, were they serialized this would take minutes
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(api.authentications, 1)
+
+    def test_imap_keeps_argument_order(self):
+        api = LaggyGreenAPI()
+        servers = list(api.imap(api.get_server, ['a', 'b', 'c']))
+        self.assertEqual([s['id'] for s in servers], ['a', 'b', 'c'])
+
+    def test_pages_are_prefetched_in_green_threads(self):
+        api = PagedGreenAPI()
+        api.threads = set()
+        start = time.time()
+        ids = []
+        for server in api.iter_servers(limit=2):
+            ids.append(server['id'])
+            # Working on a server leaves time to fetch the next page
+            eventlet.sleep(api.LATENCY / 2)
+        self.assertEqual(ids, range(1, 7))
+        self.assertEqual(api.threads, set([threading.current_thread()]))
+        # Four pages, the last one empty, overlapping with the work
+        self.assertTrue(time.time() - start < 4 * api.LATENCY + 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
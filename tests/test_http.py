@@ -0,0 +1,155 @@
+"""Unit-tests for `stacktester.common.http`."""
+
+import BaseHTTPServer
+import SocketServer
+import threading
+import unittest
+
+import httplib2
+
+from stacktester.common import clock
+from stacktester.common import http
+
+
+class KeepAliveHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = '{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class CountingServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           KeepAliveHandler)
+        self.connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        SocketServer.ThreadingMixIn.process_request(self, request,
+                                                    client_address)
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.server = CountingServer()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.pool = http.ConnectionPool(size=2, idle_timeout=60)
+        self.client = http.Client('127.0.0.1', self.server.server_port, '',
+                                  pool=self.pool)
+        self.client.management_url = self.client.base_url
+
+    def tearDown(self):
+        self.pool.clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_reused_between_requests(self):
+        for _ in range(5):
+            resp, body = self.client.request('GET', '/servers')
+            self.assertEqual(resp.status, 200)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_pool_shared_between_clients(self):
+        other = http.Client('127.0.0.1', self.server.server_port, '',
+                            pool=self.pool)
+        other.management_url = other.base_url
+        self.client.request('GET', '/servers')
+        other.request('GET', '/servers')
+        self.assertEqual(self.server.connections, 1)
+
+    def test_idle_timeout_closes_connection(self):
+        self.client.request('GET', '/servers')
+        self.pool.idle_timeout = 0
+        self.client.request('GET', '/servers')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_key_for_url(self):
+        self.assertEqual(http.ConnectionPool.key_for_url('http://a:8774/v1'),
+                         ('http', 'a', 8774))
+        self.assertEqual(http.ConnectionPool.key_for_url('https://a/v1'),
+                         ('https', 'a', 443))
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        clock.set_clock(clock.VirtualClock())
+        self.cache = http.ResponseCache(size=2, rules=[(r'^/flavors', 10),
+                                                       (r'^/images', 0)])
+
+    def tearDown(self):
+        clock.set_clock(None)
+
+    def _response(self, status=200, etag=None):
+        headers = {'status': str(status)}
+        if etag:
+            headers['etag'] = etag
+        return httplib2.Response(headers)
+
+    def test_ttl_and_revalidation(self):
+        self.cache.put('http://a/flavors', self._response(), 'f')
+        self.cache.put('http://a/images', self._response(etag='"1"'), 'i')
+        self.cache.put('http://a/servers', self._response(), 's')
+        self.assertEqual(len(self.cache), 2)
+
+        self.assertEqual(self.cache.get('http://a/flavors')[1:], ('f', True))
+        self.assertEqual(self.cache.get('http://a/images')[1:], ('i', False))
+        clock.sleep(10)
+        self.assertEqual(self.cache.get('http://a/flavors'), None)
+        self.cache.refresh('http://a/images')
+        self.assertEqual(self.cache.revalidated, 1)
+
+    def test_lru_eviction_and_invalidation(self):
+        for url in ('http://a/flavors/1', 'http://a/flavors/2'):
+            self.cache.put(url, self._response(), url)
+        self.cache.get('http://a/flavors/1')
+        self.cache.put('http://a/flavors/3', self._response(), '3')
+        self.assertEqual(self.cache.get('http://a/flavors/2'), None)
+
+        self.cache.invalidate('http://a/flavors')
+        self.assertEqual(len(self.cache), 0)
+        self.cache.put('http://a/flavors/1', self._response(404), '')
+        self.assertEqual(len(self.cache), 0)
+
+    def test_scopes_are_kept_apart(self):
+        self.cache.put('http://a/flavors', self._response(), 'admin', 'a')
+        self.cache.put('http://a/flavors/1', self._response(), 'demo', 'd')
+        self.assertEqual(self.cache.get('http://a/flavors', 'd'), None)
+        self.assertEqual(self.cache.get('http://a/flavors', 'a')[1],
+                         'admin')
+
+        self.cache.invalidate('http://a/flavors')
+        self.assertEqual(len(self.cache), 0)
+
+    def test_configure_cache_trims_when_shrinking(self):
+        shared = http._default_cache
+        http._default_cache = None
+        try:
+            rules = [(r'^/flavors', 10)]
+            cache = http.configure_cache(3, rules)
+            for url in ('http://a/flavors/1', 'http://a/flavors/2',
+                        'http://a/flavors/3'):
+                cache.put(url, self._response(), url)
+            self.assertTrue(http.configure_cache(1, rules) is cache)
+            self.assertEqual(len(cache), 1)
+            self.assertEqual(cache.get('http://a/flavors/1'), None)
+            self.assertEqual(cache.get('http://a/flavors/3')[1:],
+                             ('http://a/flavors/3', True))
+        finally:
+            http._default_cache = shared
@@ -0,0 +1,104 @@
+"""Unit-tests for `stacktester.common.instrument`."""
+
+import os
+import shutil
+import StringIO
+import tempfile
+import threading
+import unittest
+
+import httplib2
+
+from stacktester.common import http
+from stacktester.common import instrument
+
+
+class FakeHttp(object):
+
+    def request(self, url, method, **kwargs):
+        return httplib2.Response({'status': '200'}), 'x' * 10
+
+
+class TestInstrument(unittest.TestCase):
+
+    def setUp(self):
+        instrument.reset()
+        instrument.enable()
+
+    def tearDown(self):
+        instrument.disable()
+        instrument.set_test(None)
+        instrument.reset()
+
+    def test_url_template(self):
+        self.assertEqual(instrument.url_template(
+                         'http://nova:8774/v1.1/admin/servers/42/action'),
+                         '/v1.1/admin/servers/{id}/action')
+        self.assertEqual(instrument.url_template('/servers/detail'),
+                         '/servers/detail')
+
+    def test_nothing_is_recorded_while_disabled(self):
+        instrument.disable()
+        self.assertEqual(instrument.start(), None)
+        instrument.stop(None, 'http', 'GET /')
+        instrument.record('http', 'GET /', 1.0)
+        self.assertEqual(instrument.snapshot(), {})
+
+    def test_http_requests_are_recorded_per_test(self):
+        client = http.Client('nova', 8774, 'v1.1/',
+                             pool=http.ConnectionPool(http_factory=FakeHttp))
+        client.management_url = client.base_url
+        instrument.set_test('test_a')
+        client.request('GET', '/servers/1')
+        client.request('GET', '/servers/2')
+        instrument.set_test('test_b')
+        client.request('DELETE', '/servers/2')
+
+        records = instrument.snapshot()
+        stats = records['test_a']['http']['GET /v1.1/servers/{id}']
+        self.assertEqual(stats.count, 2)
+        self.assertEqual(stats.statuses, {'200': 2})
+        self.assertEqual(stats.counters, {'bytes': 20})
+        self.assertEqual(records['test_b']['http'].keys(),
+                         ['DELETE /v1.1/servers/{id}'])
+
+    def test_records_of_other_threads_are_not_the_tests(self):
+        instrument.set_test('test_a')
+        worker = threading.Thread(target=instrument.record,
+                                  args=('http', 'DELETE /', 1.0))
+        worker.start()
+        worker.join()
+        instrument.record('http', 'GET /', 1.0)
+
+        records = instrument.snapshot()
+        self.assertEqual(records['test_a']['http'].keys(), ['GET /'])
+        self.assertEqual(records[instrument.NO_TEST]['http'].keys(),
+                         ['DELETE /'])
+
+    def test_json_round_trip_merges_reports(self):
+        instrument.set_test('test_a')
+        instrument.record('poll', '/servers/{id}', 2.0, polls=3)
+        instrument.record('ssh', 'connect', 1.0, status='ok')
+        scratch = tempfile.mkdtemp()
+        try:
+            paths = [os.path.join(scratch, name) for name in 'ab']
+            for path in paths:
+                instrument.write_json(instrument.snapshot(), path)
+            records = instrument.read_json(paths + ['missing'])
+        finally:
+            shutil.rmtree(scratch)
+
+        polls = records['test_a']['poll']['/servers/{id}']
+        self.assertEqual((polls.count, polls.total), (2, 4.0))
+        self.assertEqual(polls.counters, {'polls': 6})
+        self.assertEqual(records['test_a']['ssh']['connect'].statuses,
+                         {'ok': 2})
+
+        stream = StringIO.StringIO()
+        instrument.format_report(records, stream)
+        self.assertTrue('/servers/{id}' in stream.getvalue())
+        self.assertTrue('test_a' in stream.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
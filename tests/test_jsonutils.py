@@ -0,0 +1,73 @@
+"""Unit-tests for `stacktester.common.jsonutils`."""
+
+import json
+import StringIO
+import unittest
+
+from stacktester.common import jsonutils
+
+
+class TestExtract(unittest.TestCase):
+
+    def setUp(self):
+        jsonutils._memo.clear()
+
+    def test_key_paths(self):
+        body = '{"server": {"status": "BUILD", "progress": 10, ' \
+               '"metadata": {"status": "nested"}}}'
+        self.assertEqual(jsonutils.extract(body, ('server', 'status'),
+                                           ('server', 'missing'),
+                                           ('server', 'status', 'x')),
+                         ['BUILD', None, None])
+        self.assertEqual(jsonutils.extract(body, ('server', 'metadata')),
+                         [{'status': 'nested'}])
+
+    def test_invalid_bodies(self):
+        self.assertRaises(ValueError, jsonutils.extract, '{"server": ',
+                          ('server',))
+        self.assertRaises(ValueError, jsonutils.extract, '["server"]',
+                          ('server',))
+
+    def test_unchanged_body_is_not_decoded_again(self):
+        body = jsonutils.sample_server(metadata=10, addresses=1)
+        paths = (('server', 'status'), ('server', 'progress'))
+        self.assertEqual(jsonutils.extract(body, *paths), ['BUILD', 50])
+
+        decoded = []
+        loads, jsonutils._backend_loads = jsonutils._backend_loads, \
+            lambda body: decoded.append(body) or loads(body)
+        try:
+            self.assertEqual(jsonutils.extract(str(bytearray(body)), *paths),
+                             ['BUILD', 50])
+            jsonutils.extract(body, ('server', 'metadata'))
+            jsonutils.extract(body, ('server', 'metadata'))
+        finally:
+            jsonutils._backend_loads = loads
+        # Mutable values are never shared between callers
+        self.assertEqual(len(decoded), 2)
+
+    def test_benchmark(self):
+        stream = StringIO.StringIO()
+        jsonutils.benchmark(jsonutils.sample_server(10, 1), number=5,
+                            stream=stream)
+        rows = stream.getvalue().splitlines()[1:]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(len(set(row[:28] for row in rows)), 4)
+
+    def test_memo_can_be_shrunk_or_disabled(self):
+        bodies = [json.dumps({'server': {'status': str(i)}})
+                  for i in range(4)]
+        try:
+            for body in bodies:
+                jsonutils.extract(body, ('server', 'status'))
+            jsonutils.configure_memo(2)
+            self.assertEqual(len(jsonutils._memo), 2)
+            jsonutils.configure_memo(0)
+            jsonutils.extract(bodies[0], ('server', 'status'))
+            self.assertEqual(len(jsonutils._memo), 0)
+        finally:
+            jsonutils.configure_memo(32)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,259 @@
+"""Unit-tests for the `stacktester.nova` API client."""
+
+import json
+import unittest
+import urllib
+import urlparse
+
+import httplib2
+
+import stacktester.common.http
+from stacktester import exceptions
+from stacktester import nova
+from stacktester.common import poll
+
+
+class FakeTransport(object):
+    """Stands in for `common.http.Client.request` and records calls."""
+
+    def __init__(self):
+        self.calls = []
+        self.valid_tokens = set()
+        self._issued = 0
+
+    def __call__(self, client, method, url, **kwargs):
+        headers = kwargs.get('headers', {})
+        self.calls.append((method, url, dict(headers)))
+
+        if 'X-Auth-User' in headers:
+            self._issued += 1
+            token = 'token-%d' % self._issued
+            self.valid_tokens.add(token)
+            return self._response(204, {
+                'x-auth-token': token,
+                'x-server-management-url': 'http://fake/v1.1/admin',
+            }), ''
+
+        if headers.get('X-Auth-Token') not in self.valid_tokens:
+            return self._response(401), ''
+        return self._response(200), '{}'
+
+    def _response(self, status, headers=None):
+        info = {'status': str(status)}
+        info.update(headers or {})
+        return httplib2.Response(info)
+
+    @property
+    def auth_calls(self):
+        return [c for c in self.calls if 'X-Auth-User' in c[2]]
+
+
+class TestAuthTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = FakeTransport()
+        self._request = stacktester.common.http.Client.request
+        transport = self.transport
+        stacktester.common.http.Client.request = \
+            lambda client, method, url, **kwargs: transport(client, method,
+                                                            url, **kwargs)
+        self.api = nova.API('fake', 8774, 'v1.1/', 'admin', 'key', 'admin')
+
+    def tearDown(self):
+        stacktester.common.http.Client.request = self._request
+
+    def test_token_reused_across_requests(self):
+        for _ in range(5):
+            resp, body = self.api.request('GET', '/servers')
+            self.assertEqual(resp.status, 200)
+        self.assertEqual(len(self.transport.auth_calls), 1)
+
+    def test_reauthenticates_once_on_401(self):
+        self.api.request('GET', '/servers')
+        self.transport.valid_tokens.clear()
+
+        resp, body = self.api.request('GET', '/servers')
+
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(len(self.transport.auth_calls), 2)
+
+    def test_reauthenticates_after_ttl(self):
+        self.api.auth_ttl = 60
+        self.api.request('GET', '/servers')
+        self.api._auth_expires -= 61
+
+        self.api.request('GET', '/servers')
+
+        self.assertEqual(len(self.transport.auth_calls), 2)
+
+
+class ScriptedListingAPI(nova.API):
+    """Serves /servers/detail from a list of pre-baked ticks."""
+
+    def __init__(self, ticks):
+        super(ScriptedListingAPI, self).__init__('fake', 8774, 'v1.1/',
+                                                 'admin', 'key', 'admin')
+        self.ticks = list(ticks)
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url))
+        statuses = self.ticks.pop(0) if len(self.ticks) > 1 else self.ticks[0]
+        servers = [{'id': id, 'status': status}
+                   for id, status in sorted(statuses.items())]
+        body = json.dumps({'servers': servers})
+        return httplib2.Response({'status': '200'}), body
+
+
+class PagedListingAPI(nova.API):
+    """Serves /servers/detail two servers per page, marker based."""
+
+    def __init__(self, statuses, links=True):
+        super(PagedListingAPI, self).__init__('fake', 8774, 'v1.1/',
+                                              'admin', 'key', 'admin')
+        self.statuses = statuses
+        self.links = links
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        self.requests.append(url)
+        query = urlparse.parse_qs(urlparse.urlsplit(url).query)
+        ids = sorted(self.statuses)
+        start = 0
+        if 'marker' in query:
+            start = ids.index(int(query['marker'][0])) + 1
+        page = ids[start:start + 2]
+        data = {'servers': [{'id': id, 'status': self.statuses[id]}
+                            for id in page]}
+        if self.links and start + 2 < len(ids):
+            data['servers_links'] = [{'rel': 'next', 'href': (
+                '/servers/detail?' +
+                urllib.urlencode({'marker': page[-1]}))}]
+        return httplib2.Response({'status': '200'}), json.dumps(data)
+
+
+class TestBatchedWaiter(unittest.TestCase):
+
+    strategy = poll.FixedInterval(0)
+
+    def test_one_listing_per_tick(self):
+        api = ScriptedListingAPI([
+            {1: 'BUILD', 2: 'BUILD', 3: 'BUILD'},
+            {1: 'ACTIVE', 2: 'BUILD', 3: 'BUILD'},
+            {1: 'ACTIVE', 2: 'ACTIVE', 3: 'ACTIVE'},
+        ])
+
+        order = [server_id for server_id, server in
+                 api.iter_servers_status([1, 2, 3], strategy=self.strategy)]
+
+        self.assertEqual(order, ['1', '2', '3'])
+        self.assertEqual(api.requests, [('GET', '/servers/detail')] * 3)
+
+    def test_error_ends_wait(self):
+        api = ScriptedListingAPI([{1: 'BUILD', 2: 'ERROR'}])
+        self.assertRaises(AssertionError, api.wait_for_servers_status,
+                          [1, 2], strategy=self.strategy, timeout=5)
+        self.assertEqual(len(api.requests), 1)
+
+    def test_missing_server_counts_as_deleted(self):
+        api = ScriptedListingAPI([{1: 'ACTIVE', 2: 'ACTIVE'}, {2: 'ACTIVE'}])
+        servers = api.wait_for_servers_status([1], 'DELETED',
+                                              strategy=self.strategy)
+        self.assertEqual(servers, {'1': None})
+
+    def test_pages_are_followed_until_every_server_is_found(self):
+        for links in (True, False):
+            api = PagedListingAPI({1: 'BUILD', 2: 'BUILD', 3: 'ACTIVE',
+                                   4: 'BUILD', 5: 'BUILD'}, links)
+            servers = api.wait_for_servers_status([3], 'ACTIVE',
+                                                  strategy=self.strategy)
+            self.assertEqual(servers['3']['status'], 'ACTIVE')
+            self.assertEqual(len(api.requests), 2)
+
+    def test_deleted_only_once_missing_from_every_page(self):
+        for links in (True, False):
+            api = PagedListingAPI({1: 'BUILD', 2: 'BUILD', 4: 'BUILD',
+                                   5: 'BUILD'}, links)
+            servers = api.wait_for_servers_status([3], 'DELETED',
+                                                  strategy=self.strategy)
+            self.assertEqual(servers, {'3': None})
+            self.assertEqual(len(api.requests), links and 2 or 3)
+
+    def test_server_without_status_is_not_observed(self):
+        api = ScriptedListingAPI([{1: None}, {1: 'ACTIVE'}])
+        servers = api.wait_for_servers_status([1], strategy=self.strategy)
+        self.assertEqual(servers['1']['status'], 'ACTIVE')
+
+        api = ScriptedListingAPI([{1: None}])
+        try:
+            api.wait_for_servers_status([1], strategy=self.strategy,
+                                        timeout=0)
+        except exceptions.EntityStatusException, e:
+            self.assertEqual(e.statuses, [])
+            self.assertTrue('observed nothing' in str(e))
+        else:
+            self.fail("wait did not time out")
+
+    def test_per_server_timeout(self):
+        api = ScriptedListingAPI([{1: 'ACTIVE', 2: 'BUILD'}])
+        waiter = api.iter_servers_status([1, 2], timeout={1: 5, 2: 0},
+                                         strategy=self.strategy)
+        self.assertEqual(waiter.next()[0], '1')
+        self.assertRaises(AssertionError, waiter.next)
+
+
+class ScriptedEntityAPI(nova.API):
+    """Serves /servers/<id> from a list of (http status, server status)."""
+
+    def __init__(self, ticks):
+        super(ScriptedEntityAPI, self).__init__('fake', 8774, 'v1.1/',
+                                                'admin', 'key', 'admin')
+        self.ticks = list(ticks)
+        self.requests = 0
+
+    def request(self, method, url, **kwargs):
+        self.requests += 1
+        code, status = self.ticks.pop(0) if len(self.ticks) > 1 \
+                       else self.ticks[0]
+        body = json.dumps({'server': {'id': 1, 'status': status}})
+        return httplib2.Response({'status': str(code)}), body
+
+
+class TestTerminalStates(unittest.TestCase):
+
+    strategy = poll.FixedInterval(0)
+
+    def _wait(self, api, status='ACTIVE', **kwargs):
+        try:
+            api.wait_for_server_status(1, status, strategy=self.strategy,
+                                       timeout=5, **kwargs)
+        except exceptions.EntityStatusException, e:
+            return e
+        self.fail('wait did not fail')
+
+    def test_error_ends_wait_with_history(self):
+        api = ScriptedEntityAPI([(200, 'BUILD'), (200, 'BUILD'),
+                                 (200, 'ERROR')])
+        e = self._wait(api)
+        self.assertEqual(api.requests, 3)
+        self.assertEqual(e.statuses, ['BUILD', 'ERROR'])
+        self.assertEqual(e.entity['status'], 'ERROR')
+        self.assertTrue(isinstance(e, AssertionError))
+
+    def test_not_found_ends_wait(self):
+        api = ScriptedEntityAPI([(200, 'BUILD'), (404, None)])
+        e = self._wait(api)
+        self.assertEqual(e.statuses, ['BUILD', 'DELETED'])
+        self.assertEqual(e.entity['status'], 'BUILD')
+
+    def test_regression_ends_wait(self):
+        api = ScriptedEntityAPI([(200, 'ACTIVE'), (200, 'RESIZE'),
+                                 (200, 'ACTIVE')])
+        e = self._wait(api, 'VERIFY_RESIZE')
+        self.assertEqual(e.statuses, ['ACTIVE', 'RESIZE', 'ACTIVE'])
+
+    def test_overrides(self):
+        api = ScriptedEntityAPI([(200, 'ERROR'), (200, 'ACTIVE')])
+        api.wait_for_server_status(1, 'ACTIVE', strategy=self.strategy,
+                                   terminal_states=())
+        self.assertEqual(api.requests, 2)
@@ -0,0 +1,74 @@
+"""Unit-tests for `stacktester.parallel`."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from xml.etree import ElementTree
+
+from stacktester import parallel
+
+
+XUNIT = """<?xml version="1.0" encoding="UTF-8"?>
+<testsuite name="nosetests" tests="%(tests)d" errors="%(errors)d"
+           failures="%(failures)d" skip="0">%(cases)s</testsuite>
+"""
+
+
+class TestMergeXunit(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.scratch)
+
+    def _write(self, name, errors=0, failures=0):
+        path = os.path.join(self.scratch, name)
+        case = '<testcase classname="a.B" name="%s" time="1.0"/>' % name
+        with open(path, 'w') as fh:
+            fh.write(XUNIT % {'tests': 1, 'errors': errors,
+                              'failures': failures, 'cases': case})
+        return path
+
+    def test_counts_and_cases_are_merged(self):
+        paths = [self._write('one'), self._write('two', failures=1),
+                 os.path.join(self.scratch, 'missing.xml')]
+        output = os.path.join(self.scratch, 'merged.xml')
+
+        counts = parallel.merge_xunit(paths, output)
+
+        self.assertEqual(counts, {'tests': 2, 'errors': 0, 'failures': 1,
+                                  'skip': 0})
+        suite = ElementTree.parse(output).getroot()
+        self.assertEqual(suite.get('tests'), '2')
+        self.assertEqual([case.get('name') for case in suite],
+                         ['one', 'two'])
+
+
+class TestCollect(unittest.TestCase):
+
+    def test_expands_module_into_methods(self):
+        names = parallel.collect_test_names(['test_basic'])
+        self.assertEqual(names, ['test_basic:TestTestsRun.test_works'])
+
+
+class BrokenStream(object):
+
+    def write(self, data):
+        raise IOError("stream closed")
+
+    def flush(self):
+        pass
+
+
+class TestRun(unittest.TestCase):
+
+    def test_errors_are_raised_not_masked_by_join(self):
+        def scratch():
+            return set(name for name in os.listdir(tempfile.gettempdir())
+                       if name.startswith('stacktester-'))
+        before = scratch()
+        self.assertRaises(IOError, parallel.run, ['test_basic'], 1,
+                          stream=BrokenStream())
+        self.assertEqual(scratch(), before)
@@ -0,0 +1,117 @@
+"""Unit-tests for `stacktester.plugins`."""
+
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+import nose.config
+import nose.core
+import nose.loader
+import nose.plugins.manager
+import nose.plugins.skip
+import unittest2
+
+from stacktester import plugins
+from stacktester import results
+from stacktester.common import utils
+
+
+class Sample(unittest2.TestCase):
+
+    __test__ = False
+
+    def test_passes(self):
+        pass
+
+    def test_fails(self):
+        self.fail()
+
+    def test_skipped(self):
+        self.skipTest('not today')
+
+
+class StdlibSample(unittest.TestCase):
+
+    __test__ = False
+
+    def test_raises_unittest2_skip(self):
+        raise unittest2.SkipTest('not today either')
+
+
+class Sized(unittest2.TestCase):
+
+    __test__ = False
+
+    def test_selected(self):
+        pass
+
+    def test_deselected(self):
+        pass
+
+    @unittest2.skip('never')
+    def test_skipped(self):
+        pass
+
+
+class TestResultsPlugin(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.path = os.path.join(self.scratch, 'run.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.scratch)
+
+    def _run(self, *cases):
+        plugin = plugins.ResultsPlugin()
+        manager = nose.plugins.manager.PluginManager(
+            plugins=[plugin, nose.plugins.skip.Skip()])
+        conf = nose.config.Config(stream=StringIO.StringIO(),
+                                  plugins=manager)
+        loader = nose.loader.TestLoader(config=conf)
+        suite = loader.suiteClass([loader.loadTestsFromTestCase(case)
+                                   for case in cases])
+        nose.core.TestProgram(argv=['nosetests', '--with-results',
+                                    '--results-file=%s' % self.path],
+                              config=conf, suite=suite, exit=False)
+        return plugin
+
+    def test_skips_are_recorded_as_skipped(self):
+        plugin = self._run(Sample, StdlibSample)
+
+        tests = results.read_record(self.path)['tests']
+        outcomes = dict((name.rsplit('.', 1)[-1], test['outcome'])
+                        for name, test in tests.items())
+        self.assertEqual(outcomes, {'test_passes': 'ok',
+                                    'test_fails': 'failed',
+                                    'test_skipped': 'skipped',
+                                    'test_raises_unittest2_skip': 'skipped'})
+        self.assertEqual(plugin._started, {})
+
+
+class TestSelectionPlugin(unittest.TestCase):
+
+    def tearDown(self):
+        utils._selected_tests = None
+
+    def test_only_selected_tests_that_are_not_skipped_run(self):
+        self.assertEqual(utils.runnable_tests(Sized),
+                         ['test_deselected', 'test_selected'])
+
+        manager = nose.plugins.manager.PluginManager(
+            plugins=[plugins.SelectionPlugin()])
+        conf = nose.config.Config(stream=StringIO.StringIO(),
+                                  plugins=manager)
+        loader = nose.loader.TestLoader(config=conf)
+        suite = loader.suiteClass([Sized('test_selected'),
+                                   Sized('test_skipped')])
+        nose.core.TestProgram(argv=['nosetests'], config=conf, suite=suite,
+                              exit=False)
+
+        self.assertEqual(utils.runnable_tests(Sized), ['test_selected'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""Unit-tests for `stacktester.common.poll`."""
+
+import itertools
+import unittest
+
+import httplib2
+
+from stacktester import exceptions
+from stacktester.common import http
+from stacktester.common import poll
+
+
+class TestStrategies(unittest.TestCase):
+
+    def test_fixed_interval(self):
+        delays = poll.FixedInterval(2).delays()
+        self.assertEqual(list(itertools.islice(delays, 3)), [2, 2, 2])
+
+    def test_exponential_backoff_is_fast_first_then_capped(self):
+        strategy = poll.ExponentialBackoff(initial=0.1, factor=2,
+                                           max_interval=1, fast_polls=2,
+                                           jitter=0)
+        delays = list(itertools.islice(strategy.delays(), 7))
+        self.assertEqual(delays, [0.1, 0.1, 0.2, 0.4, 0.8, 1, 1])
+
+    def test_jitter_stays_within_bounds(self):
+        strategy = poll.ExponentialBackoff(initial=1, factor=1,
+                                           max_interval=1.05, fast_polls=0,
+                                           jitter=0.5)
+        for delay in itertools.islice(strategy.delays(), 50):
+            self.assertTrue(0.5 <= delay <= 1.05)
+
+
+class TestRetryAfter(unittest.TestCase):
+
+    def test_seconds(self):
+        resp = httplib2.Response({'status': '200', 'retry-after': '3'})
+        self.assertEqual(poll.retry_after(resp), 3.0)
+
+    def test_missing_or_garbage(self):
+        self.assertEqual(poll.retry_after(httplib2.Response({})), None)
+        resp = httplib2.Response({'retry-after': 'soon'})
+        self.assertEqual(poll.retry_after(resp), None)
+
+    def test_hint_stretches_delay_but_not_past_deadline(self):
+        resp = httplib2.Response({'retry-after': '30'})
+        delays = poll.FixedInterval(0.1).delays()
+        delay = poll.next_delay(delays, resp, poll.Deadline(1))
+        self.assertTrue(0.9 < delay <= 1)
+
+
+class FakePollingClient(http.Client):
+
+    def __init__(self):
+        super(FakePollingClient, self).__init__()
+        self.requests = 0
+
+    def request(self, method, url, **kwargs):
+        self.requests += 1
+        return httplib2.Response({'status': '200'}), self.requests
+
+
+class TestPollRequest(unittest.TestCase):
+
+    def test_strategy_controls_pace(self):
+        client = FakePollingClient()
+        strategy = poll.FixedInterval(0.001)
+        client.poll_request('GET', '/', lambda resp, body: body >= 4,
+                            strategy=strategy, timeout=5)
+        self.assertEqual(client.requests, 4)
+
+    def test_sub_second_timeout(self):
+        client = FakePollingClient()
+        deadline = poll.Deadline(5)
+        self.assertRaises(exceptions.TimeoutException, client.poll_request,
+                          'GET', '/', lambda resp, body: False,
+                          strategy=poll.FixedInterval(0.01), timeout=0.05)
+        self.assertTrue(deadline.elapsed() < 1)
@@ -0,0 +1,83 @@
+"""Unit-tests for `stacktester.results`."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from stacktester import results
+
+
+def record(tests=None, transitions=None):
+    run = results.new_record()
+    for test, seconds in (tests or {}).items():
+        run['tests'][test] = {'time': seconds, 'outcome': 'ok'}
+    run['transitions'] = dict(transitions or {})
+    return run
+
+
+class TestCompare(unittest.TestCase):
+
+    def setUp(self):
+        self.baseline = [record({'t.reboot': 60 + i, 't.fast': 0.1},
+                                {'server BUILD': [30, 32]})
+                         for i in range(3)]
+
+    def test_stable_run_has_no_regressions(self):
+        current = record({'t.reboot': 65, 't.fast': 0.2},
+                         {'server BUILD': [31, 35, 29]})
+        self.assertEqual(results.compare(current, self.baseline), [])
+
+    def test_slow_test_and_transition_are_flagged(self):
+        current = record({'t.reboot': 150, 't.fast': 0.5},
+                         {'server BUILD': [80, 90, 31]})
+        regressions = results.compare(current, self.baseline)
+        self.assertEqual([(kind, key) for kind, key, _b, _n in regressions],
+                         [('transition', 'server BUILD'),
+                          ('test', 't.reboot')])
+        self.assertEqual(regressions[1][2:], (61, 150))
+
+    def test_failed_tests_and_short_history_are_ignored(self):
+        current = record({'t.reboot': 150, 't.new': 500})
+        current['tests']['t.reboot']['outcome'] = 'failed'
+        self.assertEqual(results.compare(current, self.baseline), [])
+        self.assertEqual(results.compare(record({'t.reboot': 150}),
+                                         self.baseline[:2]), [])
+
+
+class TestStore(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.store = os.path.join(self.scratch, 'results.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.scratch)
+
+    def test_append_and_load_last_runs(self):
+        self.assertEqual(results.load(self.store), [])
+        for seconds in range(4):
+            results.append(record({'t': seconds}), self.store)
+        with open(self.store, 'a') as history:
+            history.write('{"truncated": ')
+
+        runs = results.load(self.store, runs=2)
+        self.assertEqual([run['tests']['t']['time'] for run in runs], [2, 3])
+
+    def test_worker_records_are_merged(self):
+        paths = []
+        for index, run in enumerate([record({'a': 1}, {'server BUILD': [1]}),
+                                     record({'b': 2}, {'server BUILD': [2]})]):
+            paths.append(os.path.join(self.scratch, '%d.json' % index))
+            results.write_record(run, paths[-1])
+        output = os.path.join(self.scratch, 'merged.json')
+
+        results.merge_reports(paths + ['missing'], output, None)
+
+        merged = results.read_record(output)
+        self.assertEqual(sorted(merged['tests']), ['a', 'b'])
+        self.assertEqual(merged['transitions'], {'server BUILD': [1, 2]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""Unit-tests for `stacktester.server_pool`."""
+
+import itertools
+import threading
+import unittest
+
+from stacktester import cleanup
+from stacktester import server_pool
+
+
+class FakeNova(object):
+    """Servers become ACTIVE as soon as they are waited on."""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.servers = {}
+        self.deleted = []
+
+    def create_server(self, entity):
+        with self._lock:
+            server = dict(entity, id=next(self._ids), status='BUILD')
+            self.servers[server['id']] = server
+        return dict(server)
+
+    def wait_for_server_status(self, server_id, status, **kwargs):
+        self.servers[server_id]['status'] = status
+
+    def get_server(self, server_id):
+        return dict(self.servers[server_id])
+
+    def delete_server(self, server_id):
+        with self._lock:
+            self.deleted.append(server_id)
+
+
+class TestServerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.nova = FakeNova()
+        self.cleaner = cleanup.CleanupManager(self.nova)
+        self.pool = server_pool.ServerPool(self.nova, {'imageRef': 1}, 2,
+                                           cleaner=self.cleaner)
+        self.pool.start()
+
+    def _close(self, pool):
+        pool.close()
+        pool.join()
+        self.cleaner.flush()
+
+    def test_acquire_hands_out_active_servers_and_refills(self):
+        first = self.pool.acquire(timeout=5)
+        second = self.pool.acquire(timeout=5)
+
+        self.assertEqual(first['status'], 'ACTIVE')
+        self.assertNotEqual(first['id'], second['id'])
+        self.assertNotEqual(first['name'], second['name'])
+
+        self._close(self.pool)
+        self.assertEqual(len(self.nova.servers), 4)
+        self.assertEqual(sorted(self.nova.deleted),
+                         sorted(set(self.nova.servers) -
+                                set([first['id'], second['id']])))
+
+    def test_release_deletes_and_recycle_returns(self):
+        server = self.pool.acquire(timeout=5)
+        self.pool.release(server, recycle=True)
+        other = self.pool.acquire(timeout=5)
+        self.pool.release(other)
+        self._close(self.pool)
+        self.assertTrue(other['id'] in self.nova.deleted)
+        self.assertEqual(len(self.nova.deleted), len(self.nova.servers))
+
+    def test_failed_verification_is_raised_by_acquire(self):
+        pool = server_pool.ServerPool(self.nova, {}, 1,
+                                      verify=lambda server: False,
+                                      cleaner=self.cleaner)
+        pool.start()
+        self.assertRaises(AssertionError, pool.acquire, 5)
+        self._close(pool)
+        self._close(self.pool)
+
+    def test_limit_caps_boots(self):
+        pool = server_pool.ServerPool(self.nova, {}, 2, limit=3,
+                                      cleaner=self.cleaner)
+        pool.start()
+        for _ in range(3):
+            pool.release(pool.acquire(timeout=5))
+        self._close(pool)
+        self._close(self.pool)
+        # 2 for self.pool, 3 for pool
+        self.assertEqual(len(self.nova.servers), 5)
+        self.assertEqual(len(self.nova.deleted), 5)
+
+    def test_limit_holds_when_recycling_fails(self):
+        verified = []
+
+        def verify_once(server):
+            verified.append(server['id'])
+            return len(verified) == 1
+
+        self._close(self.pool)
+        pool = server_pool.ServerPool(self.nova, {}, 1, verify=verify_once,
+                                      cleaner=self.cleaner, limit=1)
+        pool.start()
+        pool.release(pool.acquire(timeout=5), recycle=True)
+        pool.join(5)
+        self._close(pool)
+        # 2 for self.pool; the failed recycle is not replaced
+        self.assertEqual(len(self.nova.servers), 3)
+        self.assertEqual(len(verified), 2)
+
+    def test_close_does_not_wait_for_boots(self):
+        started = threading.Event()
+        proceed = threading.Event()
+        wait = self.nova.wait_for_server_status
+
+        def slow_wait(server_id, status, **kwargs):
+            started.set()
+            proceed.wait(5)
+            wait(server_id, status, **kwargs)
+
+        self._close(self.pool)
+        self.nova.wait_for_server_status = slow_wait
+        pool = server_pool.ServerPool(self.nova, {}, 1, cleaner=self.cleaner)
+        pool.start()
+        started.wait(5)
+        pool.close()
+        self.cleaner.flush()
+        booting = max(self.nova.servers)
+        self.assertTrue(booting in self.nova.deleted)
+
+        proceed.set()
+        pool.join()
+        self.cleaner.flush()
+        self.assertEqual(self.nova.deleted.count(booting), 1)
@@ -0,0 +1,212 @@
+"""Unit-tests for `stacktester.common.ssh`."""
+
+import socket
+import threading
+import time
+import unittest
+
+from stacktester.common import poll
+from stacktester.common import ssh
+
+
+class BannerServer(object):
+    """Accepts connections, sends a banner and hangs up."""
+
+    def __init__(self, banner):
+        self.banner = banner
+        self.accepted = 0
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(5)
+        self.port = self.sock.getsockname()[1]
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _addr = self.sock.accept()
+            except socket.error:
+                return
+            self.accepted += 1
+            conn.send(self.banner)
+            conn.close()
+
+    def close(self):
+        self.sock.close()
+
+
+class TestReadinessProber(unittest.TestCase):
+
+    def _prober(self, port, timeout=0.6):
+        strategy = poll.FixedInterval(0.1)
+        return ssh.ReadinessProber('127.0.0.1', 'root', 'secret',
+                                   timeout=timeout, port=port,
+                                   strategy=strategy)
+
+    def test_gives_up_on_closed_port(self):
+        server = BannerServer('')
+        port = server.port
+        server.close()
+        prober = self._prober(port)
+        self.assertRaises(socket.error, prober.connect)
+        self.assertTrue(1 < prober.timings['attempts'] < 20)
+        self.assertEqual(prober.timings['auth'], 0.0)
+
+    def test_waits_for_ssh_banner_before_authenticating(self):
+        server = BannerServer('220 not ssh\r\n')
+        try:
+            prober = self._prober(server.port)
+            self.assertRaises(socket.error, prober.connect)
+        finally:
+            server.close()
+        self.assertEqual(server.accepted, prober.timings['attempts'])
+        self.assertTrue(prober.timings['banner'] > 0)
+        self.assertEqual(prober.timings['auth'], 0.0)
+
+
+class FakeTransport(threading.Thread):
+    """Stands in for a paramiko transport whose connection drops after
+    `lifetime` seconds, or never if it is None."""
+
+    def __init__(self, lifetime):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.lifetime = lifetime
+        self.sock = socket.socket()
+        self.keepalive = None
+        self.active = True
+        self._stop_event = threading.Event()
+        self.start()
+
+    def run(self):
+        self._stop_event.wait(self.lifetime)
+        self.active = False
+
+    def set_keepalive(self, interval):
+        self.keepalive = interval
+
+    def is_active(self):
+        return self.active
+
+    def close(self):
+        self._stop_event.set()
+
+
+class FakeConnection(object):
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.closed = False
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.closed = True
+        self.transport.close()
+
+
+class TestConnectUntilClosed(unittest.TestCase):
+
+    def _client(self, connection, timeout):
+        client = ssh.Client('127.0.0.1', 'root', 'secret', timeout=timeout,
+                            keepalive_interval=1)
+        client._get_ssh_connection = lambda: connection
+        return client
+
+    def tearDown(self):
+        ssh.close_all()
+
+    def test_returns_when_connection_drops(self):
+        connection = FakeConnection(FakeTransport(0.2))
+        client = self._client(connection, timeout=10)
+        start = time.time()
+        dropped_at = client.connect_until_closed()
+        self.assertTrue(start + 0.2 <= dropped_at < start + 1)
+        self.assertEqual(connection.transport.keepalive, 1)
+        self.assertTrue(connection.transport.sock.getsockopt(
+                socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+        self.assertTrue(connection.closed)
+
+    def test_returns_none_on_timeout(self):
+        connection = FakeConnection(FakeTransport(None))
+        client = self._client(connection, timeout=0.2)
+        self.assertEqual(client.connect_until_closed(), None)
+        self.assertTrue(connection.closed)
+
+    def test_returns_at_once_if_cached_connection_dropped(self):
+        dropped = FakeConnection(FakeTransport(0))
+        dropped.transport.join()
+        client = self._client(FakeConnection(FakeTransport(None)),
+                              timeout=10)
+        client._cache_connection(dropped)
+
+        start = time.time()
+        dropped_at = client.connect_until_closed()
+        self.assertTrue(start <= dropped_at < start + 1)
+        self.assertTrue(dropped.closed)
+        self.assertEqual(ssh._connections.get(client._key()), None)
+
+
+class TestConnectionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.connected = []
+
+    def tearDown(self):
+        ssh.close_all()
+
+    def _client(self, host='127.0.0.1', password='secret'):
+        client = ssh.Client(host, 'root', password, keepalive_interval=1)
+
+        def connect():
+            connection = FakeConnection(FakeTransport(None))
+            self.connected.append(connection)
+            return connection
+
+        client._get_ssh_connection = connect
+        return client
+
+    def test_miss_connects_and_caches_with_keepalive(self):
+        connection = self._client()._get_cached_connection()
+        self.assertEqual(self.connected, [connection])
+        self.assertEqual(connection.transport.keepalive, 1)
+        self.assertTrue(connection.transport.sock.getsockopt(
+                socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+
+    def test_hit_is_shared_by_clients(self):
+        first = self._client()._get_cached_connection()
+        self.assertTrue(self._client()._get_cached_connection() is first)
+        self.assertEqual(len(self.connected), 1)
+
+        self._client(password='other')._get_cached_connection()
+        self.assertEqual(len(self.connected), 2)
+
+    def test_dropped_connection_is_replaced(self):
+        client = self._client()
+        dropped = client._get_cached_connection()
+        dropped.transport.close()
+        dropped.transport.join()
+
+        connection = client._get_cached_connection()
+        self.assertFalse(connection is dropped)
+        self.assertTrue(dropped.closed)
+
+    def test_close_host_evicts_its_connections(self):
+        kept = self._client('10.0.0.2')._get_cached_connection()
+        evicted = [self._client('10.0.0.1', password)._get_cached_connection()
+                   for password in ('secret', 'other')]
+
+        ssh.close_host('10.0.0.1')
+        self.assertTrue(all(connection.closed for connection in evicted))
+        self.assertFalse(kept.closed)
+        self.assertEqual([key[0] for key in ssh._connections], ['10.0.0.2'])
+
+        self._client('10.0.0.1')._get_cached_connection()
+        self.assertEqual(len(self.connected), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""Unit-tests for `stacktester.common.startup`."""
+
+import os
+import shutil
+import StringIO
+import sys
+import tempfile
+import unittest
+
+from stacktester.common import startup
+
+
+class TestImportProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        modules = {
+            'startup_outer.py': 'import startup_inner\n',
+            'startup_inner.py': 'x = sum(range(10000))\n',
+        }
+        for name, source in modules.items():
+            with open(os.path.join(self.path, name), 'w') as fh:
+                fh.write(source)
+        sys.path.insert(0, self.path)
+
+    def tearDown(self):
+        sys.path.remove(self.path)
+        for name in ('startup_outer', 'startup_inner'):
+            sys.modules.pop(name, None)
+        shutil.rmtree(self.path)
+
+    def test_nested_imports(self):
+        profiler = startup.ImportProfiler()
+        profiler.start()
+        try:
+            import startup_outer
+            import startup_outer
+        finally:
+            profiler.stop()
+
+        outer = profiler.timings['startup_outer']
+        inner = profiler.timings['startup_inner']
+        self.assertEqual(len(profiler.timings), 2)
+        self.assertTrue(outer[0] >= inner[0])
+        self.assertAlmostEqual(outer[1], outer[0] - inner[0])
+
+        stream = StringIO.StringIO()
+        profiler.report(stream)
+        lines = stream.getvalue().splitlines()
+        self.assertTrue(lines[1].startswith('startup_outer '))
+        self.assertTrue(lines[2].startswith('startup_inner '))
+
+    def test_stop_restores_import(self):
+        original = __import__
+        profiler = startup.ImportProfiler()
+        profiler.start()
+        profiler.stop()
+        import __builtin__
+        self.assertTrue(__builtin__.__import__ is original)
+
+
+if __name__ == '__main__':
+    unittest.main()
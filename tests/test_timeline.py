@@ -0,0 +1,112 @@
+"""Unit-tests for `stacktester.timeline`."""
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import httplib2
+
+from stacktester import nova
+from stacktester import timeline
+from stacktester.common import clock
+from stacktester.common import instrument
+from stacktester.common import poll
+
+
+class ProgressAPI(nova.API):
+    """Serves /servers/<id> from a list of (status, progress) ticks."""
+
+    def __init__(self, ticks):
+        super(ProgressAPI, self).__init__('fake', 8774, 'v1.1/', 'admin',
+                                          'key', 'admin')
+        self.ticks = list(ticks)
+        self.requests = 0
+
+    def request(self, method, url, **kwargs):
+        self.requests += 1
+        status, progress = self.ticks.pop(0)
+        body = json.dumps({'server': {'id': 1, 'status': status,
+                                      'progress': progress}})
+        return httplib2.Response({'status': '200'}), body
+
+
+class TestTimeline(unittest.TestCase):
+
+    def setUp(self):
+        timeline.reset()
+        timeline.enable()
+        instrument.set_test('test_build')
+
+    def tearDown(self):
+        timeline.disable()
+        timeline.reset()
+        instrument.set_test(None)
+
+    def _wait(self, ticks):
+        api = ProgressAPI(ticks)
+        api.wait_for_server_status(1, 'ACTIVE',
+                                   strategy=poll.FixedInterval(0.01))
+        self.assertEqual(api.requests, len(ticks))
+
+    def test_start_is_taken_from_the_clock(self):
+        clock.set_clock(clock.VirtualClock(epoch=1000.0))
+        try:
+            clock.sleep(60)
+            started = timeline.start('server', 1, 'ACTIVE')
+        finally:
+            clock.set_clock(None)
+        self.assertEqual(started.started_at, 1060.0)
+
+    def test_waits_are_recorded_without_extra_requests(self):
+        self._wait([('BUILD', 0), ('BUILD', 0), ('BUILD', 50),
+                    ('ACTIVE', 100)])
+
+        recorded, = timeline.timelines()
+        self.assertEqual(recorded.test, 'test_build')
+        self.assertEqual(recorded.outcome, 'reached')
+        self.assertEqual([point[1:] for point in recorded.points],
+                         [('BUILD', 0), ('BUILD', 50), ('ACTIVE', 100)])
+        offsets = [point[0] for point in recorded.points]
+        self.assertEqual(offsets, sorted(offsets))
+
+        (status, seconds), = recorded.durations()
+        self.assertEqual(status, 'BUILD')
+        self.assertTrue(0.02 <= seconds < 1)
+
+    def test_summary_and_export(self):
+        self._wait([('BUILD', 0), ('ACTIVE', 100)])
+        self._wait([('BUILD', 0), ('BUILD', 0), ('ACTIVE', 100)])
+
+        summary = timeline.summarize(timeline.timelines())
+        self.assertEqual(summary['server'].keys(), ['BUILD'])
+        self.assertEqual(summary['server']['BUILD']['count'], 2)
+
+        scratch = tempfile.mkdtemp()
+        try:
+            json_path = os.path.join(scratch, 'timeline.json')
+            csv_path = os.path.join(scratch, 'timeline.csv')
+            timeline.write(timeline.timelines(), json_path)
+            timeline.write(timeline.timelines(), csv_path)
+
+            loaded = timeline.read_json([json_path, csv_path])
+            with open(csv_path) as report:
+                rows = list(csv.DictReader(report))
+        finally:
+            shutil.rmtree(scratch)
+
+        self.assertEqual([t.durations() for t in loaded],
+                         [t.durations() for t in timeline.timelines()])
+        self.assertEqual([row['observed'] for row in rows],
+                         ['BUILD', 'ACTIVE', 'BUILD', 'ACTIVE'])
+
+    def test_nothing_is_recorded_while_disabled(self):
+        timeline.disable()
+        self._wait([('BUILD', 0), ('ACTIVE', 100)])
+        self.assertEqual(timeline.timelines(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
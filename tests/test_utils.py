@@ -0,0 +1,30 @@
+"""Unit-tests for `stacktester.common.utils`."""
+
+import sys
+import unittest
+
+from stacktester.common import utils
+
+
+class TestPercentile(unittest.TestCase):
+
+    def test_nearest_rank(self):
+        samples = range(1, 101)
+        self.assertEqual(utils.percentile(samples, 50), 50)
+        self.assertEqual(utils.percentile(samples, 99), 99)
+        self.assertEqual(utils.percentile([3], 95), 3)
+        self.assertEqual(utils.percentile([], 50), None)
+
+
+class TestLazyModule(unittest.TestCase):
+
+    def test_imported_on_first_use(self):
+        sys.modules.pop('colorsys', None)
+        colorsys = utils.LazyModule('colorsys')
+        self.assertFalse('colorsys' in sys.modules)
+        self.assertEqual(colorsys.rgb_to_hsv(0, 0, 0), (0, 0, 0))
+        self.assertTrue('colorsys' in sys.modules)
+
+
+if __name__ == '__main__':
+    unittest.main()